@@ -78,6 +78,7 @@ urlpatterns = [
     url(r'^', include((api.urls, 'api'), namespace='api')),
 
     url(r'^me', userprofile.api.views.MeDetail.as_view()),
+    url(r'^grader/batch', exercise.api.views.SubmissionGraderBatchView.as_view(), name='grader-batch'),
     url(r'^lti-outcomes', external_services.api.views.LTIExerciseBasicOutcomesView.as_view(), name='lti-outcomes'),
 ]
 
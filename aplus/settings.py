@@ -57,6 +57,11 @@ EXCEL_CSV_DEFAULT_DELIMITER = ';'
 # Exercise loading settings
 EXERCISE_HTTP_TIMEOUT = 15
 EXERCISE_HTTP_RETRIES = (5,5,5)
+# Expired exercise content is served from the cache while it is refreshed in
+# the background and when the exercise service fails, until it has been stale
+# for this many seconds.
+EXERCISE_CACHE_MAX_STALENESS = 24 * 60 * 60
+EXERCISE_CACHE_REFRESH_IN_BACKGROUND = True
 EXERCISE_ERROR_SUBJECT = """A+ exercise error in {course}: {exercise}"""
 EXERCISE_ERROR_DESCRIPTION = """
 As a course teacher or technical contact you were automatically emailed by A+ about the error incident. A student could not access or submit an exercise because the grading service used is offline or unable to produce valid response.
@@ -80,6 +85,10 @@ Request fields:
 
 {request_fields}
 """
+# The same error of an exercise is reported once within this many seconds.
+# The reports are sent as digests by the send_error_reports command.
+EXERCISE_ERROR_WINDOW = 10 * 60
+EXERCISE_ERROR_DIGEST_SUBJECT = """A+ exercise errors in {course}: {count:d} incidents"""
 
 INSTALLED_APPS = (
     'django.contrib.contenttypes',
@@ -269,6 +278,11 @@ STATIC_ROOT = join(BASE_DIR, 'static')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = join(BASE_DIR, 'media')
+# Submitted files may be sent by the web server instead of A+:
+# None, 'x-accel-redirect' (nginx) or 'x-sendfile' (apache2 mod_xsendfile).
+# Nginx must serve MEDIA_ROOT from the internal location SENDFILE_ACCEL_URL.
+SENDFILE = None
+SENDFILE_ACCEL_URL = '/protected-media/'
 
 # Django REST Framework settings
 # http://www.django-rest-framework.org/api-guide/settings/
@@ -75,8 +75,7 @@ def build_plugin_renderers(plugins,
         plugins = plugins.filter(views__contains=view_name)
 
         renderers = []
-        for p in plugins:
-            p = p.as_leaf_class()
+        for p in plugins.as_leaf_classes():
             if hasattr(p, "get_renderer_class"):
                 renderers.append(p.get_renderer_class()(p, view_name, context))
             else:
@@ -1,3 +1,5 @@
+from datetime import timedelta
+
 from django.contrib import admin
 from django.utils.translation import ugettext_lazy as _
 
@@ -7,6 +9,7 @@ from course.models import (
     Enrollment,
     StudentGroup,
     CourseHook,
+    CourseHookDelivery,
     CourseModule,
     LearningObjectCategory,
     UserTag,
@@ -76,11 +79,45 @@ class LearningObjectCategoryAdmin(admin.ModelAdmin):
     ordering = ["course_instance", "id"]
 
 
+class CourseHookDeliveryAdmin(admin.ModelAdmin):
+    list_display_links = ("id",)
+    list_display = ("id", "hook", "state", "attempts", "created",
+        "delivered", "latency", "next_attempt")
+    list_filter = ("state", "hook__hook_type", "hook__course_instance")
+    readonly_fields = ("created", "delivered", "attempts", "last_error")
+    raw_id_fields = ("hook",)
+    # The number of the latest deliveries that the latency summary covers.
+    latency_sample = 1000
+
+    def get_queryset(self, request):
+        return super().get_queryset(request)\
+            .select_related('hook__course_instance__course')
+
+    def changelist_view(self, request, extra_context=None):
+        times = CourseHookDelivery.objects\
+            .filter(state=CourseHookDelivery.STATE.DELIVERED)\
+            .order_by('-delivered')\
+            .values_list('created', 'delivered')[:self.latency_sample]
+        latencies = sorted(delivered - created for created, delivered in times)
+        extra_context = extra_context or {}
+        if latencies:
+            extra_context['latency'] = {
+                'count': len(latencies),
+                'average': sum(latencies, timedelta()) / len(latencies),
+                'median': latencies[len(latencies) // 2],
+                'max': latencies[-1],
+            }
+        extra_context['pending'] = CourseHookDelivery.objects\
+            .filter(state=CourseHookDelivery.STATE.PENDING).count()
+        return super().changelist_view(request, extra_context=extra_context)
+
+
 admin.site.register(Course, CourseAdmin)
 admin.site.register(CourseInstance, CourseInstanceAdmin)
 admin.site.register(Enrollment, EnrollmentAdmin)
 admin.site.register(StudentGroup)
 admin.site.register(CourseHook)
+admin.site.register(CourseHookDelivery, CourseHookDeliveryAdmin)
 admin.site.register(CourseModule, CourseModuleAdmin)
 admin.site.register(LearningObjectCategory, LearningObjectCategoryAdmin)
 admin.site.register(UserTag)
@@ -1,3 +1,4 @@
+from django.utils import timezone
 from rest_framework import filters, generics, permissions, viewsets, status, mixins
 from rest_framework.exceptions import ParseError
 from rest_framework.response import Response
@@ -6,7 +7,7 @@ from rest_framework.reverse import reverse
 from rest_framework_extensions.mixins import NestedViewSetMixin
 
 from lib.viewbase import BaseMixin
-from lib.api.mixins import ListSerializerMixin, MeUserMixin
+from lib.api.mixins import ConditionalGetMixin, ListSerializerMixin, MeUserMixin
 from lib.api.constants import REGEX_INT, REGEX_INT_ME
 from userprofile.models import UserProfile
 from userprofile.permissions import IsAdminOrUserObjIsSelf
@@ -50,7 +51,8 @@ class CourseViewSet(ListSerializerMixin,
         return self.get_member_object('instance', 'Course')
 
 
-class CourseExercisesViewSet(NestedViewSetMixin,
+class CourseExercisesViewSet(ConditionalGetMixin,
+                             NestedViewSetMixin,
                              CourseModuleResourceMixin,
                              CourseResourceMixin,
                              viewsets.ReadOnlyModelViewSet):
@@ -67,6 +69,23 @@ class CourseExercisesViewSet(NestedViewSetMixin,
     def get_object(self):
         return self.get_member_object('module', 'Exercise module')
 
+    def get_conditional_stamps(self):
+        # The exercises are read from the database, but the cached content
+        # is regenerated whenever the modules or the exercises change.
+        if self.action == 'retrieve':
+            modules = [self.get_object()]
+        else:
+            modules = list(self.filter_queryset(self.get_queryset()))
+        now = timezone.now()
+        created = self.content.created()
+        # The modules open and close without any change in the content.
+        times = [created] + [
+            t for m in modules
+            for t in (m.reading_opening_time, m.opening_time, m.closing_time)
+            if t and t <= now
+        ]
+        return max(times), [created] + [(m.id, m.is_open(now)) for m in modules]
+
 
 class CourseStudentsViewSet(NestedViewSetMixin,
                             MeUserMixin,
@@ -180,7 +199,7 @@ class CourseUsertaggingsViewSet(NestedViewSetMixin,
             raise ParseError(detail='One or more user IDs must be supplied with the "user_id" query parameter.')
         filter_args['user__user__id__in'] = user_ids
 
-        self.get_queryset().filter(**filter_args).delete()
+        UserTagging.objects.delete_many(self.get_queryset().filter(**filter_args))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -2,13 +2,14 @@ from django.contrib.auth import get_user_model
 from django.db.models.signals import post_save, post_delete
 from django.urls import reverse
 
-from lib.cache import CachedAbstract
+from lib.cache import CachedAbstract, deferred_invalidation
 from ..models import (
     USERTAG_EXTERNAL,
     USERTAG_INTERNAL,
     Enrollment,
     UserTag,
     UserTagging,
+    usertaggings_changed,
 )
 
 
@@ -35,8 +36,14 @@ def invalidate_student(sender, instance: UserTagging, **kwargs):
         instance.course_instance,
         instance.user.user) # NOTE: userprofile.user
 
+def invalidate_tagged_students(sender, course_instance_id, user_ids, **kwargs):
+    with deferred_invalidation():
+        for user_id in user_ids:
+            CachedStudent.invalidate(course_instance_id, user_id)
+
 post_save.connect(invalidate_student, sender=UserTagging)
 post_delete.connect(invalidate_student, sender=UserTagging)
+usertaggings_changed.connect(invalidate_tagged_students, sender=UserTagging)
 
 
 def invalidate_students(sender, instance: UserTag, **kwargs):
@@ -0,0 +1,74 @@
+import logging
+from datetime import timedelta
+
+import requests
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import CourseHook, CourseHookDelivery
+
+
+logger = logging.getLogger('aplus.hooks')
+
+# The time a worker may use to post a claimed batch, before the deliveries
+# may be claimed by another worker.
+CLAIM_TIME = timedelta(minutes=5)
+
+
+def claim_deliveries(batch_size):
+    """
+    Returns the next deliveries that are due and claims them for the
+    caller, so that concurrent workers do not post them again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        qs = CourseHookDelivery.objects.filter(
+            state=CourseHookDelivery.STATE.PENDING,
+            next_attempt__lte=now,
+        ).order_by('next_attempt', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        deliveries = list(qs[:batch_size])
+        CourseHookDelivery.objects.filter(
+            id__in=[d.id for d in deliveries],
+        ).update(next_attempt=now + CLAIM_TIME)
+    hooks = CourseHook.objects.select_related('course_instance__course')\
+        .in_bulk({d.hook_id for d in deliveries})
+    for delivery in deliveries:
+        delivery.hook = hooks[delivery.hook_id]
+    return deliveries
+
+
+def deliver(delivery, session, timeout=10):
+    hook = delivery.hook
+    try:
+        hook.post(delivery.data, session=session, timeout=timeout)
+    except Exception as error:
+        delivery.set_failed(error)
+        logger.error("HTTP POST failed on %s hook to %s (%s), attempt %d; %s",
+                     hook.hook_type, hook.hook_url, hook.course_instance,
+                     delivery.attempts, delivery.last_error)
+    else:
+        delivery.set_delivered()
+        logger.info("%s posted to %s on %s with %s",
+                    hook.hook_type, hook.hook_url, hook.course_instance, delivery.data)
+    delivery.save(update_fields=[
+        'state', 'attempts', 'next_attempt', 'delivered', 'last_error',
+    ])
+
+
+def deliver_due(batch_size=100, session=None, timeout=10):
+    """
+    Posts the deliveries that are due in batches. The connections to the
+    hook hosts are reused through the session. Returns the number of
+    posted deliveries.
+    """
+    session = session or requests.Session()
+    count = 0
+    while True:
+        deliveries = claim_deliveries(batch_size)
+        if not deliveries:
+            return count
+        for delivery in deliveries:
+            deliver(delivery, session, timeout)
+        count += len(deliveries)
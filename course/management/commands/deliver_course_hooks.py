@@ -0,0 +1,34 @@
+import time
+
+import requests
+from django.core.management.base import BaseCommand
+
+from course.hooks import deliver_due
+
+
+class Command(BaseCommand):
+    help = ("Posts the queued course hook deliveries. Failed posts are "
+            "retried later with an exponentially growing delay.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('-b', '--batch-size', type=int, default=100,
+            help="The number of deliveries claimed at a time (default: 100).")
+        parser.add_argument('-t', '--timeout', type=int, default=10,
+            help="The timeout of a post in seconds (default: 10).")
+        parser.add_argument('--poll', metavar='SECONDS', type=int, default=0,
+            help="Keep polling for new deliveries with the given interval "
+                 "instead of exiting when the queue is empty.")
+
+    def handle(self, *args, **options):
+        session = requests.Session()
+        while True:
+            count = deliver_due(
+                batch_size=max(1, options['batch_size']),
+                session=session,
+                timeout=options['timeout'],
+            )
+            if count:
+                self.stdout.write("Posted {:d} hook deliveries.".format(count))
+            if not options['poll']:
+                break
+            time.sleep(options['poll'])
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.13 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0048_delete_duplicate_enrollments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='courseinstance',
+            name='configure_etag',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='courseinstance',
+            name='configure_last_modified',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='courseinstance',
+            name='configure_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
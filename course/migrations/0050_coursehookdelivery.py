@@ -0,0 +1,34 @@
+# Generated by Django 2.2.13 on 2026-10-19 11:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import lib.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0049_courseinstance_configure_stamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseHookDelivery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', lib.fields.JSONField(blank=True)),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('delivered', 'Delivered'), ('dead', 'Dead')], default='pending', max_length=32)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.IntegerField(default=0)),
+                ('delivered', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('hook', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='deliveries', to='course.CourseHook')),
+            ],
+            options={
+                'ordering': ['-id'],
+                'index_together': {('state', 'next_attempt')},
+            },
+        ),
+    ]
@@ -1,8 +1,8 @@
 import datetime
 import json
 import logging
+import requests
 import string
-import urllib.request, urllib.parse
 from random import randint, choice
 
 from django.conf import settings
@@ -14,14 +14,16 @@ from django.urls import reverse
 from django.db import models
 from django.db.models import Q, Count
 from django.db.models.signals import post_save
+from django.dispatch import Signal
 from django.utils import timezone
 from django.utils.functional import cached_property
 from django.utils.translation import ugettext_lazy as _
 from django_colortag.models import ColorTag
 
 from apps.models import BaseTab, BasePlugin
+from lib.cache import deferred_invalidation
 from lib.email_messages import email_course_error
-from lib.fields import PercentField
+from lib.fields import JSONField, PercentField
 from lib.helpers import (
     Enum,
     get_random_string,
@@ -280,6 +282,45 @@ class UserTaggingManager(models.Manager):
             user=profile,
         ).delete()
 
+    def set_many(self, profiles, tag):
+        """
+        Tags the profiles with the tag in bulk and returns the new taggings.
+        """
+        profiles = {profile.id: profile for profile in profiles}
+        existing = set(self.filter(
+            tag=tag,
+            user__in=profiles.keys(),
+            course_instance=tag.course_instance,
+        ).values_list('user_id', flat=True))
+        taggings = [
+            self.model(tag=tag, user=profile, course_instance=tag.course_instance)
+            for profile_id, profile in profiles.items()
+            if profile_id not in existing
+        ]
+        self.bulk_create(taggings, ignore_conflicts=True)
+        usertaggings_changed.send(sender=self.model,
+            course_instance_id=tag.course_instance_id,
+            user_ids=[tagging.user.user_id for tagging in taggings])
+        return taggings
+
+    def unset_many(self, profiles, tag):
+        """
+        Removes the tag from the profiles in bulk.
+        """
+        self.delete_many(self.filter(tag=tag, user__in=profiles))
+
+    def delete_many(self, taggings):
+        """
+        Deletes the taggings of the queryset in bulk. The cached students
+        are invalidated on post_delete and written once for all taggings.
+        """
+        with deferred_invalidation():
+            taggings.prefetch_related('user__user', 'course_instance').delete()
+
+
+# Sent when the taggings of users are created in bulk.
+usertaggings_changed = Signal(providing_args=['course_instance_id', 'user_ids'])
+
 
 class UserTagging(models.Model):
     tag = models.ForeignKey(UserTag,
@@ -422,6 +463,10 @@ class CourseInstance(UrlMixin, models.Model):
             "Separate with white space."))
     configure_url = models.URLField(blank=True)
     build_log_url = models.URLField(blank=True)
+    # Validators and the hash of the last applied configuration.
+    configure_etag = models.CharField(max_length=255, blank=True, editable=False)
+    configure_last_modified = models.CharField(max_length=64, blank=True, editable=False)
+    configure_hash = models.CharField(max_length=64, blank=True, editable=False)
     last_modified = models.DateTimeField(auto_now=True, blank=True, null=True)
     technical_error_emails = models.CharField(max_length=255, blank=True,
         help_text=_("By default exercise errors are reported to teacher "
@@ -539,7 +584,8 @@ class CourseInstance(UrlMixin, models.Model):
         UserTagging.objects.create(tag=tag, user=user.userprofile, course_instance=self)
 
     def get_enrollment_for(self, user):
-        return Enrollment.objects.filter(course_instance=self, user_profile=user.userprofile).first()
+        return Enrollment.objects.filter(course_instance=self, user_profile=user.userprofile)\
+            .select_related('selected_group').first()
 
     def get_user_tags(self, user):
         return self.taggings.filter(user=user.uesrprofile).select_related('tag')
@@ -645,20 +691,75 @@ class CourseHook(models.Model):
         return "{} -> {}".format(self.course_instance, self.hook_url)
 
     def trigger(self, data):
-        logger = logging.getLogger('aplus.hooks')
+        """
+        Queues the hook to be posted with the data. The deliveries are
+        posted by the deliver_course_hooks command.
+        """
+        CourseHookDelivery.objects.create(hook=self, data=data)
+
+    def post(self, data, session=requests, timeout=10):
+        """
+        Posts the data to the hook URL. Raises an exception, if the post fails.
+        """
         url, data = url_with_query_in_data(self.hook_url, data)
-        try:
-            urllib.request.urlopen(
-                url,
-                urllib.parse.urlencode(data).encode('ascii'),
-                timeout=10,
-            )
-            logger.info("%s posted to %s on %s with %s",
-                        self.hook_type, self.hook_url, self.course_instance, data)
-        except Exception as error:
-            logger.error("HTTP POST failed on %s hook to %s (%s); %s: %s",
-                         self.hook_type, self.hook_url, self.course_instance,
-                         error.__class__.__name__, error)
+        response = session.post(url, data=data, timeout=timeout)
+        response.raise_for_status()
+
+
+class CourseHookDelivery(models.Model):
+    """
+    A queued post of a course hook. Failed posts are retried with an
+    exponentially growing delay until the maximum number of attempts, after
+    which the delivery is dead.
+    """
+    STATE = Enum([
+        ('PENDING', 'pending', _("Pending")),
+        ('DELIVERED', 'delivered', _("Delivered")),
+        ('DEAD', 'dead', _("Dead")),
+    ])
+    MAX_ATTEMPTS = 8
+    RETRY_DELAY = datetime.timedelta(seconds=30)
+
+    hook = models.ForeignKey(CourseHook, on_delete=models.CASCADE,
+        related_name="deliveries")
+    data = JSONField(blank=True)
+    state = models.CharField(max_length=32, choices=STATE.choices,
+        default=STATE.PENDING)
+    created = models.DateTimeField(default=timezone.now)
+    next_attempt = models.DateTimeField(default=timezone.now)
+    attempts = models.IntegerField(default=0)
+    delivered = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-id']
+        index_together = (
+            ('state', 'next_attempt'),
+        )
+
+    def __str__(self):
+        return "{} ({})".format(self.hook, self.state)
+
+    @property
+    def latency(self):
+        if self.delivered is None:
+            return None
+        return self.delivered - self.created
+
+    def set_delivered(self):
+        self.attempts += 1
+        self.state = self.STATE.DELIVERED
+        self.delivered = timezone.now()
+        self.last_error = ''
+
+    def set_failed(self, error):
+        self.attempts += 1
+        self.last_error = "{}: {}".format(error.__class__.__name__, error)
+        if self.attempts >= self.MAX_ATTEMPTS:
+            self.state = self.STATE.DEAD
+        else:
+            self.next_attempt = timezone.now() \
+                + self.RETRY_DELAY * 2 ** (self.attempts - 1)
 
 
 class CourseModuleManager(models.Manager):
@@ -6,8 +6,9 @@ from django.test import TestCase
 from django.test.client import Client
 from django.utils import timezone
 
-from course.models import Course, CourseInstance, CourseHook, CourseModule, \
-    LearningObjectCategory, StudentGroup
+from course.hooks import deliver_due
+from course.models import Course, CourseInstance, CourseHook, CourseHookDelivery, \
+    CourseModule, LearningObjectCategory, StudentGroup, UserTag, UserTagging
 from exercise.models import BaseExercise, Submission
 from exercise.exercise_models import LearningObject
 
@@ -261,6 +262,50 @@ class CourseTest(TestCase):
     def test_course_hook_unicode_string(self):
         self.assertEqual("123456 test course: Fall 2011 day 1 -> test_hook_url", str(self.course_hook))
 
+    def test_course_hook_delivery(self):
+        class Session:
+            def __init__(self, error=None):
+                self.error = error
+                self.posts = []
+            def post(self, url, data, timeout):
+                self.posts.append((url, data))
+                if self.error:
+                    raise self.error
+                return self
+            def raise_for_status(self):
+                pass
+
+        self.course_hook.trigger({"submission_id": 1})
+        delivery = self.course_hook.deliveries.get()
+        self.assertEqual(delivery.state, CourseHookDelivery.STATE.PENDING)
+        self.assertEqual(delivery.attempts, 0)
+
+        session = Session(ConnectionError("refused"))
+        self.assertEqual(deliver_due(session=session), 1)
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.state, CourseHookDelivery.STATE.PENDING)
+        self.assertEqual(delivery.attempts, 1)
+        self.assertEqual(delivery.last_error, "ConnectionError: refused")
+        self.assertTrue(delivery.next_attempt > timezone.now())
+        # The delivery is not retried before the delay.
+        self.assertEqual(deliver_due(session=session), 0)
+        self.assertEqual(len(session.posts), 1)
+
+        delivery.next_attempt = timezone.now()
+        delivery.save()
+        session = Session()
+        self.assertEqual(deliver_due(session=session), 1)
+        delivery.refresh_from_db()
+        self.assertEqual(delivery.state, CourseHookDelivery.STATE.DELIVERED)
+        self.assertEqual(delivery.attempts, 2)
+        self.assertIsNotNone(delivery.latency)
+        self.assertEqual(session.posts, [("test_hook_url", {"submission_id": 1})])
+
+        delivery = CourseHookDelivery(hook=self.course_hook, data={},
+            attempts=CourseHookDelivery.MAX_ATTEMPTS - 1)
+        delivery.set_failed(ConnectionError("refused"))
+        self.assertEqual(delivery.state, CourseHookDelivery.STATE.DEAD)
+
     def test_course_module_late_submission_point_worth(self):
         self.assertEqual(0, self.course_module.get_late_submission_point_worth())
         self.assertEqual(80, self.course_module_with_late_submissions_allowed.get_late_submission_point_worth())
@@ -370,6 +415,24 @@ class CourseTest(TestCase):
         self.assertEqual(StudentGroup.get_exact(self.current_course_instance,
             [self.user.userprofile,self.superuser.userprofile]), None)
 
+    def test_usertaggings_bulk(self):
+        from course.cache.students import CachedStudent
+        instance = self.current_course_instance
+        tag = UserTag.objects.create(course_instance=instance, name="cohort")
+        profiles = [self.user1.userprofile, self.user2.userprofile]
+        UserTagging.objects.set(self.user1.userprofile, tag)
+        self.assertNotIn(tag.slug, CachedStudent(instance, self.user2).data['tag_slugs'])
+
+        taggings = UserTagging.objects.set_many(profiles, tag)
+        self.assertEqual([t.user for t in taggings], [self.user2.userprofile])
+        self.assertEqual(UserTagging.objects.filter(tag=tag).count(), 2)
+        self.assertIn(tag.slug, CachedStudent(instance, self.user2).data['tag_slugs'])
+
+        UserTagging.objects.unset_many(profiles, tag)
+        self.assertFalse(UserTagging.objects.filter(tag=tag).exists())
+        self.assertNotIn(tag.slug, CachedStudent(instance, self.user1).data['tag_slugs'])
+        self.assertNotIn(tag.slug, CachedStudent(instance, self.user2).data['tag_slugs'])
+
     def test_student_enroll(self):
         self.assertFalse(self.current_course_instance.is_student(self.user1))
         self.assertFalse(self.current_course_instance.is_student(self.user2))
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class DeviationsConfig(AppConfig):
+    name = 'deviations'
+
+    def ready(self):
+        # Connect the signals that invalidate the cached deviations.
+        from . import cache
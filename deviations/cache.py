@@ -0,0 +1,72 @@
+from django.db.models.signals import post_save, post_delete
+
+from course.models import CourseInstance
+from lib.cache import CachedAbstract
+from .models import DeadlineRuleDeviation, MaxSubmissionsRuleDeviation
+
+
+class CachedDeviations(CachedAbstract):
+    """ Deadline and max submissions deviations of a course instance """
+    KEY_PREFIX = 'deviations'
+
+    def __init__(self, course_instance):
+        self.instance = course_instance
+        super().__init__(course_instance)
+
+    def _generate_data(self, instance, data=None):
+        deadlines = {}
+        for dev_id, exercise_id, submitter_id, extra_minutes, without_late_penalty in (
+                DeadlineRuleDeviation.objects
+                .filter(exercise__course_module__course_instance=instance)
+                .values_list('id', 'exercise_id', 'submitter_id',
+                    'extra_minutes', 'without_late_penalty')):
+            deadlines[(exercise_id, submitter_id)] = (
+                dev_id, extra_minutes, without_late_penalty)
+        submissions = {
+            (exercise_id, submitter_id): extra_submissions
+            for exercise_id, submitter_id, extra_submissions in (
+                MaxSubmissionsRuleDeviation.objects
+                .filter(exercise__course_module__course_instance=instance)
+                .values_list('exercise_id', 'submitter_id', 'extra_submissions'))
+        }
+        return {
+            'deadlines': deadlines,
+            'submissions': submissions,
+        }
+
+    def deadline_deviation(self, exercise, profile_id):
+        """
+        Returns the DeadlineRuleDeviation of the student in the exercise or
+        None. The deviation is built from the cached values.
+        """
+        entry = self.data['deadlines'].get((exercise.id, profile_id))
+        if entry is None:
+            return None
+        dev_id, extra_minutes, without_late_penalty = entry
+        return DeadlineRuleDeviation(
+            id=dev_id,
+            exercise=exercise,
+            submitter_id=profile_id,
+            extra_minutes=extra_minutes,
+            without_late_penalty=without_late_penalty,
+        )
+
+    def extra_submissions(self, exercise_id, profile_id):
+        return self.data['submissions'].get((exercise_id, profile_id), 0)
+
+
+def invalidate_deviations(sender, instance, **kwargs):
+    CachedDeviations.invalidate(instance.exercise.course_instance)
+
+
+def invalidate_instance(sender, instance, **kwargs):
+    CachedDeviations.invalidate(instance)
+
+
+# Automatically invalidate cached deviations when edited.
+post_save.connect(invalidate_instance, sender=CourseInstance)
+post_delete.connect(invalidate_instance, sender=CourseInstance)
+post_save.connect(invalidate_deviations, sender=DeadlineRuleDeviation)
+post_delete.connect(invalidate_deviations, sender=DeadlineRuleDeviation)
+post_save.connect(invalidate_deviations, sender=MaxSubmissionsRuleDeviation)
+post_delete.connect(invalidate_deviations, sender=MaxSubmissionsRuleDeviation)
@@ -5,7 +5,8 @@ from django.utils import timezone
 
 from course.models import Course, CourseInstance, CourseModule, \
     LearningObjectCategory
-from deviations.models import DeadlineRuleDeviation
+from deviations.cache import CachedDeviations
+from deviations.models import DeadlineRuleDeviation, MaxSubmissionsRuleDeviation
 from exercise.exercise_models import ExerciseWithAttachment
 from userprofile.models import User
 
@@ -74,3 +75,28 @@ class DeviationsTest(TestCase):
 
     def test_deadline_rule_deviation_normal_deadline(self):
         self.assertEqual(self.tomorrow, self.deadline_rule_deviation.get_normal_deadline())
+
+    def test_cached_deviations(self):
+        profile = self.user.userprofile
+        exercise = self.exercise_with_attachment
+        deviations = CachedDeviations(self.course_instance)
+        deviation = deviations.deadline_deviation(exercise, profile.id)
+        self.assertEqual(deviation.id, self.deadline_rule_deviation.id)
+        self.assertEqual(deviation.get_new_deadline(), self.two_days_from_now)
+        self.assertTrue(deviation.without_late_penalty)
+        self.assertEqual(deviations.extra_submissions(exercise.id, profile.id), 0)
+
+        # Cached deviations are read without queries.
+        with self.assertNumQueries(0):
+            deviations = CachedDeviations(self.course_instance)
+            deviations.deadline_deviation(exercise, profile.id)
+
+        MaxSubmissionsRuleDeviation.objects.create(
+            exercise=exercise,
+            submitter=profile,
+            extra_submissions=2
+        )
+        self.deadline_rule_deviation.delete()
+        deviations = CachedDeviations(self.course_instance)
+        self.assertIsNone(deviations.deadline_deviation(exercise, profile.id))
+        self.assertEqual(deviations.extra_submissions(exercise.id, profile.id), 2)
@@ -1,36 +1,120 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
 from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
 
 from course.models import CourseInstance
-from edit_course.operations.configure import configure_content
+from edit_course.operations.configure import apply_configuration, fetch_configuration
+
+def parse_date(value):
+    return timezone.make_aware(datetime.strptime(value, "%Y-%m-%d"))
 
 class Command(BaseCommand):
-    help = "Reload course configuration from configuration url"
+    help = ("Reload course configuration from configuration url. "
+            "The configurations of several instances are fetched in parallel "
+            "and applied one instance at a time.")
 
     def add_arguments(self, parser):
-        parser.add_argument('path', metavar="PATH", nargs='?',
-                            default="def/current",
-                            help="Path component of the course to be reconfigured from it's configuration url (default: 'def/current')")
+        parser.add_argument('paths', metavar="PATH", nargs='*',
+                            help="Path component of the course to be reconfigured from it's configuration url "
+                                 "(default: 'def/current' if no filters are given)")
         parser.add_argument('-u', '--url',
-                            help="Replace current configuration url with this one")
+                            help="Replace current configuration url with this one (a single path only)")
+        parser.add_argument('-n', '--dry-run', action='store_true',
+                            help="Only print the changes without saving them")
+        parser.add_argument('-f', '--force', action='store_true',
+                            help="Apply the configuration even if it has not changed")
+        parser.add_argument('--visible', action='store_true',
+                            help="Reload the instances visible to students")
+        parser.add_argument('--starting-after', metavar="YYYY-MM-DD", type=parse_date,
+                            help="Reload the instances starting after the date")
+        parser.add_argument('--course-code', metavar="CODE",
+                            help="Reload the instances of the courses with the code")
+        parser.add_argument('-w', '--workers', type=int, default=8,
+                            help="Number of configurations fetched at the same time (default: 8)")
 
     def handle(self, *args, **options):
-        path = options['path'].strip().strip('/')
-        parts = path.split('/')
-        if len(parts) != 2:
-            raise CommandError("Path parameter neets to be in format of <course>/<instance>")
-
-        try:
-            instance = CourseInstance.objects.get(course__url=parts[0], url=parts[1])
-        except CourseInstance.DoesNotExist:
-            raise CommandError("Could not find course instance with path '{}'.".format(path))
-
-        conf_url = options['url'] or instance.configure_url
-        if not conf_url:
-            raise CommandError("There is no configuration url for {}. Use --url=<url> to set one.".format(instance))
-
-        errors = configure_content(instance, conf_url)
-        if errors:
-            self.stdout.write(self.style.ERROR("\n".join((str(e) for e in errors))))
-            raise CommandError("Configuration failed!")
+        instances = self.get_instances(options)
+        if options['url']:
+            if len(instances) != 1:
+                raise CommandError("The --url option requires a single course instance.")
+            urls = [options['url']]
+        else:
+            urls = [instance.configure_url for instance in instances]
+        for instance, url in zip(instances, urls):
+            if not url:
+                raise CommandError("There is no configuration url for {}. Use --url=<url> to set one.".format(instance))
+
+        def fetch(args):
+            instance, url = args
+            start = time.perf_counter()
+            response, errors = fetch_configuration(instance, url.strip(), options['force'])
+            return response, errors, time.perf_counter() - start
+
+        failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as executor:
+            fetched = executor.map(fetch, zip(instances, urls))
+            for instance, url, (response, errors, fetch_time) in zip(instances, urls, fetched):
+                self.stdout.write(self.style.MIGRATE_HEADING(
+                    "{}/{}".format(instance.course.url, instance.url)))
+                changes = []
+                start = time.perf_counter()
+                if response is not None:
+                    errors = apply_configuration(instance, url.strip(), response,
+                        dry_run=options['dry_run'], changes=changes,
+                        force=options['force'])
+                apply_time = time.perf_counter() - start
+                if changes:
+                    self.stdout.write("\n".join((str(c) for c in changes)))
+                elif not errors:
+                    self.stdout.write("No changes.")
+                if errors:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR("\n".join((str(e) for e in errors))))
+                self.stdout.write("Fetched in {:.2f} s, applied in {:.2f} s.".format(
+                    fetch_time, apply_time))
+
+        if failed:
+            raise CommandError("Configuration failed for {:d} of {:d} instances!".format(
+                failed, len(instances)))
+        elif options['dry_run']:
+            self.stdout.write(self.style.SUCCESS("Dry run done, nothing was saved."))
         else:
             self.stdout.write(self.style.SUCCESS("Course update done!"))
+
+    def get_instances(self, options):
+        paths = options['paths']
+        filtered = options['visible'] or options['starting_after'] or options['course_code']
+        if not paths and not filtered:
+            paths = ["def/current"]
+
+        instances = []
+        for path in paths:
+            path = path.strip().strip('/')
+            parts = path.split('/')
+            if len(parts) != 2:
+                raise CommandError("Path parameter neets to be in format of <course>/<instance>")
+            try:
+                instances.append(CourseInstance.objects.select_related('course')
+                    .get(course__url=parts[0], url=parts[1]))
+            except CourseInstance.DoesNotExist:
+                raise CommandError("Could not find course instance with path '{}'.".format(path))
+
+        if filtered:
+            qs = CourseInstance.objects.select_related('course')\
+                .exclude(id__in=[i.id for i in instances])\
+                .exclude(configure_url='')\
+                .order_by('course__code', 'instance_name')
+            if options['visible']:
+                qs = qs.filter(visible_to_students=True)
+            if options['starting_after']:
+                qs = qs.filter(starting_time__gt=options['starting_after'])
+            if options['course_code']:
+                qs = qs.filter(course__code=options['course_code'])
+            instances.extend(qs)
+
+        if not instances:
+            raise CommandError("No course instances match the filters.")
+        return instances
@@ -1,12 +1,66 @@
 import json
+from collections import defaultdict
+
+from django.db.models import Q
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
 
-from exercise.models import BaseExercise, Submission
+from exercise.models import BaseExercise, Submission, create_submissions_in_bulk
 from lib.helpers import extract_form_errors
+from userprofile.models import UserProfile
 from ..submission_forms import BatchSubmissionCreateAndReviewForm
 
 
+# The fields of the objects that refer to user profiles and the keys
+# to look the profiles up with.
+PROFILE_FIELDS = BatchSubmissionCreateAndReviewForm.PROFILE_FIELD_KEYS
+
+
+def _field_values(submission_json, field):
+    value = submission_json.get(field)
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        return [str(v) for v in value]
+    return [str(value)]
+
+
+def _fetch_profiles(submissions_json):
+    """
+    Returns dicts from the values of the profile fields to the profiles.
+    The profiles referred by all the objects are fetched with one query.
+    """
+    values = defaultdict(set)
+    for submission_json in submissions_json:
+        for field, key in PROFILE_FIELDS:
+            values[field].update(_field_values(submission_json, field))
+    ids = [int(v) for v in values['students'] | values['grader'] if v.isdigit()]
+    user_ids = [int(v) for v in values['students_by_user_id'] if v.isdigit()]
+    profiles = UserProfile.objects.select_related('user').filter(
+        Q(id__in=ids)
+        | Q(user_id__in=user_ids)
+        | Q(student_id__in=values['students_by_student_id'])
+        | Q(user__email__in=values['students_by_email'])
+    ).order_by('user_id')
+
+    lookups = {field: {} for field, key in PROFILE_FIELDS}
+    for profile in profiles:
+        for field, key in PROFILE_FIELDS:
+            if key(profile):
+                lookups[field].setdefault(str(key(profile)), profile)
+    return lookups
+
+
+def _object_profiles(lookups, submission_json):
+    profiles = {}
+    for field, key in PROFILE_FIELDS:
+        for value in _field_values(submission_json, field):
+            profile = lookups[field].get(value)
+            if profile:
+                profiles[profile.id] = profile
+    return sorted(profiles.values(), key=lambda p: p.user_id)
+
+
 def create_submissions(instance, admin_profile, json_text):
     """
     Batch creates submissions and feedback from formatted JSON.
@@ -24,6 +78,19 @@ def create_submissions(instance, admin_profile, json_text):
     if not isinstance(submissions_json, list):
         return [_("Invalid JSON. Expected list or list in objects field")]
 
+    # The referred exercises and profiles are fetched up front.
+    exercise_ids = set()
+    for submission_json in submissions_json:
+        if isinstance(submission_json, dict):
+            exercise_ids.update(
+                int(v) for v in _field_values(submission_json, "exercise_id")
+                if v.isdigit())
+    exercises = BaseExercise.objects\
+        .filter(course_module__course_instance=instance)\
+        .select_related('category', 'course_module__course_instance')\
+        .in_bulk(exercise_ids)
+    lookups = _fetch_profiles(s for s in submissions_json if isinstance(s, dict))
+
     errors = []
     validated_forms = []
     count = 0
@@ -35,19 +102,20 @@ def create_submissions(instance, admin_profile, json_text):
                     .format(count=count))
             continue
 
-        exercise = BaseExercise.objects.filter(
-            id=submission_json["exercise_id"],
-            course_module__course_instance=instance).first()
+        exercise_id = submission_json["exercise_id"]
+        if str(exercise_id).isdigit():
+            exercise_id = int(exercise_id)
+        exercise = exercises.get(exercise_id)
         if not exercise:
             errors.append(
                 _('Unknown exercise_id {id:d} in object {count:d}.')
-                    .format(id=submission_json["exercise_id"],
-                            count=count))
+                    .format(id=exercise_id, count=count))
             continue
 
         # Use form to parse and validate object data.
         form = BatchSubmissionCreateAndReviewForm(submission_json,
-            exercise=exercise)
+            exercise=exercise,
+            profiles=_object_profiles(lookups, submission_json))
         if form.is_valid():
             validated_forms.append(form)
         else:
@@ -57,16 +125,25 @@ def create_submissions(instance, admin_profile, json_text):
                             errors='\n '.join(extract_form_errors(form))))
 
     if not errors:
-        for form in validated_forms:
-            sub = Submission.objects.create(exercise=form.exercise)
-            sub.submitters.set(form.cleaned_students)
-            sub.feedback = form.cleaned_data.get("feedback")
-            sub.set_points(form.cleaned_data.get("points"),
-                sub.exercise.max_points, no_penalties=True)
-            sub.submission_time = form.cleaned_data.get("submission_time")
-            sub.grading_time = timezone.now()
-            sub.grader = form.cleaned_data.get("grader") or admin_profile
-            sub.set_ready()
-            sub.save()
+        _save_submissions(admin_profile, validated_forms)
 
     return errors
+
+
+def _save_submissions(admin_profile, forms):
+    now = timezone.now()
+    submissions = []
+    for form in forms:
+        sub = Submission(exercise=form.exercise)
+        sub.feedback = form.cleaned_data.get("feedback")
+        sub.set_points(form.cleaned_data.get("points"),
+            sub.exercise.max_points, no_penalties=True)
+        sub.submission_time = form.cleaned_data.get("submission_time")
+        sub.grader = form.cleaned_data.get("grader") or admin_profile
+        sub.grading_time = now
+        if sub.status != Submission.STATUS.UNOFFICIAL:
+            sub.status = Submission.STATUS.READY
+        sub.bulk_submitters = list(
+            {p.id: p for p in form.cleaned_students}.values())
+        submissions.append(sub)
+    create_submissions_in_bulk(submissions)
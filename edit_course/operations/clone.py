@@ -1,69 +1,96 @@
+from collections import defaultdict
+
 from django.db import transaction
 
-def clone_learning_objects(category_map, module, objects, parent):
-    """
-    Clones learning objects recursively.
-    """
-    for lobject in list(a.as_leaf_class() for a in objects):
-        children = list(lobject.children.all())
+from course.models import CourseModule, LearningObjectCategory, UserTag
+from exercise.models import LearningObject
+from inheritance.models import bulk_create_with_inheritance
+from lib.cache import deferred_invalidation
 
-        # Save as new learning object.
-        lobject.id = None
-        lobject.modelwithinheritance_ptr_id = None
-        if hasattr(lobject, "learningobject_ptr_id"):
-            lobject.learningobject_ptr_id = None
-        if hasattr(lobject, "baseexercise_ptr_id"):
-            lobject.baseexercise_ptr_id = None
-        lobject.category = category_map[lobject.category.id]
-        lobject.course_module = module
-        lobject.parent = parent
-        lobject.save()
 
-        clone_learning_objects(category_map, module, children, lobject)
+def clone_learning_objects(category_map, module_map, children):
+    """
+    Clones learning objects level by level. The children are the learning
+    objects as their leaf classes by the ids of their parents.
+    """
+    # Each level is inserted in bulk after its parents have got their ids.
+    # The model signals are not sent, but the new objects have no cached
+    # data and the content of the new instance is invalidated on its save.
+    clones = {None: None}
+    level = children[None]
+    while level:
+        old_ids = [lobject.id for lobject in level]
+        for lobject in level:
+            lobject.category = category_map[lobject.category_id]
+            lobject.course_module = module_map[lobject.course_module_id]
+            lobject.parent = clones[lobject.parent_id]
+        bulk_create_with_inheritance(level)
+        clones = dict(zip(old_ids, level))
+        level = [child for old_id in old_ids for child in children[old_id]]
 
 
-@transaction.atomic
 def clone(instance, url):
     """
     Clones the course instance and returns the new saved instance.
+    The cached data is invalidated once after the clone is saved.
     """
+    with deferred_invalidation(), transaction.atomic():
+        return _clone(instance, url)
+
+
+def _clone(instance, url):
     assistants = list(instance.assistants.all())
     usertags = list(instance.usertags.all())
     categories = list(instance.categories.all())
     modules = list(instance.course_modules.all())
+    # The learning objects are fetched as their leaf classes with one
+    # query per class.
+    children = defaultdict(list)
+    for lobject in LearningObject.objects\
+            .filter(course_module__course_instance=instance)\
+            .as_leaf_classes():
+        children[lobject.parent_id].append(lobject)
 
     # Save as new course instance.
     instance.id = None
     instance.visible_to_students = False
     instance.url = url
+    # The configuration is applied in full on the first reload of the clone.
+    instance.configure_etag = ''
+    instance.configure_last_modified = ''
+    instance.configure_hash = ''
     instance.save()
 
     instance.assistants.add(*assistants)
 
+    # The objects without multi-table inheritance are inserted in bulk.
+    # Not every database returns the ids of bulk inserts, so the new
+    # categories and modules are read back by their unique names and urls.
     for usertag in usertags:
         usertag.id = None
         usertag.course_instance = instance
-        usertag.save()
+    UserTag.objects.bulk_create(usertags)
 
-    category_map = {}
+    old_categories = {category.name: category.id for category in categories}
     for category in categories:
-        old_id = category.id
-
-        # Save as new category.
         category.id = None
         category.course_instance = instance
-        category.save()
-
-        category_map[old_id] = category
+    LearningObjectCategory.objects.bulk_create(categories)
+    category_map = {
+        old_categories[category.name]: category
+        for category in instance.categories.all()
+    }
 
+    old_modules = {module.url: module.id for module in modules}
     for module in modules:
-        objects = list(module.learning_objects.filter(parent__isnull=True))
-
-        # Save as new module.
         module.id = None
         module.course_instance = instance
-        module.save()
+    CourseModule.objects.bulk_create(modules)
+    module_map = {
+        old_modules[module.url]: module
+        for module in instance.course_modules.all()
+    }
 
-        clone_learning_objects(category_map, module, objects, None)
+    clone_learning_objects(category_map, module_map, children)
 
     return instance
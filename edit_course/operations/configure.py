@@ -1,3 +1,4 @@
+import hashlib
 import json
 import requests
 from datetime import datetime, timedelta
@@ -5,6 +6,8 @@ from urllib.parse import urlparse
 
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist
+from django.db import transaction
+from django.db.models import Count
 from django.utils import timezone
 from django.utils.text import format_lazy
 from django.utils.translation import ugettext_lazy as _
@@ -13,6 +16,7 @@ from course.models import Course, CourseInstance, CourseModule, LearningObjectCa
 from exercise.exercisecollection_models import ExerciseCollection
 from exercise.models import LearningObject, CourseChapter, BaseExercise, LTIExercise
 from external_services.models import LTIService
+from lib.cache import deferred_invalidation
 from lib.localization_syntax import format_localization
 from userprofile.models import UserProfile
 
@@ -92,10 +96,44 @@ def parse_choices(value, choices, field_name, errors):
     return parsed_value
 
 
+def field_values(obj):
+    return {f.attname: getattr(obj, f.attname) for f in obj._meta.concrete_fields}
+
+
+def save_changes(obj, before, name, changes):
+    """
+    Saves the object, if it is new or its fields differ from the field values
+    before the configuration. The change is described in the changes list.
+    """
+    if obj.pk is None:
+        obj.full_clean()
+        obj.save()
+        changes.append(_("Created {name}.").format(name=name))
+        return
+    after = field_values(obj)
+    changed = [key for key, value in after.items() if before.get(key) != value]
+    if changed:
+        obj.full_clean()
+        obj.save()
+        changes.append(_("Updated {name}: {fields}.").format(
+            name=name, fields=", ".join(changed)))
+
+
 def configure_learning_objects(category_map, module, config, parent,
-        seen, errors, n=0):
+        seen, errors, n=0, existing=None, lti_services=None, changes=None):
     if not isinstance(config, list):
         return n
+    if existing is None:
+        # The learning objects of the module by their keys as leaf classes.
+        # The first one in the default order is used for duplicate keys.
+        existing = {}
+        for lobject in LearningObject.objects.filter(course_module=module)\
+                .defer(None).as_leaf_classes():
+            existing.setdefault(lobject.url, lobject)
+    if lti_services is None:
+        lti_services = get_lti_services()
+    if changes is None:
+        changes = []
     for o in config:
         if not "key" in o:
             errors.append(_("Learning object requires a key."))
@@ -107,13 +145,7 @@ def configure_learning_objects(category_map, module, config, parent,
             errors.append(_("Unknown category '{category}'.").format(category=o["category"]))
             continue
 
-        lobject = LearningObject.objects.filter(
-            #course_module__course_instance=module.course_instance,
-            course_module=module,
-            url=str(o["key"])
-        ).defer(None).first()
-        if not lobject is None:
-            lobject = lobject.as_leaf_class()
+        lobject = existing.get(str(o["key"]))
 
         # Select exercise class.
         lobject_cls = (
@@ -124,14 +156,19 @@ def configure_learning_objects(category_map, module, config, parent,
         )
 
         if not lobject is None and not isinstance(lobject, lobject_cls):
+            del existing[lobject.url]
             lobject.url = lobject.url + "_old"
             lobject.save()
+            changes.append(_("Renamed learning object '{key}' to '{url}'.").format(
+                key=o["key"], url=lobject.url))
+            existing[lobject.url] = lobject
             lobject = None
         if lobject is None:
             lobject = lobject_cls(course_module=module, url=str(o["key"]))
+        before = field_values(lobject)
 
         if lobject_cls == LTIExercise:
-            lti = LTIService.objects.filter(menu_label=str(o["lti"])).first()
+            lti = lti_services.get(str(o["lti"]))
             if lti is None:
                 errors.append(
                     _("The site has no configuration for the LTI service '{lti_label}' "
@@ -253,15 +290,28 @@ def configure_learning_objects(category_map, module, config, parent,
             lobject.model_answers = format_localization(o["model_answer"])
         if "exercise_template" in o:
             lobject.templates = format_localization(o["exercise_template"])
-        lobject.full_clean()
-        lobject.save()
+        save_changes(lobject, before,
+            _("learning object '{key}'").format(key=o["key"]), changes)
+        existing[lobject.url] = lobject
         seen.append(lobject.id)
         if "children" in o:
             configure_learning_objects(category_map, module, o["children"],
-                lobject, seen, errors)
+                lobject, seen, errors, existing=existing,
+                lti_services=lti_services, changes=changes)
     return n
 
 
+def get_lti_services():
+    """
+    Returns the LTI services by their menu labels. The first service in
+    the default order is used for duplicate labels.
+    """
+    services = {}
+    for service in LTIService.objects.all():
+        services.setdefault(service.menu_label, service)
+    return services
+
+
 def get_build_log(instance):
     """
     Request latest build log from the build log URL defined for instance.
@@ -283,21 +333,77 @@ def get_build_log(instance):
     return data
 
 
-def configure_content(instance, url):
+def configure_content(instance, url, dry_run=False, changes=None, force=False):
     """
     Configures course content by trusted remote URL.
+
+    Only the objects that change are saved, and the changes are described in
+    the changes list, if one is given. The configuration is applied in
+    a single transaction, which is rolled back in a dry run.
+
+    The configuration is skipped, unless forced, when the server responds
+    that it has not been modified or its content hash equals the hash of
+    the last applied configuration from the same URL.
     """
     if not url:
         return [_("Configuration URL required.")]
+    url = url.strip()
+    response, errors = fetch_configuration(instance, url, force)
+    if response is None:
+        return errors
+    return apply_configuration(instance, url, response, dry_run, changes, force)
+
+
+def fetch_configuration(instance, url, force=False):
+    """
+    Requests the configuration from the URL. Returns the response and
+    a list of errors. The response is None, if the request failed or the
+    configuration has not been modified. No database queries are made,
+    so that the configurations may be fetched in parallel threads.
+    """
+    headers = {}
+    if url == instance.configure_url and not force:
+        if instance.configure_etag:
+            headers['If-None-Match'] = instance.configure_etag
+        if instance.configure_last_modified:
+            headers['If-Modified-Since'] = instance.configure_last_modified
     try:
-        url = url.strip()
-        response = requests.get(url)
+        response = requests.get(url, headers=headers,
+            timeout=settings.EXERCISE_HTTP_TIMEOUT)
     except Exception as e:
-        return [_("Request for a course configuration failed with error '{error!s}'. "
-                  "Configuration of course aborted.").format(error=e)]
+        return None, [_("Request for a course configuration failed with error '{error!s}'. "
+                        "Configuration of course aborted.").format(error=e)]
+    if response.status_code == 304:
+        return None, []
+    if response.status_code != 200:
+        return None, [_("Request for a course configuration failed with status {code:d}. "
+                        "Configuration of course aborted.").format(code=response.status_code)]
+    return response, []
+
+
+def apply_configuration(instance, url, response, dry_run=False, changes=None, force=False):
+    """
+    Applies the configuration response fetched from the URL. Returns
+    a list of errors.
+    """
+    etag = response.headers.get('ETag', '')
+    last_modified = response.headers.get('Last-Modified', '')
+    content_hash = hashlib.sha256(response.content).hexdigest()
+    if (
+        url == instance.configure_url
+        and not force
+        and content_hash == instance.configure_hash
+    ):
+        if not dry_run and (
+            etag != instance.configure_etag
+            or last_modified != instance.configure_last_modified
+        ):
+            save_configure_stamps(instance, etag, last_modified, content_hash)
+        return []
 
     instance.configure_url = url
-    instance.save()
+    if not dry_run:
+        instance.save()
 
     try:
         config = json.loads(response.text)
@@ -306,6 +412,32 @@ def configure_content(instance, url):
                   "Configuration of course aborted.").format(error=e)]
 
     errors = []
+    if changes is None:
+        changes = []
+    with deferred_invalidation(), transaction.atomic():
+        configure_instance(instance, config, errors, changes)
+        if dry_run:
+            transaction.set_rollback(True)
+        elif not errors:
+            save_configure_stamps(instance, etag, last_modified, content_hash)
+    return errors
+
+
+def save_configure_stamps(instance, etag, last_modified, content_hash):
+    # Updated without saving the whole instance, as the cached course
+    # content does not depend on the stamps.
+    instance.configure_etag = etag[:255]
+    instance.configure_last_modified = last_modified[:64]
+    instance.configure_hash = content_hash
+    CourseInstance.objects.filter(id=instance.id).update(
+        configure_etag=instance.configure_etag,
+        configure_last_modified=instance.configure_last_modified,
+        configure_hash=instance.configure_hash,
+    )
+
+
+def configure_instance(instance, config, errors, changes):
+    before = field_values(instance)
 
     # Configure course instance attributes.
     if "start" in config:
@@ -404,28 +536,33 @@ def configure_content(instance, url):
     instance.build_log_url = str(config['build_log_url']) if 'build_log_url' in config else ''
     # configure_url excluded from validation because the default Django URL
     # validation does not accept dotless domain names such as "grader"
-    instance.full_clean(exclude=['configure_url'])
-    instance.save()
+    if field_values(instance) != before:
+        instance.full_clean(exclude=['configure_url'])
+        instance.save()
+        changes.append(_("Updated the course instance."))
 
     if not "categories" in config or not isinstance(config["categories"], dict):
         errors.append(_("Categories required as an object."))
-        return errors
+        return
     if not "modules" in config or not isinstance(config["modules"], list):
         errors.append(_("Modules required as an array."))
-        return errors
+        return
 
     # Configure learning object categories.
+    categories = {}
+    for category in instance.categories.all():
+        categories.setdefault(category.name, category)
     category_map = {}
     seen = []
     for key, c in config.get("categories", {}).items():
         if not "name" in c:
             errors.append(_("Category requires a name."))
             continue
-        try:
-            category = instance.categories.get(name=format_localization(c["name"]))
-        except LearningObjectCategory.DoesNotExist:
+        category = categories.get(format_localization(c["name"]))
+        if category is None:
             category = LearningObjectCategory(course_instance=instance,
                 name=format_localization(c["name"]))
+        before = field_values(category)
         if "status" in c:
             category.status = str(c["status"])
         if "description" in c:
@@ -440,17 +577,28 @@ def configure_content(instance, url):
         ]:
             if field in c:
                 setattr(category, field, parse_bool(c[field]))
-        category.full_clean()
-        category.save()
+        save_changes(category, before,
+            _("category '{key}'").format(key=key), changes)
         category_map[key] = category
         seen.append(category.id)
 
-    for category in instance.categories.all():
-        if not category.id in seen:
-            category.status = LearningObjectCategory.STATUS.HIDDEN
-            category.save()
+    for category in instance.categories.exclude(id__in=seen)\
+            .exclude(status=LearningObjectCategory.STATUS.HIDDEN):
+        category.status = LearningObjectCategory.STATUS.HIDDEN
+        category.save()
+        changes.append(_("Hid category '{name}'.").format(name=category.name))
 
     # Configure course modules.
+    modules = {module.url: module for module in instance.course_modules.all()}
+    # The learning objects of the modules by their keys as leaf classes.
+    # The first one in the default order is used for duplicate keys.
+    lobjects = {}
+    for lobject in LearningObject.objects\
+            .filter(course_module__course_instance=instance)\
+            .defer(None).as_leaf_classes():
+        lobjects.setdefault(lobject.course_module_id, {})\
+            .setdefault(lobject.url, lobject)
+    lti_services = get_lti_services()
     seen_modules = []
     seen_objects = []
     nn = 0
@@ -459,10 +607,10 @@ def configure_content(instance, url):
         if not "key" in m:
             errors.append(_("Module requires a key."))
             continue
-        try:
-            module = instance.course_modules.get(url=str(m["key"]))
-        except CourseModule.DoesNotExist:
+        module = modules.get(str(m["key"]))
+        if module is None:
             module = CourseModule(course_instance=instance, url=str(m["key"]))
+        before = field_values(module)
 
         if "order" in m:
             module.order = parse_int(m["order"], errors)
@@ -521,8 +669,9 @@ def configure_content(instance, url):
             if not f is None:
                 module.late_submission_penalty = f
 
-        module.full_clean()
-        module.save()
+        save_changes(module, before,
+            _("module '{key}'").format(key=m["key"]), changes)
+        modules[module.url] = module
         seen_modules.append(module.id)
 
         if not ("numerate_ignoring_modules" in config \
@@ -530,31 +679,43 @@ def configure_content(instance, url):
             nn = 0
         if "children" in m:
             nn = configure_learning_objects(category_map, module, m["children"],
-                None, seen_objects, errors, nn)
+                None, seen_objects, errors, nn,
+                existing=lobjects.setdefault(module.id, {}),
+                lti_services=lti_services, changes=changes)
 
-    for module in list(instance.course_modules.all()):
-        if not module.id in seen_modules:
+    for module in modules.values():
+        if not module.id in seen_modules and module.status != CourseModule.STATUS.HIDDEN:
             module.status = CourseModule.STATUS.HIDDEN
             module.save()
-        for lobject in list(module.learning_objects.all()):
-            if not lobject.id in seen_objects:
-                exercise = lobject.as_leaf_class()
-                if (
-                    not isinstance(exercise, BaseExercise)
-                    or exercise.submissions.count() == 0
-                ):
-                    exercise.delete()
-                else:
-                    lobject.status = LearningObject.STATUS.HIDDEN
-                    lobject.order = 9999
-                    lobject.save()
+            changes.append(_("Hid module '{key}'.").format(key=module.url))
+
+    unseen = list(LearningObject.objects
+        .filter(course_module__course_instance=instance)
+        .exclude(id__in=seen_objects)
+        .as_leaf_classes())
+    submitted = set(BaseExercise.objects
+        .filter(id__in=[o.id for o in unseen], submissions__isnull=False)
+        .values_list('id', flat=True))
+    for exercise in unseen:
+        if exercise.id not in submitted:
+            changes.append(_("Deleted learning object '{key}'.").format(key=exercise.url))
+            exercise.delete()
+        elif (
+            exercise.status != LearningObject.STATUS.HIDDEN
+            or exercise.order != 9999
+        ):
+            exercise.status = LearningObject.STATUS.HIDDEN
+            exercise.order = 9999
+            exercise.save()
+            changes.append(_("Hid learning object '{key}'.").format(key=exercise.url))
 
     # Clean up obsolete categories.
-    for category in instance.categories.filter(status=LearningObjectCategory.STATUS.HIDDEN):
-        if category.learning_objects.count() == 0:
-            category.delete()
-
-    return errors
+    for category in instance.categories\
+            .filter(status=LearningObjectCategory.STATUS.HIDDEN)\
+            .annotate(count=Count('learning_objects'))\
+            .filter(count=0):
+        category.delete()
+        changes.append(_("Deleted category '{name}'.").format(name=category.name))
 
 
 def get_target_category(category, course_url):
@@ -6,12 +6,26 @@ from userprofile.models import UserProfile
 
 
 class BatchSubmissionCreateAndReviewForm(SubmissionCreateAndReviewForm):
+    # The fields that refer to profiles and the keys of the profiles in
+    # their values.
+    PROFILE_FIELD_KEYS = SubmissionCreateAndReviewForm.STUDENT_FIELD_KEYS + (
+        ('grader', lambda p: p.id),
+    )
 
     grader = forms.ModelChoiceField(queryset=UserProfile.objects.none(),
         required=False)
 
     def __init__(self, *args, **kwargs):
+        profiles = kwargs.get('profiles')
         super().__init__(*args, **kwargs)
+        if profiles is not None:
+            by_id = {str(p.id): p for p in profiles}
+            self.fields["grader"] = forms.TypedChoiceField(
+                empty_value=None,
+                coerce=lambda value: by_id[str(value)],
+                choices=[(k, k) for k in by_id],
+                required=False)
+            return
         self.fields["grader"].queryset = \
             UserProfile.objects.all()
             #self.exercise.course_instance.get_course_staff_profiles()
@@ -1,5 +1,12 @@
-from course.models import CourseInstance
-from exercise.models import BaseExercise
+from io import StringIO
+from json import dumps
+from unittest.mock import Mock, patch
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+
+from course.models import CourseInstance, CourseModule
+from exercise.models import BaseExercise, SubmissionCounter
 from lib.testdata import CourseTestCase
 
 
@@ -100,3 +107,120 @@ class BatchAssessTest(CourseTestCase):
         sub = subs.first()
         self.assertEqual(sub.feedback, 'Generic exercise feedback')
         self.assertEqual(sub.grade, 99)
+        self.assertEqual(sub.submission_time.year, 2014)
+        self.assertEqual(sub.grader, self.teacher.userprofile)
+        self.assertEqual(
+            SubmissionCounter.objects.get_counts(exercise, [self.student.userprofile.id]),
+            {self.student.userprofile.id: (1, 1)},
+        )
+
+
+class ConfigureContentTest(CourseTestCase):
+
+    def setUp(self):
+        self.setUpCourse()
+
+    def test_configure_dry_run(self):
+        from .operations.configure import configure_content
+
+        config = {
+            'categories': {
+                'cat': {'name': "New Category"},
+            },
+            'modules': [
+                {'key': 'new', 'name': "New Module"},
+            ],
+        }
+        text = dumps(config)
+        response = Mock(text=text, content=text.encode(), status_code=200,
+            headers={'ETag': '"1"'})
+        with patch('edit_course.operations.configure.requests.get', return_value=response):
+            changes = []
+            errors = configure_content(self.instance, 'http://grader/config',
+                dry_run=True, changes=changes)
+            self.assertEqual(errors, [])
+            self.assertIn("Created module 'new'.", changes)
+            self.assertIn("Created category 'cat'.", changes)
+            self.assertIn("Hid module 'module'.", changes)
+            self.assertFalse(CourseModule.objects.filter(url='new').exists())
+            self.assertEqual(CourseModule.objects.get(id=self.module.id).status,
+                CourseModule.STATUS.READY)
+
+            instance = CourseInstance.objects.get(id=self.instance.id)
+            errors = configure_content(instance, 'http://grader/config')
+            self.assertEqual(errors, [])
+            self.assertTrue(CourseModule.objects.filter(url='new').exists())
+            self.assertEqual(CourseModule.objects.get(id=self.module.id).status,
+                CourseModule.STATUS.HIDDEN)
+
+    def test_configure_unchanged(self):
+        from .operations.configure import configure_content
+
+        config = {
+            'categories': {},
+            'modules': [],
+        }
+        text = dumps(config)
+        response = Mock(text=text, content=text.encode(), status_code=200,
+            headers={'ETag': '"1"'})
+        url = 'http://grader/config'
+        with patch('edit_course.operations.configure.requests.get',
+                return_value=response) as get:
+            changes = []
+            self.assertEqual(configure_content(self.instance, url, changes=changes), [])
+            self.assertIn("Hid module 'module'.", changes)
+            instance = CourseInstance.objects.get(id=self.instance.id)
+            self.assertEqual(instance.configure_etag, '"1"')
+
+            # The same content is skipped.
+            self.module.status = CourseModule.STATUS.READY
+            self.module.save()
+            changes = []
+            self.assertEqual(configure_content(instance, url, changes=changes), [])
+            self.assertEqual(changes, [])
+            self.assertEqual(get.call_args[1]['headers'], {'If-None-Match': '"1"'})
+            self.assertEqual(CourseModule.objects.get(id=self.module.id).status,
+                CourseModule.STATUS.READY)
+
+            # Not modified responses are skipped.
+            get.return_value = Mock(status_code=304)
+            self.assertEqual(configure_content(instance, url, changes=changes), [])
+            self.assertEqual(changes, [])
+
+            # Forced configuration is applied.
+            get.return_value = response
+            self.assertEqual(configure_content(instance, url, changes=changes, force=True), [])
+            self.assertIn("Hid module 'module'.", changes)
+
+    def test_reload_course_configuration(self):
+        self.instance.configure_url = 'http://grader/config'
+        self.instance.save()
+        CourseInstance.objects.create(
+            course=self.course,
+            url="other",
+            instance_name="2017",
+            starting_time=self.now,
+            ending_time=self.tomorrow,
+            configure_url='http://grader/other',
+        )
+        text = dumps({'categories': {}, 'modules': []})
+
+        def get(url, **kwargs):
+            if url == 'http://grader/other':
+                raise ConnectionError("refused")
+            return Mock(text=text, content=text.encode(), status_code=200, headers={})
+
+        out = StringIO()
+        with patch('edit_course.operations.configure.requests.get', side_effect=get) as mock:
+            # The failure of one instance does not stop the others.
+            with self.assertRaisesRegex(CommandError, "1 of 2"):
+                call_command('reload_course_configuration',
+                    'course/instance', 'course/other', stdout=out)
+        self.assertEqual(mock.call_count, 2)
+        output = out.getvalue()
+        self.assertIn("course/instance", output)
+        self.assertIn("course/other", output)
+        self.assertIn("Hid module 'module'.", output)
+        self.assertIn("refused", output)
+        self.assertEqual(CourseModule.objects.get(id=self.module.id).status,
+            CourseModule.STATUS.HIDDEN)
@@ -254,8 +254,7 @@ class UserTaggingAddView(UserTagMixin, FormView):
         tag_id = self.kwargs['tag_id']
         tag = UserTag.objects.get(pk=tag_id)
 
-        for user in user_set:
-            UserTagging.objects.set(user, tag)
+        UserTagging.objects.set_many(user_set, tag)
 
         user_name = ', '.join([ user.user.username for user in user_set ])
         tag_name = tag.name
@@ -317,7 +316,10 @@ class ConfigureContentView(CourseInstanceMixin, BaseRedirectView):
     def configure(self, request):
         try:
             from .operations.configure import configure_content
-            errors = configure_content(self.instance, request.POST.get('url'))
+            # Applied even if unchanged, as the content may have been
+            # edited on the site after the previous configuration.
+            errors = configure_content(self.instance, request.POST.get('url'),
+                force=True)
             if errors:
                 for error in errors:
                     messages.error(request, error)
@@ -4,6 +4,7 @@ from django.utils.translation import ugettext_lazy as _
 from exercise.models import (
     CourseChapter,
     BaseExercise,
+    ErrorReport,
     StaticExercise,
     ExerciseWithAttachment,
     Submission,
@@ -75,6 +76,14 @@ class SubmissionAdmin(admin.ModelAdmin):
             .prefetch_related('submitters')
 
 
+class ErrorReportAdmin(admin.ModelAdmin):
+    list_display_links = ("id",)
+    list_display = ("id", "course_instance", "exercise", "error_class",
+                    "count", "created", "last_seen", "sent")
+    list_filter = ["course_instance", "sent"]
+    raw_id_fields = ("exercise",)
+
+
 
 from exercise.exercisecollection_models import ExerciseCollection
 admin.site.register(ExerciseCollection)
@@ -91,3 +100,4 @@ admin.site.register(StaticExercise)
 admin.site.register(ExerciseWithAttachment)
 admin.site.register(Submission, SubmissionAdmin)
 admin.site.register(SubmittedFile)
+admin.site.register(ErrorReport, ErrorReportAdmin)
@@ -1,10 +1,22 @@
 from collections import OrderedDict
 import json
 
+from django.db.models import QuerySet
+
 from ...cache.points import CachedPoints
 
 
 def aggregate_sheet(request, profiles, taggings, exercises, aggregate, number):
+    rows, fields = stream_aggregate_sheet(request, profiles, taggings,
+        exercises, aggregate, number)
+    return list(rows), fields
+
+
+def stream_aggregate_sheet(request, profiles, taggings, exercises, aggregate, number):
+    """
+    Returns a generator of the rows of the aggregate sheet and the header.
+    Profile querysets are iterated in chunks.
+    """
     DEFAULT_FIELDS = [
       'UserID', 'StudentID', 'Email', 'Tags',
     ]
@@ -50,7 +62,14 @@ def aggregate_sheet(request, profiles, taggings, exercises, aggregate, number):
         else:
             tags[t.user_id] = [str(t.tag_id)]
 
-    sheet = []
+    if isinstance(profiles, QuerySet):
+        profiles = profiles.select_related('user').iterator(chunk_size=1000)
+
+    return _aggregate_rows(profiles, agg, tags, exercise_nums, exercise_max,
+        exercise_fields), DEFAULT_FIELDS + exercise_fields
+
+
+def _aggregate_rows(profiles, agg, tags, exercise_nums, exercise_max, exercise_fields):
     for profile in profiles:
         uid = profile.user.id
         user_row = agg.get(uid, {})
@@ -71,6 +90,4 @@ def aggregate_sheet(request, profiles, taggings, exercises, aggregate, number):
                 values[1] / maxp if maxp > 0 else
                 1 if values[0] > 0 else 0
             )
-        sheet.append(row)
-
-    return sheet, DEFAULT_FIELDS + exercise_fields
+        yield row
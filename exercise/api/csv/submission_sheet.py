@@ -1,40 +1,129 @@
 from collections import OrderedDict
+from itertools import islice
+
+from django.db.models import Exists, OuterRef, Prefetch, Subquery
 from rest_framework.reverse import reverse
 
+from userprofile.models import UserProfile
+from ...models import BaseExercise, Submission
+
+
+DEFAULT_FIELDS = [
+    'ExerciseID', 'Category', 'Exercise', 'SubmissionID', 'Time',
+    'UserID', 'StudentID', 'Email', 'Status',
+    'Grade', 'Penalty', 'Graded', 'GraderEmail', 'Notified', 'NSeen',
+]
+CHUNK_SIZE = 1000
+
 
-def filter_best_submissions(submissions):
+def _best_submission_keys(entries):
+    """
+    Yields the keys of the best submissions of each submitter. The entries
+    are tuples of key, exercise id, status, first submitter id and grade,
+    ordered by the exercise. Only the entries of a single exercise are kept
+    in memory at a time.
+    """
     best = {}
     eid = None
 
-    for i,s in enumerate(submissions):
-        if s.exercise_id != eid:
-            eid = s.exercise_id
-            best[eid] = {}
-
-        if s.status == 'ready':
-            user = s.submitters.first()
-            uid = user.id if user else 0
-            old = best[eid].get(uid)
-            if not old or s.grade >= old[1]:
-                best[eid][uid] = (i,s.grade)
-
-    filtered = []
-    for ebest in best.values():
-        for i,g in ebest.values():
-            filtered.append(submissions[i])
-    return filtered
-
-
-def submissions_sheet(request, submissions):
-    DEFAULT_FIELDS = [
-        'ExerciseID', 'Category', 'Exercise', 'SubmissionID', 'Time',
-        'UserID', 'StudentID', 'Email', 'Status',
-        'Grade', 'Penalty', 'Graded', 'GraderEmail', 'Notified', 'NSeen',
-    ]
-    sheet = []
-    fields = []
-    files = []
-
+    for key, exercise_id, status, uid, grade in entries:
+        if exercise_id != eid:
+            for k,g in best.values():
+                yield k
+            eid = exercise_id
+            best = {}
+
+        if status == 'ready':
+            uid = uid or 0
+            old = best.get(uid)
+            if not old or grade >= old[1]:
+                best[uid] = (key,grade)
+
+    for k,g in best.values():
+        yield k
+
+
+def submission_ids(queryset, best=False):
+    """
+    Returns an iterator of the submission ids ordered by the exercise. When
+    best is set, only the best ready submission of each exercise and first
+    submitter is included. The ids are read with a single query.
+    """
+    queryset = queryset.order_by('exercise_id', 'id')
+    if not best:
+        return queryset.values_list('id', flat=True)\
+            .iterator(chunk_size=CHUNK_SIZE)
+    first_submitter = Submission.submitters.through.objects\
+        .filter(submission_id=OuterRef('pk'))\
+        .order_by('userprofile_id')\
+        .values('userprofile_id')[:1]
+    return _best_submission_keys(queryset\
+        .annotate(first_submitter=Subquery(first_submitter))\
+        .values_list('id', 'exercise_id', 'status', 'first_submitter', 'grade')\
+        .iterator(chunk_size=CHUNK_SIZE))
+
+
+def sheet_submissions(ids):
+    """
+    Yields the submissions of the ids in order with the data of the sheet
+    rows. The submissions are fetched in chunks, each in a fixed number of
+    queries.
+    """
+    from notification.models import Notification
+    notifications = Notification.objects\
+        .filter(submission=OuterRef('pk'))\
+        .order_by('-timestamp')
+    queryset = Submission.objects\
+        .select_related('grader__user')\
+        .prefetch_related(
+            'files',
+            Prefetch('submitters', queryset=UserProfile.objects.select_related('user')),
+        )\
+        .annotate(
+            notified=Exists(notifications),
+            notification_seen=Subquery(notifications.values('seen')[:1]),
+        )
+    return _submissions_in_order(ids, queryset)
+
+
+def _submissions_in_order(ids, queryset):
+    ids = iter(ids)
+    while True:
+        chunk = list(islice(ids, CHUNK_SIZE))
+        if not chunk:
+            return
+        submissions = queryset.in_bulk(chunk)
+        for sid in chunk:
+            # The submission may have been deleted after the ids were read.
+            s = submissions.get(sid)
+            if s:
+                yield s
+
+
+def _sheet_exercises(queryset):
+    return BaseExercise.objects\
+        .filter(id__in=queryset.order_by().values('exercise_id'))\
+        .in_bulk()
+
+
+def _add_exercise_fields(exercise, fields, files):
+    if exercise.exercise_info:
+        for e in exercise.exercise_info.get('form_spec', []):
+            t = e['type']
+            k = e['key']
+            if t == 'file':
+                if not k in files:
+                    files.append(k)
+            elif t != 'static':
+                if not k in fields:
+                    fields.append(k)
+
+
+def _submission_rows(request, s, exercise, fields, files):
+    """
+    Returns the sheet rows of the submission, one for each submitter.
+    The new data and file fields are added to the fields and the files.
+    """
     def url(submission, obj):
         return reverse(
             'api:submission-files-detail',
@@ -45,67 +134,108 @@ def submissions_sheet(request, submissions):
             request=request
         )
 
-    exercise = None
-    for s in submissions:
-        if s.exercise != exercise:
-            exercise = s.exercise
-            if exercise.exercise_info:
-                for e in exercise.exercise_info.get('form_spec', []):
-                    t = e['type']
-                    k = e['key']
-                    if t == 'file':
-                        if not k in files:
-                            files.append(k)
-                    elif t != 'static':
-                        if not k in fields:
-                            fields.append(k)
-
-        grader = s.grader.user.email if s.grader else None
-
-        # Find reviewer email from rubyric feedback.
-        t = s.feedback
-        if not grader and t and t.startswith("\n<p>\nReviewer:"):
-            grader = t[t.find("<a href=\"mailto:")+16:t.find("\">")]
-
-        n = s.notifications.first()
-        row = OrderedDict([
-            ('ExerciseID', exercise.id),
-            ('Category', exercise.category.name),
-            ('Exercise', str(exercise)),
-            ('SubmissionID', s.id),
-            ('Time', str(s.submission_time)),
-            ('UserID', None),
-            ('StudentID', None),
-            ('Email', None),
-            ('Status', s.status),
-            ('Grade', s.grade),
-            ('Penalty', s.late_penalty_applied),
-            ('Graded', str(s.grading_time)),
-            ('GraderEmail', grader),
-            ('Notified', not n is None),
-            ('NSeen', n.seen if n else False),
-        ])
+    grader = s.grader.user.email if s.grader else None
+
+    # Find reviewer email from rubyric feedback.
+    t = s.feedback
+    if not grader and t and t.startswith("\n<p>\nReviewer:"):
+        grader = t[t.find("<a href=\"mailto:")+16:t.find("\">")]
+
+    row = OrderedDict([
+        ('ExerciseID', exercise.id),
+        ('Category', exercise.category.name),
+        ('Exercise', str(exercise)),
+        ('SubmissionID', s.id),
+        ('Time', str(s.submission_time)),
+        ('UserID', None),
+        ('StudentID', None),
+        ('Email', None),
+        ('Status', s.status),
+        ('Grade', s.grade),
+        ('Penalty', s.late_penalty_applied),
+        ('Graded', str(s.grading_time)),
+        ('GraderEmail', grader),
+        ('Notified', s.notified),
+        ('NSeen', bool(s.notification_seen)),
+    ])
+
+    if s.submission_data:
+        for k,v in s.submission_data:
+            if v or not k in files:
+                if not k in fields:
+                    fields.append(k)
+                if k in row:
+                    row[k] += "|" + str(v)
+                else:
+                    row[k] = str(v)
+
+    for f in s.files.all():
+        if not f.param_name in files:
+            files.append(f.param_name)
+        row[f.param_name] = url(s,f)
+
+    rows = []
+    for i,profile in enumerate(s.submitters.all()):
+        r = row.copy() if i > 0 else row
+        r['UserID'] = profile.user.id
+        r['StudentID'] = profile.student_id
+        r['Email'] = profile.user.email
+        rows.append(r)
+    return rows
+
+
+def submissions_sheet(request, queryset, best=False):
+    sheet = []
+    fields = []
+    files = []
+
+    exercises = _sheet_exercises(queryset)
+    eid = None
+    for s in sheet_submissions(submission_ids(queryset, best)):
+        exercise = exercises[s.exercise_id]
+        if s.exercise_id != eid:
+            eid = s.exercise_id
+            _add_exercise_fields(exercise, fields, files)
+        sheet.extend(_submission_rows(request, s, exercise, fields, files))
+
+    return sheet, DEFAULT_FIELDS + fields + files
+
 
+def stream_submissions_sheet(request, queryset, best=False):
+    """
+    Returns a generator of the rows of the submissions sheet and the header.
+    The submissions are read twice in chunks, first to collect the fields
+    of the header and then to generate the rows, so that the memory use does
+    not depend on the number of submissions.
+    """
+    exercises = _sheet_exercises(queryset)
+
+    fields = []
+    files = []
+    eid = None
+    light = Submission.objects.only('id', 'exercise_id', 'submission_data')\
+        .prefetch_related('files')
+    for s in _submissions_in_order(submission_ids(queryset, best), light):
+        if s.exercise_id != eid:
+            eid = s.exercise_id
+            _add_exercise_fields(exercises[eid], fields, files)
         if s.submission_data:
             for k,v in s.submission_data:
-                if v or not k in files:
-                    if not k in fields:
-                        fields.append(k)
-                    if k in row:
-                        row[k] += "|" + str(v)
-                    else:
-                        row[k] = str(v)
-
+                if (v or not k in files) and not k in fields:
+                    fields.append(k)
         for f in s.files.all():
             if not f.param_name in files:
                 files.append(f.param_name)
-            row[f.param_name] = url(s,f)
-
-        for i,profile in enumerate(s.submitters.all()):
-            r = row.copy() if i > 0 else row
-            r['UserID'] = profile.user.id
-            r['StudentID'] = profile.student_id
-            r['Email'] = profile.user.email
-            sheet.append(r)
 
-    return sheet, DEFAULT_FIELDS + fields + files
+    def rows():
+        row_fields = []
+        row_files = []
+        eid = None
+        for s in sheet_submissions(submission_ids(queryset, best)):
+            exercise = exercises[s.exercise_id]
+            if s.exercise_id != eid:
+                eid = s.exercise_id
+                _add_exercise_fields(exercise, row_fields, row_files)
+            yield from _submission_rows(request, s, exercise, row_fields, row_files)
+
+    return rows(), DEFAULT_FIELDS + fields + files
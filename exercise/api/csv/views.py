@@ -5,9 +5,10 @@ from rest_framework.settings import api_settings
 from rest_framework_csv.renderers import CSVRenderer
 from rest_framework_extensions.mixins import NestedViewSetMixin
 
-from lib.api.renderers import CSVExcelRenderer
+from lib.api.renderers import CSVExcelRenderer, streaming_csv_response
 from lib.api.mixins import MeUserMixin, ListSerializerMixin
 from lib.api.constants import REGEX_INT, REGEX_INT_ME
+from lib.helpers import int_or_none
 from course.api.mixins import CourseResourceMixin
 from course.permissions import IsCourseAdminOrUserObjIsSelf
 from userprofile.models import UserProfile
@@ -77,27 +78,26 @@ class CourseSubmissionDataViewSet(NestedViewSetMixin,
         return self.serialize_submissions(request, queryset)
 
     def serialize_submissions(self, request, queryset, best=False):
-        submissions = list(queryset.order_by('exercise_id', 'id'))
-        if best:
-            submissions = filter_best_submissions(submissions)
+        field = request.GET.get('field')
+        if not field and isinstance(getattr(request, 'accepted_renderer'), CSVRenderer):
+            rows,fields = stream_submissions_sheet(request, queryset, best=best)
+            return streaming_csv_response(request, rows, fields, 'submissions.csv')
 
         # Pick out a single field.
-        field = request.GET.get('field')
         if field:
             def submitted_field(submission, name):
                 for key,val in submission.submission_data:
                     if key == name:
                         return val
                 return ""
-            vals = [submitted_field(s, field) for s in submissions]
+            ids = list(submission_ids(queryset, best))
+            submissions = Submission.objects.only('id', 'submission_data').in_bulk(ids)
+            vals = [submitted_field(submissions[i], field) for i in ids]
             return Response([v for v in vals if v != ""])
 
-        data,fields = submissions_sheet(request, submissions)
+        data,fields = submissions_sheet(request, queryset, best=best)
         self.renderer_fields = fields
-        response = Response(data)
-        if isinstance(getattr(request, 'accepted_renderer'), CSVRenderer):
-            response['Content-Disposition'] = 'attachment; filename="submissions.csv"'
-        return response
+        return Response(data)
 
     def get_renderer_context(self):
         context = super().get_renderer_context()
@@ -159,24 +159,18 @@ class CourseAggregateDataViewSet(NestedViewSetMixin,
             .values('submitters__user_id','exercise_id')\
             .annotate(total=Max('grade'),count=Count('id'))\
             .order_by()
+        number = entry['number'] if entry else ""
+        if isinstance(getattr(request, 'accepted_renderer'), CSVRenderer):
+            rows,fields = stream_aggregate_sheet(request, profiles,
+                self.instance.taggings.all(), exercises, aggr, number)
+            return streaming_csv_response(request, rows, fields, 'aggregate.csv')
+
         data,fields = aggregate_sheet(request, profiles, self.instance.taggings.all(),
-            exercises, aggr, entry['number'] if entry else "")
+            exercises, aggr, number)
         self.renderer_fields = fields
-        response = Response(data)
-        if isinstance(getattr(request, 'accepted_renderer'), CSVRenderer):
-            response['Content-Disposition'] = 'attachment; filename="aggregate.csv"'
-        return response
+        return Response(data)
 
     def get_renderer_context(self):
         context = super().get_renderer_context()
         context['header'] = getattr(self, 'renderer_fields', None)
         return context
-
-
-def int_or_none(value):
-    if not value is None:
-        try:
-            return int(value)
-        except ValueError:
-            pass
-    return None
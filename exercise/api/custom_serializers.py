@@ -117,6 +117,53 @@ class UserPointsSerializer(UserWithTagsSerializer):
         return rep
 
 
+class UserPointsCompactSerializer(serializers.Serializer):
+    """
+    Compact points of a user for listing the points of all students.
+    The submissions of the listed users may be given as course_submissions
+    in the context.
+    """
+
+    def to_representation(self, obj):
+        view = self.context['view']
+        points = CachedPoints(view.instance, obj.user, view.content,
+            self.context.get('course_submissions'))
+        module_id = self.context.get('module_id')
+        category_id = self.context.get('category_id')
+
+        modules = []
+        exercises = []
+        for module in points.modules_flatted():
+            if module_id is not None and module['id'] != module_id:
+                continue
+            modules.append({
+                key: module[key]
+                for key in ['id', 'submission_count', 'points', 'passed']
+            })
+            for entry in module['flatted']:
+                if (
+                    entry['type'] == 'exercise' and entry['submittable']
+                    and (category_id is None or entry['category_id'] == category_id)
+                ):
+                    exercise_data = {
+                        key: entry[key]
+                        for key in ['id', 'submission_count', 'points', 'passed']
+                    }
+                    exercise_data['official'] = (entry['graded'] and
+                                                 not entry.get('unconfirmed', False))
+                    exercises.append(exercise_data)
+
+        total = points.total()
+        return {
+            'id': obj.user.id,
+            'student_id': obj.student_id,
+            'submission_count': total['submission_count'],
+            'points': total['points'],
+            'modules': modules,
+            'exercises': exercises,
+        }
+
+
 class SubmitterStatsSerializer(UserWithTagsSerializer):
 
     def to_representation(self, obj):
@@ -3,20 +3,24 @@ from django.core.exceptions import PermissionDenied
 from django.http.response import HttpResponse
 from django.utils import timezone
 from django.utils.translation import ugettext_lazy as _
-from wsgiref.util import FileWrapper
 from rest_framework import mixins, permissions, viewsets
 from rest_framework import status
 from rest_framework.authentication import TokenAuthentication
 from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import CursorPagination
 from rest_framework.settings import api_settings
+from rest_framework.views import APIView
 from rest_framework_extensions.mixins import NestedViewSetMixin
 from django.db import DatabaseError
 
 from authorization.permissions import ACCESS
-from lib.api.mixins import MeUserMixin, ListSerializerMixin
+from lib.api.mixins import ConditionalGetMixin, MeUserMixin, ListSerializerMixin
 from lib.api.constants import REGEX_INT, REGEX_INT_ME
+from lib.file_response import file_response
+from lib.helpers import int_or_none
 from userprofile.models import UserProfile, GraderUser
 from userprofile.permissions import IsAdminOrUserObjIsSelf, GraderUserCanOnlyRead
 from course.permissions import (
@@ -25,8 +29,10 @@ from course.permissions import (
 )
 from course.api.mixins import CourseResourceMixin
 from course.api.serializers import StudentBriefSerializer
-from exercise.async_views import _post_async_submission
+from course.cache.students import CachedStudent
+from exercise.async_views import _post_async_submission, _post_async_submissions
 
+from ..cache.points import CachedPoints, CourseSubmissions
 from ..models import (
     Submission,
     SubmittedFile,
@@ -380,6 +386,28 @@ class SubmissionViewSet(mixins.RetrieveModelMixin,
         return Response(_post_async_submission(request, exercise, submission))
 
 
+class SubmissionGraderBatchView(APIView):
+    """
+    Grades many submissions at once. The request body is a JSON object with
+    a list "results". Each result has the parameters of the grading callback
+    and the grader authentication "token" of the submission. The results are
+    applied in a single transaction and the response contains the "success"
+    and "errors" of each result.
+    """
+    authentication_classes = []
+    permission_classes = []
+    max_results = 1000
+
+    def post(self, request, version=None, format=None):
+        results = request.data.get('results') if isinstance(request.data, dict) else None
+        if not isinstance(results, list):
+            raise ParseError("Expected a list of results.")
+        if len(results) > self.max_results:
+            raise ParseError("At most {:d} results may be posted at once."
+                .format(self.max_results))
+        return Response({'results': _post_async_submissions(request, results)})
+
+
 class SubmissionFileViewSet(NestedViewSetMixin,
                             SubmissionResourceMixin,
                             viewsets.ReadOnlyModelViewSet):
@@ -399,16 +427,21 @@ class SubmissionFileViewSet(NestedViewSetMixin,
     def retrieve(self, request, version=None, submission_id=None, submittedfile_id=None):
         sfile = self.get_object()
         try:
-            f = sfile.file_object.open()
+            return file_response(request, sfile.file_object.path,
+                'application/octet-stream', sfile.filename, as_attachment=True)
         except OSError:
             return Response(status=status.HTTP_404_NOT_FOUND)
 
-        response = HttpResponse(FileWrapper(f), content_type='application/octet-stream')
-        response['Content-Disposition'] = 'attachment; filename="{}"'.format(sfile.filename)
-        return response
+
+class CoursePointsCursorPagination(CursorPagination):
+    ordering = 'id'
+    page_size = 100
+    max_page_size = 1000
+    page_size_query_param = 'page_size'
 
 
-class CoursePointsViewSet(ListSerializerMixin,
+class CoursePointsViewSet(ConditionalGetMixin,
+                          ListSerializerMixin,
                           NestedViewSetMixin,
                           MeUserMixin,
                           CourseResourceMixin,
@@ -426,3 +459,51 @@ class CoursePointsViewSet(ListSerializerMixin,
     listserializer_class = StudentBriefSerializer
     serializer_class = UserPointsSerializer
     queryset = UserProfile.objects.all()
+
+    def get_conditional_stamps(self):
+        if self.action != 'retrieve':
+            return None
+        profile = self.get_object()
+        points = CachedPoints(self.instance, profile.user, self.content)
+        points_created, content_created = points.created()
+        tags = CachedStudent(self.instance, profile.user).data['tag_slugs']
+        user = profile.user
+        return max(points_created, content_created), [
+            points_created, content_created, tags,
+            profile.student_id, user.username, user.email, user.get_full_name(),
+        ]
+
+    @action(
+        detail=False,
+        url_path='all',
+        url_name='all',
+        methods=['get'],
+    )
+    def all_points(self, request, version=None, course_id=None):
+        """
+        Lists the compact points of all students in the course. The list uses
+        cursor pagination. Following GET parameters may be used:
+        tag_id (list only the students with the user tag),
+        module_id and category_id (include only the module or the category),
+        page_size (the number of students per page, at most 1000).
+        """
+        profiles = UserProfile.objects.filter(enrolled=self.instance)\
+            .select_related('user')
+        profiles = self.filter_queryset(profiles)
+        tag_id = int_or_none(request.GET.get('tag_id'))
+        if tag_id is not None:
+            profiles = profiles.filter(
+                taggings__tag_id=tag_id,
+                taggings__course_instance=self.instance,
+            )
+
+        paginator = CoursePointsCursorPagination()
+        page = paginator.paginate_queryset(profiles, request, view=self)
+        context = self.get_serializer_context()
+        context.update({
+            'course_submissions': CourseSubmissions(self.instance, page),
+            'module_id': int_or_none(request.GET.get('module_id')),
+            'category_id': int_or_none(request.GET.get('category_id')),
+        })
+        serializer = UserPointsCompactSerializer(page, many=True, context=context)
+        return paginator.get_paginated_response(serializer.data)
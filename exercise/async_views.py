@@ -1,6 +1,8 @@
 import logging
+from django.db import transaction
 from django.utils.translation import ugettext_lazy as _
 
+from lib.cache import deferred_invalidation
 from lib.email_messages import email_course_error
 from lib.helpers import extract_form_errors
 from notification.models import Notification
@@ -10,19 +12,22 @@ from .forms import SubmissionCallbackForm
 logger = logging.getLogger('aplus.exercise')
 
 
-def _post_async_submission(request, exercise, submission, errors=None):
+def _post_async_submission(request, exercise, submission, errors=None, data=None):
     """
     Creates or grades a submission.
 
-    Required parameters in the request are points, max_points and feedback. If
-    errors occur or submissions are no longer accepted, a dictionary with
-    "success" is False and "errors" list will be returned.
+    Required parameters in the request are points, max_points and feedback.
+    The parameters are read from data instead, if it is given. If errors
+    occur or submissions are no longer accepted, a dictionary with "success"
+    is False and "errors" list will be returned.
     """
     if not errors:
         errors = []
+    if data is None:
+        data = request.POST
 
     # Use form to parse and validate the request.
-    form = SubmissionCallbackForm(request.POST)
+    form = SubmissionCallbackForm(data)
     errors.extend(extract_form_errors(form))
     if not form.is_valid():
         submission.feedback = _(
@@ -45,21 +50,22 @@ def _post_async_submission(request, exercise, submission, errors=None):
 
     # Grade the submission.
     try:
-        submission.set_points(form.cleaned_data["points"],
-                              form.cleaned_data["max_points"])
-        submission.feedback = form.cleaned_data["feedback"]
-        submission.grading_data = request.POST
-
-        if form.cleaned_data["error"]:
-            submission.set_error()
-        else:
-            submission.set_ready()
-        submission.save()
+        with transaction.atomic():
+            submission.set_points(form.cleaned_data["points"],
+                                  form.cleaned_data["max_points"])
+            submission.feedback = form.cleaned_data["feedback"]
+            submission.grading_data = data
+
+            if form.cleaned_data["error"]:
+                submission.set_error()
+            else:
+                submission.set_ready()
+            submission.save()
 
-        if form.cleaned_data["notify"]:
-            Notification.send(None, submission)
-        else:
-            Notification.remove(submission)
+            if form.cleaned_data["notify"]:
+                Notification.send(None, submission)
+            else:
+                Notification.remove(submission)
 
         return {
             "success": True,
@@ -74,3 +80,51 @@ def _post_async_submission(request, exercise, submission, errors=None):
             "success": False,
             "errors": [repr(e)]
         }
+
+
+def _post_async_submissions(request, results):
+    """
+    Grades many submissions in a single transaction. Each submission is
+    graded in its own savepoint, so that a failure only affects the
+    submission.
+
+    The results are dictionaries with the parameters of _post_async_submission
+    and the grader authentication token of the submission. Returns a list of
+    dictionaries with the token, "success" and "errors" of each result.
+    """
+    # Imported here, because the authentication module imports the models.
+    from lib.api.authentication.grader import GraderAuthentication
+
+    tokens = [r.get('token') if isinstance(r, dict) else None for r in results]
+    users = GraderAuthentication().authenticate_submission_tokens(
+        request, set(t for t in tokens if isinstance(t, str)))
+    statuses = []
+    with deferred_invalidation(), transaction.atomic():
+        for token, result in zip(tokens, results):
+            user = users.get(token) if isinstance(token, str) else None
+            if user is None or isinstance(user, Exception):
+                statuses.append({
+                    "token": token,
+                    "success": False,
+                    "errors": [str(user.detail) if user else "Authentication token is missing."],
+                })
+                continue
+            data = {
+                key: value for key, value in result.items()
+                if key != 'token' and value is not None and value is not False
+            }
+            try:
+                with transaction.atomic():
+                    status = _post_async_submission(request, user._exercise,
+                        user._submission, data=data)
+            except Exception as e:
+                logger.exception("Unexpected error while saving grade"
+                    " for {} and submission id {:d}".format(
+                        str(user._exercise), user._submission.id))
+                status = {
+                    "success": False,
+                    "errors": [repr(e)],
+                }
+            status["token"] = token
+            statuses.append(status)
+    return statuses
@@ -1,10 +1,14 @@
 import logging
 import time
+from threading import Thread
 
 from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
 from django.db.models.signals import post_save, post_delete
 
 from lib.cache import CachedAbstract
+from lib.helpers import JobRequest
 from lib.remote_page import RemotePageNotModified
 from ..protocol.aplus import load_exercise_page
 
@@ -27,20 +31,46 @@ class ExerciseCache(CachedAbstract):
 
     def __init__(self, exercise, language, request, students, url_name):
         self.exercise = exercise
+        self.language = language
         self.load_args = [language, request, students, url_name]
+        # The background refresh may outlive the request, so it only gets
+        # the user of the request.
+        self.user = getattr(request, 'user', None)
         super().__init__(exercise, modifiers=[language])
 
+    @staticmethod
+    def _is_usable_when_stale(data):
+        # Content that has expired is still served while it is refreshed or
+        # while the exercise service is failing, up to the maximum staleness.
+        return bool(data and data['expires']
+            and time.time() - data['expires'] <= settings.EXERCISE_CACHE_MAX_STALENESS)
+
     def _needs_generation(self, data):
         expires = data['expires'] if data else None
-        return not expires or time.time() > expires
+        if not expires or time.time() <= expires:
+            return not expires
+        if settings.EXERCISE_CACHE_REFRESH_IN_BACKGROUND and self._is_usable_when_stale(data):
+            self._start_refresh(data)
+            return False
+        return True
 
-    def _generate_data(self, exercise, data=None):
+    def _generate_data(self, exercise, data=None, background=False):
         try:
+            load_args = self.load_args
+            if background:
+                language, request, students, url_name = load_args
+                load_args = [language, JobRequest(self.user), students, url_name]
             page = exercise.load_page(
-                *self.load_args,
-                last_modified=data['last_modified'] if data else None
+                *load_args,
+                last_modified=data['last_modified'] if data else None,
+                background=background,
             )
 
+            if not page.is_loaded and self._is_usable_when_stale(data):
+                logger.warning("Using stale content of %s (%s), because loading it failed",
+                    exercise, self.language)
+                return data
+
             content = compress(page.content.encode('utf-8'))
 
             return {
@@ -54,6 +84,44 @@ class ExerciseCache(CachedAbstract):
                 data['expires'] = e.expires
             return data
 
+    def _start_refresh(self, data):
+        cache_key = self._key(self.exercise, modifiers=[self.language])
+        lock_key = cache_key + ":refresh"
+        # Only one refresh at a time. After a failed refresh the lock is left
+        # to expire, which delays the next attempt to the failing service.
+        lock_timeout = (
+            settings.EXERCISE_HTTP_TIMEOUT * (len(settings.EXERCISE_HTTP_RETRIES) + 1)
+            + sum(settings.EXERCISE_HTTP_RETRIES)
+        )
+        if not cache.add(lock_key, time.time(), lock_timeout):
+            return
+        Thread(
+            target=self._refresh,
+            args=(cache_key, lock_key, data),
+            daemon=True,
+        ).start()
+
+    def _refresh(self, cache_key, lock_key, data):
+        try:
+            expires = data['expires']
+            gen_start = time.time()
+            data = self._generate_data(self.exercise, data=dict(data), background=True)
+            if data['expires'] == expires:
+                # Loading failed and the stale content was kept.
+                return
+            # Store the new content only if the cache was not invalidated or
+            # updated by someone else during the refresh.
+            current = cache.get(cache_key)
+            updated = current[0] if isinstance(current, tuple) and len(current) == 2 else None
+            if updated is not None and updated <= gen_start:
+                cache.set(cache_key, (gen_start, data), None)
+            cache.delete(lock_key)
+        except Exception:
+            logger.exception("Failed to refresh the cached content of %s (%s)",
+                self.exercise, self.language)
+        finally:
+            connections.close_all()
+
     def head(self):
         return self.data['head']
 
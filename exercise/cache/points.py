@@ -1,10 +1,11 @@
 from copy import deepcopy
+from django.db.models import Prefetch
 from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.utils import timezone
 
-from lib.cache import CachedAbstract
-from notification.models import Notification
-from ..models import LearningObject, Submission
+from lib.cache import CachedAbstract, deferred_invalidation
+from notification.models import Notification, notifications_changed
+from ..models import BaseExercise, LearningObject, Submission
 from .hierarchy import ContentMixin
 
 
@@ -15,10 +16,11 @@ def has_more_points(submission, current_entry):
 class CachedPoints(ContentMixin, CachedAbstract):
     KEY_PREFIX = 'points'
 
-    def __init__(self, course_instance, user, content):
+    def __init__(self, course_instance, user, content, course_submissions=None):
         self.content = content
         self.instance = course_instance
         self.user = user
+        self.course_submissions = course_submissions
         super().__init__(course_instance, user)
 
     def _needs_generation(self, data):
@@ -72,12 +74,18 @@ class CachedPoints(ContentMixin, CachedAbstract):
 
         # Augment submission data.
         if user.is_authenticated:
-            submissions = (
-                user.userprofile.submissions.exclude_errors()
-                .filter(exercise__course_module__course_instance=instance)
-                .prefetch_related('exercise')
-                .only('id', 'exercise', 'submission_time', 'status', 'grade')
-            )
+            if self.course_submissions is not None:
+                submissions = self.course_submissions.for_user(user)
+            else:
+                submissions = (
+                    user.userprofile.submissions.exclude_errors()
+                    .filter(exercise__course_module__course_instance=instance)
+                    .prefetch_related(
+                        Prefetch('exercise', queryset=BaseExercise.objects.all()),
+                        'notifications',
+                    )
+                    .only('id', 'exercise', 'submission_time', 'status', 'grade')
+                )
             for submission in submissions:
                 try:
                     tree = self._by_idx(modules, exercise_index[submission.exercise.id])
@@ -130,9 +138,10 @@ class CachedPoints(ContentMixin, CachedAbstract):
                         'graded': ready, # != unofficial
                         'unofficial': unofficial,
                     })
-                if submission.notifications.count() > 0:
+                notifications = submission.notifications.all()
+                if notifications:
                     entry['notified'] = True
-                    if submission.notifications.filter(seen=False).count() > 0:
+                    if any(not n.seen for n in notifications):
                         entry['unseen'] = True
 
         # Confirm points.
@@ -242,6 +251,47 @@ class CachedPoints(ContentMixin, CachedAbstract):
         return submissions
 
 
+class CourseSubmissions:
+    """
+    Loads the submissions of many users to a course instance with a single
+    query. Used as the source of CachedPoints, when the points of many users
+    are needed at once. The submissions are loaded only if the points of
+    some user need to be generated.
+    """
+
+    def __init__(self, course_instance, profiles):
+        self.instance = course_instance
+        self.profile_ids = [profile.id for profile in profiles]
+        self._submissions = None
+
+    def for_user(self, user):
+        if self._submissions is None:
+            self._submissions = self._load()
+        return self._submissions.get(user.userprofile.id, [])
+
+    def _load(self):
+        submissions = (
+            Submission.objects.exclude_errors()
+            .filter(
+                exercise__course_module__course_instance=self.instance,
+                submitters__in=self.profile_ids,
+            )
+            .distinct()
+            .prefetch_related(
+                Prefetch('exercise', queryset=BaseExercise.objects.all()),
+                'notifications',
+            )
+            .only('id', 'exercise', 'submission_time', 'status', 'grade')
+        )
+        profile_ids = set(self.profile_ids)
+        by_profile = {}
+        for submission in submissions:
+            for profile in submission.submitters.all():
+                if profile.id in profile_ids:
+                    by_profile.setdefault(profile.id, []).append(submission)
+        return by_profile
+
+
 def invalidate_content(sender, instance, **kwargs):
     course = instance.exercise.course_instance
     for profile in instance.submitters.all():
@@ -276,12 +326,19 @@ def invalidate_notification(sender, instance, **kwargs):
         course = instance.submission.exercise.course_instance
     CachedPoints.invalidate(course, instance.recipient.user)
 
+def invalidate_notified_users(sender, course_instance_id, user_ids, **kwargs):
+    with deferred_invalidation():
+        for user_id in set(user_ids):
+            CachedPoints.invalidate(course_instance_id, user_id)
+
 
 # Automatically invalidate cached points when submissions change.
+# The receivers are replicated for bulk inserts in create_submissions_in_bulk.
 post_save.connect(invalidate_content, sender=Submission)
 post_delete.connect(invalidate_content, sender=Submission)
 post_save.connect(invalidate_notification, sender=Notification)
 post_delete.connect(invalidate_notification, sender=Notification)
+notifications_changed.connect(invalidate_notified_users, sender=Notification)
 # listen to the m2m_changed signal since submission.submitters is a many-to-many
 # field and instances must be saved before the many-to-many fields may be modified,
 # that is to say, the submission post save hook may see an empty submitters list
@@ -7,7 +7,7 @@ from django.core.exceptions import ValidationError, PermissionDenied
 from django.core.files.storage import default_storage
 from django.urls import reverse
 from django.db import models
-from django.db.models import signals
+from django.db.models import F, prefetch_related_objects, signals
 from django.db.models.signals import post_delete, post_save
 from django.template import loader
 from django.utils import timezone
@@ -18,7 +18,7 @@ from aplus.api import api_reverse
 from course.models import StudentGroup, CourseInstance, CourseModule, LearningObjectCategory
 from external_services.lti import CustomStudentInfoLTIRequest
 from external_services.models import LTIService
-from inheritance.models import ModelWithInheritance
+from inheritance.models import InheritanceManager, ModelWithInheritance
 from lib.api.authentication import (
     get_graderauth_submission_params,
     get_graderauth_exercise_params,
@@ -38,9 +38,10 @@ from userprofile.models import UserProfile
 from .cache.exercise import ExerciseCache
 from .protocol.aplus import load_exercise_page, load_feedback_page
 from .protocol.exercise_page import ExercisePage
+from .submission_context import SubmissionContext
 
 
-class LearningObjectManager(models.Manager):
+class LearningObjectManager(InheritanceManager):
 
     def get_queryset(self):
         return super().get_queryset()\
@@ -271,12 +272,14 @@ class LearningObject(UrlMixin, ModelWithInheritance):
         page.is_loaded = True
         return page
 
-    def load_page(self, language, request, students, url_name, last_modified=None):
+    def load_page(self, language, request, students, url_name, last_modified=None,
+            background=False):
         return load_exercise_page(
             request,
             self.get_load_url(language, request, students, url_name),
             last_modified,
-            self
+            self,
+            background=background,
         )
 
     def get_service_url(self, language):
@@ -335,6 +338,69 @@ class LearningObjectDisplay(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
 
+class ErrorReportManager(models.Manager):
+
+    def report(self, exercise, error_class, message):
+        """
+        Records an incident of the error. The incidents of the same error
+        class in the exercise are counted in a single unsent report within
+        the EXERCISE_ERROR_WINDOW.
+        """
+        now = timezone.now()
+        since = now - datetime.timedelta(seconds=settings.EXERCISE_ERROR_WINDOW)
+        updated = self.filter(
+            exercise=exercise,
+            error_class=error_class,
+            sent__isnull=True,
+            created__gt=since,
+        ).update(count=F('count') + 1, last_seen=now)
+        if not updated:
+            self.create(
+                course_instance=exercise.course_instance,
+                exercise=exercise,
+                error_class=error_class,
+                message=message,
+                created=now,
+                last_seen=now,
+            )
+
+    def due(self):
+        """
+        Returns the unsent reports whose window has passed.
+        """
+        since = timezone.now() - datetime.timedelta(seconds=settings.EXERCISE_ERROR_WINDOW)
+        return self.filter(sent__isnull=True, created__lte=since)
+
+
+class ErrorReport(models.Model):
+    """
+    An error of an exercise to be emailed to the course staff. The message
+    is the description of the first incident, and the later incidents of
+    the same error are only counted.
+    """
+    course_instance = models.ForeignKey(CourseInstance, on_delete=models.CASCADE,
+        related_name="error_reports")
+    exercise = models.ForeignKey(LearningObject, on_delete=models.CASCADE,
+        related_name="error_reports")
+    error_class = models.CharField(max_length=255)
+    message = models.TextField()
+    count = models.PositiveIntegerField(default=1)
+    created = models.DateTimeField(default=timezone.now)
+    last_seen = models.DateTimeField(default=timezone.now)
+    sent = models.DateTimeField(null=True, blank=True)
+    objects = ErrorReportManager()
+
+    class Meta:
+        ordering = ['-id']
+        index_together = (
+            ('sent', 'created'),
+            ('exercise', 'error_class', 'sent'),
+        )
+
+    def __str__(self):
+        return "{}: {} ({:d})".format(self.exercise, self.error_class, self.count)
+
+
 class CourseChapter(LearningObject):
     """
     Chapters can offer and organize learning material as one page chapters.
@@ -347,7 +413,7 @@ class CourseChapter(LearningObject):
         return not self.generate_table_of_contents
 
 
-class BaseExerciseManager(models.Manager):
+class BaseExerciseManager(InheritanceManager):
 
     def get_queryset(self):
         return super().get_queryset().select_related(
@@ -412,7 +478,7 @@ class BaseExercise(LearningObject):
     def is_submittable(self):
         return True
 
-    def get_timing(self, students, when):
+    def get_timing(self, students, when, submission_context=None):
         module = self.course_module
         # Check the course instance archive time first so that submissions
         # are never accepted after it.
@@ -427,7 +493,7 @@ class BaseExercise(LearningObject):
         if module.exercises_open(when=when) or category.confirm_the_level:
             return self.TIMING.OPEN, module.closing_time
 
-        deviation = self.one_has_deadline_deviation(students)
+        deviation = self.one_has_deadline_deviation(students, submission_context)
         dl = deviation.get_new_deadline() if deviation else None
         if dl and when <= dl:
             if deviation.without_late_penalty:
@@ -457,12 +523,12 @@ class BaseExercise(LearningObject):
         delta = converted - module_close
         return delta.days * 24 * 60 + delta.seconds // 60
 
-    def one_has_access(self, students, when=None):
+    def one_has_access(self, students, when=None, submission_context=None):
         """
         Checks if any of the users can submit taking the granted extra time
         in consideration.
         """
-        timing,d = self.get_timing(students, when or timezone.now())
+        timing,d = self.get_timing(students, when or timezone.now(), submission_context)
 
         formatted_time = date_format(timezone.localtime(d), "DATETIME_FORMAT")
         if timing == self.TIMING.OPEN:
@@ -491,14 +557,25 @@ class BaseExercise(LearningObject):
             )]
         return False,["ERROR"]
 
-    def one_has_deadline_deviation(self, students):
-        deviation = None
-        for profile in students:
-            for d in self.deadlineruledeviation_set.filter(submitter=profile):
-                if not deviation\
-                        or d.get_new_deadline() > deviation.get_new_deadline():
-                    deviation = d
-        return deviation
+    def get_submission_context(self, students, request=None):
+        """
+        Returns a SubmissionContext for the students. When the request is
+        given, the context is cached in the request.
+        """
+        if request is None:
+            return SubmissionContext(self, students)
+        students = list(students)
+        key = (self.id, tuple(p.id for p in students))
+        contexts = getattr(request, '_submission_contexts', None)
+        if contexts is None:
+            contexts = request._submission_contexts = {}
+        if key not in contexts:
+            contexts[key] = SubmissionContext(self, students)
+        return contexts[key]
+
+    def one_has_deadline_deviation(self, students, submission_context=None):
+        context = submission_context or self.get_submission_context(students)
+        return context.deadline_deviation
 
     def number_of_submitters(self):
         return self.course_instance.students\
@@ -511,27 +588,25 @@ class BaseExercise(LearningObject):
             submissions = user_profile.submissions
         return submissions.filter(exercise=self)
 
-    def max_submissions_for_student(self, user_profile):
+    def max_submissions_for_student(self, user_profile, submission_context=None):
         """
         Calculates student specific max_submissions considering the possible
         MaxSubmissionsRuleDeviation for this student.
         """
-        deviation = self.maxsubmissionsruledeviation_set \
-            .filter(submitter=user_profile).first()
-        if deviation:
-            return self.max_submissions + deviation.extra_submissions
-        return self.max_submissions
+        context = submission_context or self.get_submission_context([user_profile])
+        return context.max_submissions_for_student(user_profile)
 
-    def one_has_submissions(self, students):
+    def one_has_submissions(self, students, submission_context=None):
         if self.max_submissions == 0:
             return True, []
+        context = submission_context or self.get_submission_context(students)
         submission_count = 0
         for profile in students:
             # The students are in the same group, therefore, each student should
             # have the same submission count. However, max submission deviation
             # may be set for only one group member.
-            submission_count = self.get_submissions_for_student(profile, True).count()
-            if submission_count < self.max_submissions_for_student(profile):
+            submission_count = context.submission_count(profile, exclude_errors=True)
+            if submission_count < context.max_submissions_for_student(profile):
                 return True, []
         max_unofficial_submissions = settings.MAX_UNOFFICIAL_SUBMISSIONS
         if self.category.accept_unofficial_submits and \
@@ -542,12 +617,13 @@ class BaseExercise(LearningObject):
             return True, [_('You have used the allowed amount of submissions for this exercise. You may still submit to receive feedback, but your current grade will not change.')]
         return False, [_('You have used the allowed amount of submissions for this exercise.')]
 
-    def no_submissions_left(self, students):
+    def no_submissions_left(self, students, submission_context=None):
         if self.max_submissions == 0:
             return False
+        context = submission_context or self.get_submission_context(students)
         for profile in students:
-            if self.get_submissions_for_student(profile, True).count() \
-                    <= self.max_submissions_for_student(profile):
+            if context.submission_count(profile, exclude_errors=True) \
+                    <= context.max_submissions_for_student(profile):
                 return False
         return True
 
@@ -611,7 +687,7 @@ class BaseExercise(LearningObject):
                 if gid > 0:
                     group = profile.groups.filter(
                         course_instance=self.course_instance,
-                        id=gid).first()
+                        id=gid).prefetch_related('members').first()
                     if group is None:
                         warnings.append(_("No group found with the given ID"))
                         return self.SUBMIT_STATUS.INVALID_GROUP, warnings, students
@@ -619,6 +695,11 @@ class BaseExercise(LearningObject):
                 pass
         elif enrollment and enrollment.selected_group:
             group = enrollment.selected_group
+            prefetch_related_objects([group], 'members')
+
+        # Load the rest of the data of the submitters at once.
+        submission_context = self.get_submission_context(
+            group.members.all() if group else [profile], request)
 
         # Check groups cannot be changed after submitting.
         submission = self.get_submissions_for_student(profile).first()
@@ -637,14 +718,14 @@ class BaseExercise(LearningObject):
                 warnings.append(warning)
                 return self.SUBMIT_STATUS.INVALID_GROUP, warnings, students
 
-        elif self._detect_submissions(profile, group):
+        elif self._detect_submissions(profile, group, submission_context):
             warnings.append(_('{collaborators} already submitted to this exercise in a different group.').format(
                 collaborators=group.collaborator_names(profile)))
             return self.SUBMIT_STATUS.INVALID_GROUP, warnings, students
 
         # Get submitters.
         if group:
-            students = list(group.members.all())
+            students = submission_context.students
 
         # Check group size.
         if not (self.min_group_size <= len(students) <= self.max_group_size):
@@ -658,8 +739,9 @@ class BaseExercise(LearningObject):
         if self.status in (self.STATUS.ENROLLMENT, self.STATUS.ENROLLMENT_EXTERNAL):
             access_ok, access_warnings = True, []
         else:
-            access_ok, access_warnings = self.one_has_access(students)
-        is_staff = all(self.course_instance.is_course_staff(p.user) for p in students)
+            access_ok, access_warnings = self.one_has_access(
+                students, submission_context=submission_context)
+        is_staff = all(submission_context.is_course_staff(p) for p in students)
         ok = (access_ok and len(warnings) == 0) or is_staff
         all_warnings = warnings + access_warnings
         if not ok:
@@ -669,7 +751,8 @@ class BaseExercise(LearningObject):
                     'think this is an error, please contact course staff.'))
             return self.SUBMIT_STATUS.INVALID, all_warnings, students
 
-        submit_limit_ok, submit_limit_warnings = self.one_has_submissions(students)
+        submit_limit_ok, submit_limit_warnings = self.one_has_submissions(
+            students, submission_context)
         if not submit_limit_ok and not is_staff:
             # access_warnings are not needed here
             return (self.SUBMIT_STATUS.AMOUNT_EXCEEDED,
@@ -685,10 +768,11 @@ class BaseExercise(LearningObject):
         else:
             return len(submitters) > 1 or submitters[0] != profile
 
-    def _detect_submissions(self, profile, group):
+    def _detect_submissions(self, profile, group, submission_context=None):
         if group:
+            context = submission_context or self.get_submission_context(group.members.all())
             return not all((
-                len(self.get_submissions_for_student(p)) == 0
+                context.submission_count(p) == 0
                 for p in group.members.all() if p != profile
             ))
         return False
@@ -702,9 +786,9 @@ class BaseExercise(LearningObject):
         if self.id:
             if request.user.is_authenticated:
                 user = request.user
-                submission_count = self.get_submissions_for_student(
-                    user.userprofile, exclude_errors=True
-                ).count()
+                submission_count = self.get_submission_context(
+                    [user.userprofile]
+                ).submission_count(user.userprofile, exclude_errors=True)
             else:
                 user = None
                 submission_count = 0
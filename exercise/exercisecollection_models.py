@@ -200,6 +200,7 @@ class ExerciseCollection(BaseExercise):
 
 
 # Updates submissions if new submission is in any ExerciseCollection's target category.
+# Replicated for bulk inserts in create_submissions_in_bulk.
 # ! Probably needs Cache-optimization
 @receiver(post_save, sender=Submission)
 def update_exercise_collection_submission(sender, instance, **kwargs):
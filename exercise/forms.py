@@ -3,7 +3,7 @@ from django.contrib.auth.models import User
 from django.utils.translation import ugettext_lazy as _
 
 from aplus.api import api_reverse
-from exercise.models import Submission
+from exercise.models import RegradeJob, Submission
 from lib.fields import UsersSearchSelectField
 from userprofile.models import UserProfile
 
@@ -63,6 +63,13 @@ class SubmissionReviewForm(forms.Form):
 
 class SubmissionCreateAndReviewForm(SubmissionReviewForm):
     STUDENT_FIELDS = ('students', 'students_by_user_id', 'students_by_student_id', 'students_by_email')
+    # The student fields and the keys of the profiles in their values.
+    STUDENT_FIELD_KEYS = (
+        ('students', lambda p: p.id),
+        ('students_by_user_id', lambda p: p.user_id),
+        ('students_by_student_id', lambda p: p.student_id),
+        ('students_by_email', lambda p: p.user.email),
+    )
 
     submission_time = forms.DateTimeField()
     students = forms.ModelMultipleChoiceField(
@@ -84,7 +91,11 @@ class SubmissionCreateAndReviewForm(SubmissionReviewForm):
         required=False)
 
     def __init__(self, *args, **kwargs):
+        profiles = kwargs.pop('profiles', None)
         super(SubmissionCreateAndReviewForm, self).__init__(*args, **kwargs)
+        if profiles is not None:
+            self.set_student_profiles(profiles)
+            return
         self.fields["students"].queryset = \
             UserProfile.objects.all()
         self.fields["students_by_user_id"].choices = \
@@ -94,6 +105,23 @@ class SubmissionCreateAndReviewForm(SubmissionReviewForm):
         self.fields["students_by_email"].choices = \
             [ (u.email, u.email) for u in User.objects.all() ]
 
+    def set_student_profiles(self, profiles):
+        """
+        Limits the students to the given profiles, which are ordered by the
+        user id and have the users selected. The student fields are then
+        validated without database queries.
+        """
+        for name, key in self.STUDENT_FIELD_KEYS:
+            by_key = {}
+            for profile in profiles:
+                if key(profile):
+                    by_key.setdefault(str(key(profile)), profile)
+            self.fields[name] = forms.TypedMultipleChoiceField(
+                empty_value=[],
+                coerce=lambda value, by_key=by_key: by_key[str(value)],
+                choices=[(k, k) for k in by_key],
+                required=False)
+
     def clean(self):
         self.cleaned_data = data = super(SubmissionCreateAndReviewForm, self).clean()
         fields = self.STUDENT_FIELDS
@@ -131,3 +159,18 @@ class EditSubmittersForm(forms.ModelForm):
     class Meta:
         model = Submission
         fields = ['submitters']
+
+
+class RegradeJobForm(forms.ModelForm):
+
+    class Meta:
+        model = RegradeJob
+        fields = ['submission_status', 'submitted_after', 'submitted_before']
+        labels = {
+            'submission_status': _("Status"),
+            'submitted_after': _("Submitted after"),
+            'submitted_before': _("Submitted before"),
+        }
+        help_texts = {
+            'submission_status': _("Leave blank to regrade submissions of any status."),
+        }
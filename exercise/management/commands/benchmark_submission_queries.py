@@ -0,0 +1,185 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from course.models import Course, CourseInstance, CourseModule, \
+    LearningObjectCategory
+from exercise.models import BaseExercise, Submission, SubmissionCounter
+from userprofile.models import UserProfile
+
+
+BENCHMARK_COURSE_CODE = 'BENCHMARK'
+BATCH_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = ('Prints the query plans and the run times of the hot submission '
+            'queries. The queries are run against a generated benchmark '
+            'course, which is created with --generate. To compare the '
+            'indexes, run the command before and after migrating '
+            'exercise 0039_submission_indexes. Never generate data in a '
+            'production database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('-g', '--generate', metavar='SUBMISSIONS',
+            type=int, default=0,
+            help="Generate the given number of submissions to the benchmark course.")
+        parser.add_argument('-s', '--students', type=int, default=20000,
+            help="The number of students to generate (default: 20000).")
+        parser.add_argument('-e', '--exercises', type=int, default=200,
+            help="The number of exercises to generate (default: 200).")
+        parser.add_argument('-r', '--rounds', type=int, default=10,
+            help="How many times each query is run (default: 10).")
+
+    def handle(self, *args, **options):
+        if options['generate']:
+            self.generate(options['generate'], options['students'], options['exercises'])
+
+        instance = CourseInstance.objects.filter(
+            course__code=BENCHMARK_COURSE_CODE).first()
+        if not instance:
+            raise CommandError("The benchmark course does not exist. Generate it with --generate.")
+        exercise = BaseExercise.objects.filter(
+            course_module__course_instance=instance).order_by('id').first()
+        profile = UserProfile.objects.filter(
+            submissions__exercise=exercise).order_by('id').first()
+
+        queries = [
+            ("get_submissions_for_student",
+                exercise.get_submissions_for_student(profile)),
+            ("get_submissions_for_student, exclude_errors",
+                exercise.get_submissions_for_student(profile, True)),
+            ("CachedPoints submissions",
+                profile.submissions.exclude_errors()
+                .filter(exercise__course_module__course_instance=instance)
+                .prefetch_related(None)
+                .only('id', 'exercise', 'submission_time', 'status', 'grade')),
+            ("ResultTable grades",
+                Submission.objects
+                .filter(
+                    exercise__course_module__course_instance=instance,
+                    status=Submission.STATUS.READY,
+                )
+                .values("submitters", "exercise", "exercise__category")
+                .annotate(best=Max("grade"))
+                .order_by()),
+        ]
+        for name, queryset in queries:
+            self.benchmark(name, queryset, options['rounds'])
+
+    def benchmark(self, name, queryset, rounds):
+        self.stdout.write(self.style.MIGRATE_HEADING(name))
+        self.stdout.write(queryset.explain())
+        times = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            count = len(list(queryset.all()))
+            times.append(time.perf_counter() - start)
+        self.stdout.write("{:d} rows, best {:.2f} ms, mean {:.2f} ms\n".format(
+            count, min(times) * 1000, sum(times) / len(times) * 1000))
+
+    @transaction.atomic
+    def generate(self, submissions, students, exercises):
+        now = timezone.now()
+        course, _ = Course.objects.get_or_create(
+            code=BENCHMARK_COURSE_CODE,
+            defaults={'name': "Benchmark course", 'url': 'benchmark'},
+        )
+        instance, created = CourseInstance.objects.get_or_create(
+            course=course,
+            url='benchmark',
+            defaults={
+                'instance_name': "Benchmark",
+                'starting_time': now - timedelta(days=30),
+                'ending_time': now + timedelta(days=30),
+            },
+        )
+        if created:
+            module = CourseModule.objects.create(
+                name="Benchmark module",
+                url='module',
+                course_instance=instance,
+                opening_time=now - timedelta(days=30),
+                closing_time=now + timedelta(days=30),
+            )
+            category = LearningObjectCategory.objects.create(
+                name="Benchmark exercises",
+                course_instance=instance,
+            )
+            for i in range(exercises):
+                BaseExercise.objects.create(
+                    name="Exercise {:d}".format(i),
+                    url='exercise{:d}'.format(i),
+                    order=i,
+                    course_module=module,
+                    category=category,
+                )
+
+            # Users are created in bulk, so the profiles are not created by
+            # the post_save signal.
+            first_user = User.objects.order_by('-id').values_list('id', flat=True).first() or 0
+            User.objects.bulk_create(
+                (User(username='benchmark{:d}'.format(i)) for i in range(students)),
+                batch_size=BATCH_SIZE,
+            )
+            UserProfile.objects.bulk_create(
+                (UserProfile(user_id=uid) for uid in
+                    User.objects.filter(id__gt=first_user).values_list('id', flat=True)),
+                batch_size=BATCH_SIZE,
+            )
+            self.stdout.write("Generated {:d} exercises and {:d} students.".format(
+                exercises, students))
+
+        exercise_ids = list(BaseExercise.objects
+            .filter(course_module__course_instance=instance)
+            .values_list('id', flat=True))
+        profile_ids = list(UserProfile.objects
+            .filter(user__username__startswith='benchmark')
+            .values_list('id', flat=True))
+        statuses = (
+            [Submission.STATUS.READY] * 8
+            + [Submission.STATUS.ERROR, Submission.STATUS.REJECTED,
+               Submission.STATUS.UNOFFICIAL, Submission.STATUS.WAITING]
+        )
+        Submitters = Submission.submitters.through
+
+        created = 0
+        while created < submissions:
+            batch = min(BATCH_SIZE, submissions - created)
+            last_id = Submission.objects.order_by('-id').values_list('id', flat=True).first() or 0
+            # Signals are not sent for bulk operations, thus the submission
+            # counters are filled in the end.
+            Submission.objects.bulk_create(
+                Submission(
+                    exercise_id=random.choice(exercise_ids),
+                    status=random.choice(statuses),
+                    grade=random.randint(0, 100),
+                    submission_data=[],
+                    grading_data={},
+                    meta_data={},
+                ) for _ in range(batch)
+            )
+            Submitters.objects.bulk_create(
+                Submitters(submission_id=sid, userprofile_id=random.choice(profile_ids))
+                for sid in Submission.objects.filter(id__gt=last_id)
+                    .order_by().values_list('id', flat=True)
+            )
+            created += batch
+            self.stdout.write("Generated {:d} submissions.".format(created))
+
+        SubmissionCounter.objects.filter(exercise_id__in=exercise_ids).delete()
+        SubmissionCounter.objects.bulk_create(
+            (SubmissionCounter(exercise_id=e, profile_id=p, total=t, valid=v)
+                for e, p, t, v in SubmissionCounter.objects.count_submissions(
+                    Submission.objects.filter(exercise_id__in=exercise_ids))),
+            batch_size=BATCH_SIZE,
+        )
+        if connection.vendor in ('postgresql', 'sqlite'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from exercise.models import Submission, SubmissionCounter
+
+
+class Command(BaseCommand):
+    help = 'Checks that the submission counters match the submissions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('-e', '--exercise', metavar='EXERCISE_ID',
+            type=int, action='append',
+            help="Check only the given exercise. May be given many times.")
+        parser.add_argument('--fix', action='store_true',
+            help="Update the counters that do not match the submissions.")
+
+    def handle(self, *args, **options):
+        exercise_ids = options.get('exercise')
+        submissions = Submission.objects.all()
+        counters = SubmissionCounter.objects.all()
+        if exercise_ids:
+            submissions = submissions.filter(exercise_id__in=exercise_ids)
+            counters = counters.filter(exercise_id__in=exercise_ids)
+
+        with transaction.atomic():
+            expected = {
+                (exercise_id, profile_id): (total, valid)
+                for exercise_id, profile_id, total, valid
+                in SubmissionCounter.objects.count_submissions(submissions)
+            }
+            current = {
+                (exercise_id, profile_id): (total, valid)
+                for exercise_id, profile_id, total, valid
+                in counters.values_list('exercise_id', 'profile_id', 'total', 'valid')
+            }
+
+            errors = 0
+            for key in sorted(set(expected) | set(current)):
+                counts = expected.get(key, (0, 0))
+                if current.get(key, (0, 0)) == counts:
+                    continue
+                errors += 1
+                exercise_id, profile_id = key
+                self.stdout.write(
+                    "Exercise {:d}, profile {:d}: counted {}, expected {}".format(
+                        exercise_id, profile_id, current.get(key), counts))
+                if options['fix']:
+                    SubmissionCounter.objects.update_or_create(
+                        exercise_id=exercise_id,
+                        profile_id=profile_id,
+                        defaults={'total': counts[0], 'valid': counts[1]},
+                    )
+
+        if errors == 0:
+            self.stdout.write("All submission counters are correct.")
+        elif options['fix']:
+            self.stdout.write("Fixed {:d} submission counters.".format(errors))
+        else:
+            self.stdout.write(self.style.ERROR(
+                "{:d} submission counters are incorrect.".format(errors)))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from exercise.models import RegradeJob
+from exercise.regrade import RegradeRunner, claim_jobs
+
+
+class Command(BaseCommand):
+    help = ("Runs the pending regrade jobs. The jobs that were interrupted "
+            "while running are resumed from the last stored submission, "
+            "once their claim has expired.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('-w', '--workers', type=int, default=8,
+            help="The number of submissions regraded at the same time (default: 8).")
+        parser.add_argument('-p', '--per-host', type=int, default=4,
+            help="The number of submissions regraded at the same time "
+                 "by a single exercise service host (default: 4).")
+        parser.add_argument('-j', '--jobs', type=int, default=4,
+            help="The number of jobs run at the same time (default: 4).")
+        parser.add_argument('--poll', metavar='SECONDS', type=int, default=0,
+            help="Keep polling for new jobs with the given interval "
+                 "instead of exiting when there are no jobs.")
+
+    def handle(self, *args, **options):
+        runner = RegradeRunner(
+            workers=max(1, options['workers']),
+            per_host=max(1, options['per_host']),
+            max_jobs=max(1, options['jobs']),
+        )
+        try:
+            while True:
+                jobs = claim_jobs(runner.max_jobs)
+                if jobs:
+                    self.stdout.write("Running {:d} regrade jobs.".format(len(jobs)))
+                    runner.run(jobs)
+                    for job in RegradeJob.objects.filter(id__in=[j.id for j in jobs]):
+                        self.stdout.write("{}: {}, {:d} regraded, {:d} failed".format(
+                            job.exercise, job.state, job.done, job.failed))
+                elif not options['poll']:
+                    break
+                else:
+                    time.sleep(options['poll'])
+        finally:
+            runner.shutdown()
@@ -0,0 +1,42 @@
+import time
+from itertools import groupby
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from exercise.models import ErrorReport
+from lib.email_messages import email_error_reports
+
+
+class Command(BaseCommand):
+    help = ("Emails the exercise error reports to the course staff. The "
+            "reports of a course instance are sent in a single digest email.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--poll', metavar='SECONDS', type=int, default=0,
+            help="Keep polling for new reports with the given interval "
+                 "instead of exiting when there are no reports.")
+
+    def handle(self, *args, **options):
+        while True:
+            self.send_reports()
+            if not options['poll']:
+                break
+            time.sleep(options['poll'])
+
+    def send_reports(self):
+        # The reports are claimed with a stamp before sending, so that
+        # a concurrent run does not send them again.
+        stamp = timezone.now()
+        ErrorReport.objects.due().update(sent=stamp)
+        reports = ErrorReport.objects.filter(sent=stamp)\
+            .select_related('course_instance__course', 'exercise')\
+            .order_by('course_instance', 'id')
+        for instance, group in groupby(reports, lambda r: r.course_instance):
+            group = list(group)
+            if email_error_reports(instance, group):
+                self.stdout.write("{}: sent {:d} error reports.".format(
+                    instance, len(group)))
+            else:
+                ErrorReport.objects.filter(id__in=[r.id for r in group])\
+                    .update(sent=None)
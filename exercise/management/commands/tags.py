@@ -44,13 +44,19 @@ class Command(BaseCommand):
         tag = UserTag.objects.filter(id=tid, course_instance=instance).first()
         if not tag:
             raise CommandError('Tag was not found in this course: ' + tid)
+        profiles = {}
+        for profile in UserProfile.objects.filter(
+                user_id__in=[uid for uid in users if uid.isdigit()]):
+            profiles[str(profile.user_id)] = profile
+        students = set(instance.students.filter(
+            id__in=[p.id for p in profiles.values()]).values_list('id', flat=True))
         for uid in users:
-            profile = UserProfile.objects.filter(user_id=uid).first()
+            profile = profiles.get(uid)
             if not profile:
                 raise CommandError('User was not found: ' + uid)
-            if not instance.is_student(profile.user):
+            if not profile.id in students:
                 raise CommandError('User is not student in this course: ' + uid)
-            UserTagging.objects.set(profile, tag)
+        UserTagging.objects.set_many(profiles.values(), tag)
 
     def read_user_tag(self, filename):
         tag_map = {}
@@ -0,0 +1,51 @@
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+
+def count_submissions(apps, schema_editor):
+    Submission = apps.get_model('exercise', 'Submission')
+    SubmissionCounter = apps.get_model('exercise', 'SubmissionCounter')
+    counts = (
+        Submission.objects
+        .values('exercise_id', 'submitters')
+        .annotate(
+            total=Count('id'),
+            valid=Count('id', filter=~Q(status__in=('error', 'rejected'))),
+        )
+        .order_by()
+    )
+    SubmissionCounter.objects.bulk_create(
+        (SubmissionCounter(
+            exercise_id=c['exercise_id'],
+            profile_id=c['submitters'],
+            total=c['total'],
+            valid=c['valid'],
+        ) for c in counts if c['submitters'] is not None),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userprofile', '0004_auto_20200721_1422'),
+        ('exercise', '0037_submission_meta_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubmissionCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total', models.IntegerField(default=0)),
+                ('valid', models.IntegerField(default=0)),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submission_counters', to='exercise.BaseExercise')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='submission_counters', to='userprofile.UserProfile')),
+            ],
+            options={
+                'unique_together': {('exercise', 'profile')},
+            },
+        ),
+        migrations.RunPython(count_submissions, migrations.RunPython.noop),
+    ]
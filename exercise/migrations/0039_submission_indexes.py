@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercise', '0038_submissioncounter'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['exercise', 'status', 'grade'], name='exercise_sub_status_grade_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['exercise', 'submission_time'], name='exercise_sub_time_idx'),
+        ),
+        # The automatically created submitters table has only a unique index
+        # starting with the submission. Lookups start from the user profile
+        # (the submissions of a student), so index the other direction too.
+        migrations.RunSQL(
+            'CREATE INDEX exercise_submission_submitters_profile_idx '
+            'ON exercise_submission_submitters (userprofile_id, submission_id)',
+            'DROP INDEX exercise_submission_submitters_profile_idx',
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.13 on 2026-10-19 10:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('userprofile', '0004_auto_20200721_1422'),
+        ('exercise', '0039_submission_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegradeJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('state', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('done', 'Done'), ('cancelled', 'Cancelled')], default='pending', max_length=32)),
+                ('submission_status', models.CharField(blank=True, choices=[('initialized', 'Initialized'), ('waiting', 'In grading'), ('ready', 'Ready'), ('error', 'Error'), ('rejected', 'Rejected'), ('unofficial', 'No effect on grading')], max_length=32)),
+                ('submitted_after', models.DateTimeField(blank=True, null=True)),
+                ('submitted_before', models.DateTimeField(blank=True, null=True)),
+                ('last_submission_id', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('done', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='userprofile.UserProfile')),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='regrade_jobs', to='exercise.BaseExercise')),
+            ],
+            options={
+                'ordering': ['-id'],
+            },
+        ),
+    ]
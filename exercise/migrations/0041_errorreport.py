@@ -0,0 +1,34 @@
+# Generated by Django 2.2.13 on 2026-10-19 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0050_coursehookdelivery'),
+        ('exercise', '0040_regradejob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ErrorReport',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('error_class', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('count', models.PositiveIntegerField(default=1)),
+                ('created', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('sent', models.DateTimeField(blank=True, null=True)),
+                ('course_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='error_reports', to='course.CourseInstance')),
+                ('exercise', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='error_reports', to='exercise.LearningObject')),
+            ],
+            options={
+                'ordering': ['-id'],
+                'index_together': {('exercise', 'error_class', 'sent'), ('sent', 'created')},
+            },
+        ),
+    ]
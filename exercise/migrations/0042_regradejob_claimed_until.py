@@ -0,0 +1,18 @@
+# Generated by Django 2.2.13 on 2026-10-19 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exercise', '0041_errorreport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='regradejob',
+            name='claimed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -10,10 +10,10 @@ from .exercise_page import ExercisePage
 logger = logging.getLogger("aplus.protocol")
 
 
-def load_exercise_page(request, url, last_modified, exercise):
+def load_exercise_page(request, url, last_modified, exercise, background=False):
     """
-    Loads the exercise page from the remote URL.
-
+    Loads the exercise page from the remote URL. In the background, that is
+    outside the request of the user, no messages are added to the request.
     """
     page = ExercisePage(exercise)
     try:
@@ -23,8 +23,9 @@ def load_exercise_page(request, url, last_modified, exercise):
             exercise
         )
     except RemotePageException:
-        messages.error(request,
-            _("Connecting to the exercise service failed!"))
+        if not background:
+            messages.error(request,
+                _("Connecting to the exercise service failed!"))
         if exercise.id:
             instance = exercise.course_instance
             msg = "Failed to request {}".format(url)
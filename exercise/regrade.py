@@ -0,0 +1,158 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from urllib.parse import urlparse
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from lib.helpers import JobRequest
+from .submission_models import RegradeJob, Submission
+
+
+logger = logging.getLogger('aplus.exercise')
+
+# The number of submissions regraded before the progress is stored.
+CHUNK_SIZE = 50
+# The time a runner may use to regrade a chunk, before the job may be
+# claimed by another runner. The claim is renewed after each chunk.
+CLAIM_TIME = timedelta(minutes=15)
+
+
+def claim_jobs(limit):
+    """
+    Returns at most limit of the pending jobs and the running jobs whose
+    runner has stopped, and claims them for the caller, so that concurrent
+    runners do not regrade the same submissions.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        qs = RegradeJob.objects.filter(
+            Q(claimed_until__isnull=True) | Q(claimed_until__lt=now),
+            state__in=(RegradeJob.STATE.PENDING, RegradeJob.STATE.RUNNING),
+        ).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        ids = list(qs.values_list('id', flat=True)[:limit])
+        RegradeJob.objects.filter(id__in=ids).update(claimed_until=now + CLAIM_TIME)
+    return list(RegradeJob.objects.filter(id__in=ids)
+        .select_related('exercise', 'created_by__user')
+        .order_by('id'))
+
+
+class RegradeRunner:
+    """
+    Runs regrade jobs with a bounded thread pool. The grading requests to
+    a single exercise service host are limited by a semaphore per host.
+    At most max_jobs jobs are run at a time, each in a thread of another
+    pool, which stores the progress of the job after each chunk of
+    submissions while the job is still claimed by the runner.
+    """
+    def __init__(self, workers=8, per_host=4, max_jobs=4):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.job_executor = ThreadPoolExecutor(max_workers=max_jobs)
+        self.per_host = per_host
+        self.max_jobs = max_jobs
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    def host_semaphore(self, host):
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self.semaphores[host]
+
+    def run(self, jobs):
+        # Consumes the results to wait for the jobs to end.
+        list(self.job_executor.map(self.run_job, jobs))
+
+    def shutdown(self):
+        self.job_executor.shutdown()
+        self.executor.shutdown()
+
+    def run_job(self, job):
+        try:
+            self._run_job(job)
+        except Exception:
+            logger.exception("Regrade job %d failed", job.id)
+        finally:
+            connection.close()
+
+    def _run_job(self, job):
+        exercise = job.exercise.as_leaf_class()
+        if not exercise.can_regrade:
+            RegradeJob.objects.filter(id=job.id).update(state=RegradeJob.STATE.CANCELLED)
+            return
+        # The service URL may differ by language, but the versions are
+        # expected to be on the same host.
+        service_url = exercise.get_service_url(exercise.course_instance.default_language)
+        semaphore = self.host_semaphore(urlparse(service_url).netloc)
+        user = job.created_by.user if job.created_by else None
+        if not self.renew_claim(job, state=RegradeJob.STATE.RUNNING):
+            return
+
+        while True:
+            state = RegradeJob.objects.filter(id=job.id)\
+                .values_list('state', flat=True).first()
+            if state != RegradeJob.STATE.RUNNING:
+                # Cancelled or deleted while running.
+                return
+            if not self.renew_claim(job):
+                return
+            ids = list(job.get_submissions().values_list('id', flat=True)[:CHUNK_SIZE])
+            if not ids:
+                RegradeJob.objects.filter(id=job.id).update(state=RegradeJob.STATE.DONE)
+                return
+
+            futures = []
+            for submission_id in ids:
+                semaphore.acquire()
+                future = self.executor.submit(self.regrade, exercise, submission_id, user)
+                future.add_done_callback(lambda f: semaphore.release())
+                futures.append(future)
+            done = sum(1 for future in futures if future.result())
+
+            if not self.renew_claim(job,
+                    last_submission_id=ids[-1],
+                    done=F('done') + done,
+                    failed=F('failed') + len(ids) - done):
+                return
+            job.last_submission_id = ids[-1]
+
+    def renew_claim(self, job, **fields):
+        """
+        Renews the claim of the job and updates the fields, if the job is
+        still claimed by this runner. Returns False, if another runner has
+        claimed the job after the claim expired.
+        """
+        claimed_until = timezone.now() + CLAIM_TIME
+        updated = RegradeJob.objects.filter(
+            id=job.id,
+            claimed_until=job.claimed_until,
+        ).update(claimed_until=claimed_until, **fields)
+        if not updated:
+            logger.warning("Regrade job %d was claimed by another runner", job.id)
+            return False
+        job.claimed_until = claimed_until
+        return True
+
+    def regrade(self, exercise, submission_id, user):
+        """
+        Regrades the submission. Returns True, if the exercise service
+        accepted the submission.
+        """
+        try:
+            submission = Submission.objects.filter(id=submission_id).first()
+            if not submission:
+                return False
+            page = exercise.grade(JobRequest(user, 'POST'), submission)
+            for error in page.errors:
+                logger.warning("Regrading submission %d failed: %s", submission_id, error)
+            return not page.errors
+        except Exception:
+            logger.exception("Regrading submission %d failed", submission_id)
+            return False
+        finally:
+            connection.close()
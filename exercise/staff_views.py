@@ -16,6 +16,7 @@ from course.models import (
     USERTAG_EXTERNAL,
     USERTAG_INTERNAL,
 )
+from deviations.cache import CachedDeviations
 from deviations.models import MaxSubmissionsRuleDeviation
 from lib.helpers import settings_text, extract_form_errors
 from lib.viewbase import BaseRedirectView, BaseFormView, BaseView
@@ -26,8 +27,9 @@ from .forms import (
     SubmissionReviewForm,
     SubmissionCreateAndReviewForm,
     EditSubmittersForm,
+    RegradeJobForm,
 )
-from .submission_models import Submission
+from .submission_models import RegradeJob, Submission
 from .viewbase import (
     ExerciseBaseView,
     SubmissionBaseView,
@@ -82,6 +84,46 @@ class ResubmitSubmissionView(SubmissionMixin, BaseRedirectView):
         return self.redirect(self.submission.get_inspect_url())
 
 
+class RegradeSubmissionsView(ExerciseMixin, BaseFormView):
+    """
+    Creates jobs that regrade the selected submissions of the exercise in
+    the background and shows the progress of the jobs.
+    """
+    access_mode = ACCESS.TEACHER
+    template_name = "exercise/staff/regrade_submissions.html"
+    form_class = RegradeJobForm
+
+    def get_common_objects(self):
+        super().get_common_objects()
+        if not self.exercise.is_submittable or not self.exercise.can_regrade:
+            raise Http404()
+        self.jobs = self.exercise.regrade_jobs.select_related('created_by__user')[:20]
+        self.note("jobs")
+
+    def get_success_url(self):
+        return self.exercise.get_url('submission-regrade')
+
+    def post(self, request, *args, **kwargs):
+        if 'cancel' in request.POST:
+            RegradeJob.objects.filter(
+                id=request.POST['cancel'],
+                exercise=self.exercise,
+                state__in=(RegradeJob.STATE.PENDING, RegradeJob.STATE.RUNNING),
+            ).update(state=RegradeJob.STATE.CANCELLED)
+            return self.redirect(self.get_success_url())
+        return super().post(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        job = form.save(commit=False)
+        job.exercise = self.exercise
+        job.created_by = self.profile
+        job.total = job.get_submissions().count()
+        job.save()
+        messages.success(self.request,
+            _("Regrading of {count:d} submissions was queued.").format(count=job.total))
+        return super().form_valid(form)
+
+
 class IncreaseSubmissionMaxView(SubmissionMixin, BaseRedirectView):
     access_mode = ACCESS.GRADING
 
@@ -94,6 +136,7 @@ class IncreaseSubmissionMaxView(SubmissionMixin, BaseRedirectView):
         MaxSubmissionsRuleDeviation.objects\
             .filter(id=deviation.id)\
             .update(extra_submissions=(F('extra_submissions') + 1))
+        CachedDeviations.invalidate(self.instance)
         return self.redirect(self.submission.get_inspect_url())
 
 
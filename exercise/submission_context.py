@@ -0,0 +1,65 @@
+from django.utils.functional import cached_property
+
+
+class SubmissionContext(object):
+    """
+    SubmissionContext holds the data that is needed to decide whether the
+    given students may submit to an exercise: their submission counts,
+    deadline and max submissions deviations and course staff status.
+    Each kind of data is loaded for all the students with one query when it
+    is first needed, so the number of queries does not depend on the number
+    of students. The submission counts are read from the SubmissionCounters
+    and the deviations from the CachedDeviations of the course instance.
+
+    The data is not updated, so a context must not be used after new
+    submissions or deviations have been saved.
+    """
+    def __init__(self, exercise, students):
+        self.exercise = exercise
+        self.students = list(students)
+        self.student_ids = [p.id for p in self.students]
+
+    @cached_property
+    def _submission_counts(self):
+        from .submission_models import SubmissionCounter
+        return SubmissionCounter.objects.get_counts(self.exercise, self.student_ids)
+
+    @cached_property
+    def _deviations(self):
+        from deviations.cache import CachedDeviations
+        return CachedDeviations(self.exercise.course_instance)
+
+    @cached_property
+    def deadline_deviation(self):
+        """
+        The deadline deviation with the latest new deadline or None.
+        """
+        deviation = None
+        for student_id in self.student_ids:
+            d = self._deviations.deadline_deviation(self.exercise, student_id)
+            if d and (not deviation or d.get_new_deadline() > deviation.get_new_deadline()):
+                deviation = d
+        return deviation
+
+    @cached_property
+    def _staff_ids(self):
+        from django.db.models import Q
+        from userprofile.models import UserProfile
+        staff = self.exercise.course_instance.get_course_staff_profiles()
+        return set(
+            UserProfile.objects
+            .filter(id__in=self.student_ids)
+            .filter(Q(id__in=staff.values('id')) | Q(user__is_superuser=True))
+            .values_list('id', flat=True)
+        )
+
+    def submission_count(self, profile, exclude_errors=False):
+        total, valid = self._submission_counts.get(profile.id, (0, 0))
+        return valid if exclude_errors else total
+
+    def max_submissions_for_student(self, profile):
+        return self.exercise.max_submissions + \
+            self._deviations.extra_submissions(self.exercise.id, profile.id)
+
+    def is_course_staff(self, profile):
+        return profile.id in self._staff_ids
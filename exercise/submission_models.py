@@ -2,15 +2,20 @@ import itertools
 import logging
 import os
 import json
+from collections import defaultdict
 
 from django.conf import settings
 from django.core.files.storage import default_storage
-from django.db import models, DatabaseError
-from django.db.models.signals import post_delete
+from django.db import connection, models, transaction, DatabaseError
+from django.db.models import Count, F, Q
+from django.db.models.signals import m2m_changed, post_delete, post_init, \
+    post_save, pre_delete
 from django.utils import timezone
 from django.utils.translation import get_language, ugettext_lazy as _
 from mimetypes import guess_type
 
+from course.models import CourseHook, CourseHookDelivery
+from lib.cache import deferred_invalidation
 from lib.fields import JSONField, PercentField
 from lib.helpers import get_random_string, query_dict_to_list_of_tuples, \
     safe_file_name, Enum
@@ -163,10 +168,25 @@ class Submission(UrlMixin, models.Model):
     class Meta:
         app_label = 'exercise'
         ordering = ['-id']
+        indexes = [
+            # The submissions of an exercise are filtered by the status
+            # (exclude_errors, the best grades of the results table) and
+            # ordered by the time (ordinal).
+            models.Index(fields=['exercise', 'status', 'grade'], name='exercise_sub_status_grade_idx'),
+            models.Index(fields=['exercise', 'submission_time'], name='exercise_sub_time_idx'),
+        ]
 
     def __str__(self):
         return str(self.id)
 
+    @property
+    def is_counted_valid(self):
+        """
+        Tells if the submission counts towards the submission limit, that is,
+        the status is not an error.
+        """
+        return self.status not in (self.STATUS.ERROR, self.STATUS.REJECTED)
+
     def ordinal_number(self):
         return self.submitters.first().submissions.exclude_errors().filter(
             exercise=self.exercise,
@@ -193,6 +213,7 @@ class Submission(UrlMixin, models.Model):
     def get_post_parameters(self, request, url):
         """
         Produces submission data for POST as (data_dict, files_dict).
+        The files_dict values are lists of (filename, file) tuples.
         """
         self._data = {}
         for (key, value) in self.submission_data or {}:
@@ -201,13 +222,14 @@ class Submission(UrlMixin, models.Model):
             else:
                 self._data[key] = [ value ]
 
+        # The files are streamed to the grader by lib.multipart, which
+        # supports multiple files per name.
         self._files = {}
         for file in self.files.all().order_by("id"):
-            # Requests supports only one file per name in a multipart post.
-            self._files[file.param_name] = (
+            self._files.setdefault(file.param_name, []).append((
                 file.filename,
                 open(file.file_object.path, "rb")
-            )
+            ))
 
         students = list(self.submitters.all())
         if self.is_submitter(request.user):
@@ -219,8 +241,9 @@ class Submission(UrlMixin, models.Model):
         return (self._data, self._files)
 
     def clean_post_parameters(self):
-        for key in self._files.keys():
-            self._files[key][1].close()
+        for files in self._files.values():
+            for _, file in (files if isinstance(files, list) else [files]):
+                file.close()
         del self._files
         del self._data
 
@@ -293,12 +316,18 @@ class Submission(UrlMixin, models.Model):
         # Fire set hooks.
         for hook in self.exercise.course_module.course_instance \
                 .course_hooks.filter(hook_type="post-grading"):
-            hook.trigger({
-                "submission_id": self.id,
-                "exercise_id": self.exercise.id,
-                "course_id": self.exercise.course_module.course_instance.id,
-                "site": settings.BASE_URL,
-            })
+            hook.trigger(self.post_grading_hook_data())
+
+    def post_grading_hook_data(self):
+        """
+        Returns the data that is posted to the post grading hooks.
+        """
+        return {
+            "submission_id": self.id,
+            "exercise_id": self.exercise.id,
+            "course_id": self.exercise.course_module.course_instance.id,
+            "site": settings.BASE_URL,
+        }
 
     def set_rejected(self):
         self.status = self.STATUS.REJECTED
@@ -394,6 +423,254 @@ class SubmittedFile(UrlMixin, models.Model):
             **self.submission.get_url_kwargs())
 
 
+class SubmissionCounterManager(models.Manager):
+
+    def get_counts(self, exercise, profile_ids):
+        """
+        Returns a dict from the profile ids to tuples of the total and the
+        valid (not error) submission counts of the profiles in the exercise.
+        """
+        return {
+            profile_id: (total, valid)
+            for profile_id, total, valid in self.filter(
+                exercise=exercise,
+                profile_id__in=profile_ids,
+            ).values_list('profile_id', 'total', 'valid')
+        }
+
+    def add(self, exercise_id, profile_ids, total, valid):
+        """
+        Atomically adds the given amounts to the counters of the profiles.
+        """
+        profile_ids = list(profile_ids)
+        if not profile_ids or not (total or valid):
+            return
+        with transaction.atomic():
+            self.bulk_create(
+                [self.model(exercise_id=exercise_id, profile_id=profile_id)
+                    for profile_id in profile_ids],
+                ignore_conflicts=True,
+            )
+            self.filter(
+                exercise_id=exercise_id,
+                profile_id__in=profile_ids,
+            ).update(
+                total=F('total') + total,
+                valid=F('valid') + valid,
+            )
+
+    def count_submissions(self, submissions=None):
+        """
+        Counts the submissions from the submissions table. Returns tuples of
+        exercise id, profile id, total count and valid count for each
+        exercise and submitter pair.
+        """
+        if submissions is None:
+            submissions = Submission.objects.all()
+        counts = (
+            submissions
+            .values('exercise_id', 'submitters')
+            .annotate(
+                total=Count('id'),
+                valid=Count('id', filter=~Q(status__in=(
+                    Submission.STATUS.ERROR,
+                    Submission.STATUS.REJECTED,
+                ))),
+            )
+            .order_by()
+        )
+        return (
+            (c['exercise_id'], c['submitters'], c['total'], c['valid'])
+            for c in counts if c['submitters'] is not None
+        )
+
+
+class SubmissionCounter(models.Model):
+    """
+    The number of submissions of a student to an exercise. The counters are
+    maintained when the submitters, the status or the existence of the
+    submissions change, so that the submission limits may be checked without
+    counting the submissions.
+    """
+    exercise = models.ForeignKey(exercise_models.BaseExercise,
+        on_delete=models.CASCADE,
+        related_name="submission_counters")
+    profile = models.ForeignKey(UserProfile,
+        on_delete=models.CASCADE,
+        related_name="submission_counters")
+    total = models.IntegerField(default=0)
+    # Submissions that are not errors or rejected.
+    valid = models.IntegerField(default=0)
+
+    objects = SubmissionCounterManager()
+
+    class Meta:
+        app_label = 'exercise'
+        unique_together = ('exercise', 'profile')
+
+    def __str__(self):
+        return "{}: {}/{}".format(self.profile, self.valid, self.total)
+
+
+def _remember_status(sender, instance, **kwargs):
+    # The status is missing when the field is deferred.
+    status = instance.__dict__.get('status')
+    instance._counted_valid = (
+        None if status is None or instance.pk is None
+        else instance.is_counted_valid
+    )
+
+
+def _count_status_change(sender, instance, created, **kwargs):
+    was_valid = getattr(instance, '_counted_valid', None)
+    if 'status' not in instance.__dict__:
+        return
+    is_valid = instance.is_counted_valid
+    if not created and was_valid is not None and was_valid != is_valid:
+        SubmissionCounter.objects.add(
+            instance.exercise_id,
+            instance.submitters.values_list('id', flat=True),
+            0, 1 if is_valid else -1,
+        )
+    instance._counted_valid = is_valid
+
+
+def _count_submitters(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'pre_remove', 'pre_clear'):
+        return
+    sign = 1 if action == 'post_add' else -1
+    if not reverse:
+        # The submitters of a submission changed.
+        if action == 'post_add':
+            profile_ids = pk_set
+        else:
+            profiles = instance.submitters.all()
+            if action == 'pre_remove':
+                profiles = profiles.filter(id__in=pk_set)
+            profile_ids = profiles.values_list('id', flat=True)
+        SubmissionCounter.objects.add(
+            instance.exercise_id, profile_ids,
+            sign, sign if instance.is_counted_valid else 0,
+        )
+    else:
+        # The submissions of a profile changed.
+        if action == 'post_add':
+            submissions = Submission.objects.filter(id__in=pk_set)
+        else:
+            submissions = instance.submissions.all()
+            if action == 'pre_remove':
+                submissions = submissions.filter(id__in=pk_set)
+        for submission in submissions.prefetch_related(None).only('exercise_id', 'status'):
+            SubmissionCounter.objects.add(
+                submission.exercise_id, [instance.id],
+                sign, sign if submission.is_counted_valid else 0,
+            )
+
+
+def _count_deleted(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    SubmissionCounter.objects.add(
+        instance.exercise_id,
+        instance.submitters.values_list('id', flat=True),
+        -1, -1 if instance.is_counted_valid else 0,
+    )
+
+
+# The receivers of the Submission signals are replicated for bulk inserts
+# in create_submissions_in_bulk.
+post_init.connect(_remember_status, Submission)
+post_save.connect(_count_status_change, Submission)
+m2m_changed.connect(_count_submitters, Submission.submitters.through)
+pre_delete.connect(_count_deleted, Submission)
+
+
+def create_submissions_in_bulk(submissions):
+    """
+    Inserts graded submissions in bulk. The submitters of each submission
+    are given in its bulk_submitters list of profiles.
+
+    No model signals are sent for bulk inserts, thus this function does what
+    the receivers of the Submission signals would do:
+    - updates the submission counters (_count_status_change and
+      _count_submitters above),
+    - invalidates the cached points of the submitters (invalidate_content in
+      exercise/cache/points.py),
+    - queues the post grading hooks (Submission.set_ready) and
+    - checks the exercise collections (update_exercise_collection_submission
+      in exercise/exercisecollection_models.py).
+    A new receiver of the Submission signals must be replicated here too.
+    """
+    from .cache.points import CachedPoints
+    from .exercisecollection_models import ExerciseCollection
+
+    # The submission time is added automatically on insert.
+    submission_times = [sub.submission_time for sub in submissions]
+    with deferred_invalidation(), transaction.atomic():
+        if connection.features.can_return_ids_from_bulk_insert:
+            Submission.objects.bulk_create(submissions)
+        else:
+            # The ids are required for the submitters.
+            for sub in submissions:
+                sub.save()
+        for sub, submission_time in zip(submissions, submission_times):
+            if submission_time:
+                sub.submission_time = submission_time
+        Submission.objects.bulk_update(submissions, ['submission_time'],
+            batch_size=1000)
+
+        Submitters = Submission.submitters.through
+        Submitters.objects.bulk_create(
+            Submitters(submission_id=sub.id, userprofile_id=profile.id)
+            for sub in submissions for profile in sub.bulk_submitters
+        )
+
+        counts = defaultdict(lambda: [0, 0])
+        users = {}
+        for sub in submissions:
+            for profile in sub.bulk_submitters:
+                count = counts[(sub.exercise_id, profile.id)]
+                count[0] += 1
+                if sub.is_counted_valid:
+                    count[1] += 1
+                users[(sub.exercise.course_instance.id, profile.id)] = profile.user
+        # The counters with equal changes are updated together.
+        changes = defaultdict(list)
+        for (exercise_id, profile_id), (total, valid) in counts.items():
+            changes[(exercise_id, total, valid)].append(profile_id)
+        for (exercise_id, total, valid), profile_ids in changes.items():
+            SubmissionCounter.objects.add(exercise_id, profile_ids, total, valid)
+        for (course_instance_id, profile_id), user in users.items():
+            CachedPoints.invalidate(course_instance_id, user)
+
+        # The hooks are queued in the same transaction, so that they are
+        # delivered if and only if the submissions are saved.
+        hooks = defaultdict(list)
+        for hook in CourseHook.objects.filter(
+                hook_type="post-grading",
+                course_instance__in={sub.exercise.course_instance.id for sub in submissions}):
+            hooks[hook.course_instance_id].append(hook)
+        CourseHookDelivery.objects.bulk_create(
+            CourseHookDelivery(hook=hook, data=sub.post_grading_hook_data())
+            for sub in submissions
+            for hook in hooks[sub.exercise.course_instance.id]
+        )
+
+    # The collections are checked after the cached points are invalidated.
+    collections = defaultdict(list)
+    for collection in ExerciseCollection.objects.filter(
+            target_category__in={sub.exercise.category_id for sub in submissions}):
+        collections[collection.target_category_id].append(collection)
+    checked = set()
+    for sub in submissions:
+        if sub.bulk_submitters:
+            user = sub.bulk_submitters[0].user
+            for collection in collections[sub.exercise.category_id]:
+                if (collection.id, user.id) not in checked:
+                    checked.add((collection.id, user.id))
+                    collection.check_submission(user)
+
+
 def _delete_file(sender, instance, **kwargs):
     """
     Deletes the actual submission files after the submission in database is
@@ -401,3 +678,74 @@ def _delete_file(sender, instance, **kwargs):
     """
     instance.file_object.delete(save=False)
 post_delete.connect(_delete_file, SubmittedFile)
+
+
+class RegradeJob(models.Model):
+    """
+    Regrades the submissions of an exercise in the background. The
+    submissions are regraded in the order of their ids, and the id of the
+    last regraded submission is stored, so that an interrupted job may be
+    resumed. The jobs are run by the run_regrade_jobs command.
+    """
+    STATE = Enum([
+        ('PENDING', 'pending', _("Pending")),
+        ('RUNNING', 'running', _("Running")),
+        ('DONE', 'done', _("Done")),
+        ('CANCELLED', 'cancelled', _("Cancelled")),
+    ])
+    exercise = models.ForeignKey(exercise_models.BaseExercise,
+        on_delete=models.CASCADE,
+        related_name="regrade_jobs")
+    created_by = models.ForeignKey(UserProfile,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        null=True)
+    created = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField(auto_now=True)
+    state = models.CharField(max_length=32, choices=STATE.choices,
+        default=STATE.PENDING)
+    # The job is being run by a runner until this time.
+    claimed_until = models.DateTimeField(null=True, blank=True)
+    # The selection of the submissions. Blank status selects all.
+    submission_status = models.CharField(max_length=32, blank=True,
+        choices=Submission.STATUS.choices)
+    submitted_after = models.DateTimeField(null=True, blank=True)
+    submitted_before = models.DateTimeField(null=True, blank=True)
+    # The progress of the job.
+    last_submission_id = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    done = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+
+    class Meta:
+        app_label = 'exercise'
+        ordering = ['-id']
+
+    def __str__(self):
+        return "{}: {}/{}".format(self.exercise, self.done + self.failed, self.total)
+
+    def get_submissions(self):
+        """
+        Returns the selected submissions that have not been regraded yet.
+        """
+        qs = Submission.objects.filter(
+            exercise=self.exercise_id,
+            id__gt=self.last_submission_id,
+        )
+        if self.submission_status:
+            qs = qs.filter(status=self.submission_status)
+        if self.submitted_after:
+            qs = qs.filter(submission_time__gte=self.submitted_after)
+        if self.submitted_before:
+            qs = qs.filter(submission_time__lt=self.submitted_before)
+        return qs.prefetch_related(None).order_by('id')
+
+    @property
+    def is_active(self):
+        return self.state in (self.STATE.PENDING, self.STATE.RUNNING)
+
+    @property
+    def progress(self):
+        if not self.total:
+            return 100
+        return int(100 * (self.done + self.failed) / self.total)
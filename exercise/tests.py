@@ -2,24 +2,31 @@ import json
 import os.path
 import urllib
 from datetime import datetime, timedelta
+from concurrent.futures import Future
 from io import BytesIO, StringIO
+from unittest.mock import patch
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core import mail
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.urls import reverse
+from django.db import connection
 from django.test import TestCase
 from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.utils.datastructures import MultiValueDict
 
 from course.models import Course, CourseInstance, CourseHook, CourseModule, \
-    LearningObjectCategory
+    LearningObjectCategory, StudentGroup
 from deviations.models import DeadlineRuleDeviation, \
     MaxSubmissionsRuleDeviation
 from exercise.exercise_summary import UserExerciseSummary
 from exercise.models import BaseExercise, StaticExercise, \
-    ExerciseWithAttachment, Submission, SubmittedFile, LearningObject
+    ExerciseWithAttachment, Submission, SubmissionCounter, SubmittedFile, \
+    LearningObject
 from exercise.protocol.exercise_page import ExercisePage
 
 
@@ -289,6 +296,25 @@ class ExerciseTest(TestCase):
         self.assertEqual(self.course_instance, self.learning_object.course_instance)
         self.assertEqual(self.course_instance, self.broken_learning_object.course_instance)
 
+    def test_learning_object_leaf_classes(self):
+        objects = LearningObject.objects.filter(
+            course_module__course_instance=self.course_instance)
+        expected = [o.as_leaf_class() for o in objects]
+        leaf_classes = set(o.__class__ for o in expected)
+        self.assertGreater(len(leaf_classes), 1)
+        # One query for the objects and one for each leaf class.
+        with self.assertNumQueries(1 + len(leaf_classes)):
+            leaves = objects.as_leaf_classes()
+        self.assertEqual(
+            [(o.id, o.__class__) for o in leaves],
+            [(o.id, o.__class__) for o in expected],
+        )
+        self.assertEqual(
+            [(o.id, o.__class__) for o in LearningObject.leaf_objects.filter(
+                course_module__course_instance=self.course_instance)],
+            [(o.id, o.__class__) for o in expected],
+        )
+
     def test_base_exercise_one_has_submissions(self):
         self.assertFalse(self.base_exercise.one_has_submissions([self.user.userprofile])[0])
         self.assertTrue(self.static_exercise.one_has_submissions([self.user.userprofile])[0])
@@ -416,6 +442,109 @@ class ExerciseTest(TestCase):
         )
         self.assertTrue(self.base_exercise.one_has_submissions([self.user.userprofile])[0])
 
+    def test_base_exercise_submission_context(self):
+        MaxSubmissionsRuleDeviation.objects.create(
+            exercise=self.base_exercise,
+            submitter=self.user2.userprofile,
+            extra_submissions=3
+        )
+        students = [self.user.userprofile, self.user2.userprofile]
+        context = self.base_exercise.get_submission_context(students)
+        self.assertEqual(context.submission_count(self.user.userprofile), 3)
+        self.assertEqual(context.submission_count(self.user2.userprofile), 1)
+        self.assertEqual(context.max_submissions_for_student(self.user.userprofile), 1)
+        self.assertEqual(context.max_submissions_for_student(self.user2.userprofile), 4)
+        self.assertTrue(self.base_exercise.one_has_submissions(students, context)[0])
+
+        # The number of queries does not depend on the number of students.
+        with CaptureQueriesContext(connection) as one_student:
+            self.base_exercise.one_has_submissions(students[:1])
+            self.base_exercise.one_has_access(students[:1])
+        with CaptureQueriesContext(connection) as two_students:
+            self.base_exercise.one_has_submissions(students)
+            self.base_exercise.one_has_access(students)
+        self.assertEqual(len(one_student), len(two_students))
+
+        # The members of a group submission do not have their users loaded.
+        group = StudentGroup.objects.create(course_instance=self.course_instance)
+        group.members.add(self.user.userprofile, self.user2.userprofile)
+        group = StudentGroup.objects.prefetch_related('members').get(id=group.id)
+        members = list(group.members.all())
+        self.base_exercise.get_submission_context(members)\
+            .max_submissions_for_student(members[0])
+        context = self.base_exercise.get_submission_context(members)
+        with self.assertNumQueries(2):
+            for profile in members:
+                self.assertFalse(context.is_course_staff(profile))
+                context.submission_count(profile)
+                context.max_submissions_for_student(profile)
+
+    def test_submission_counters(self):
+        def counts():
+            return SubmissionCounter.objects.get_counts(
+                self.base_exercise,
+                [self.user.userprofile.id, self.user2.userprofile.id],
+            )
+        self.assertEqual(counts(), {
+            self.user.userprofile.id: (3, 3),
+            self.user2.userprofile.id: (1, 1),
+        })
+        self.submission_with_two_submitters.set_error()
+        self.submission_with_two_submitters.save()
+        self.submission_with_two_submitters.save()
+        self.assertEqual(counts(), {
+            self.user.userprofile.id: (3, 2),
+            self.user2.userprofile.id: (1, 0),
+        })
+        self.submission_with_two_submitters.submitters.remove(self.user2.userprofile)
+        self.user2.userprofile.submissions.add(self.submission)
+        self.submission.status = Submission.STATUS.READY
+        self.submission.save()
+        self.late_submission.delete()
+        self.assertEqual(counts(), {
+            self.user.userprofile.id: (2, 1),
+            self.user2.userprofile.id: (1, 1),
+        })
+
+        out = StringIO()
+        call_command('check_submission_counters', stdout=out)
+        self.assertIn("All submission counters are correct.", out.getvalue())
+        SubmissionCounter.objects.filter(profile=self.user2.userprofile).delete()
+        call_command('check_submission_counters', '--fix', stdout=out)
+        self.assertEqual(counts()[self.user2.userprofile.id], (1, 1))
+
+    def test_submissions_sheet(self):
+        from exercise.api.csv.submission_sheet import submissions_sheet
+        request = RequestFactory().get('/')
+        queryset = Submission.objects.filter(exercise=self.base_exercise)
+        for submission, grade in ((self.submission, 5), (self.late_submission, 3),
+                (self.submission_with_two_submitters, 4)):
+            submission.grade = grade
+            submission.status = Submission.STATUS.READY
+            submission.save()
+
+        sheet, fields = submissions_sheet(request, queryset)
+        self.assertEqual(len(sheet), 4)
+        self.assertEqual(fields[:3], ['ExerciseID', 'Category', 'Exercise'])
+        sheet, fields = submissions_sheet(request, queryset, best=True)
+        self.assertEqual(
+            [(row['SubmissionID'], row['UserID']) for row in sheet],
+            [(self.submission.id, self.user.id)]
+        )
+
+        # The number of queries does not depend on the number of submissions.
+        with CaptureQueriesContext(connection) as three_submissions:
+            submissions_sheet(request, queryset)
+        for i in range(3):
+            submission = Submission.objects.create(
+                exercise=self.base_exercise,
+                grader=self.grader.userprofile,
+            )
+            submission.submitters.add(self.user2.userprofile)
+        with CaptureQueriesContext(connection) as six_submissions:
+            submissions_sheet(request, queryset)
+        self.assertEqual(len(three_submissions), len(six_submissions))
+
     def test_base_exercise_deadline_deviation(self):
         self.assertFalse(self.old_base_exercise.one_has_access([self.user.userprofile])[0])
         deviation = DeadlineRuleDeviation.objects.create(
@@ -459,6 +588,184 @@ class ExerciseTest(TestCase):
         self.assertEqual(['50'], static_exercise_url_params['max_points'])
         self.assertEqual(['http://localhost:8001/service'], static_exercise_url_params['submission_url'])
 
+    def test_grader_batch(self):
+        from lib.api.authentication import get_graderauth_submission_params
+        self.course_hook.delete()
+        def token(submission):
+            return get_graderauth_submission_params(submission)[0][1]
+        response = self.client.post('/api/v2/grader/batch', json.dumps({
+            'results': [
+                {
+                    'token': token(self.submission),
+                    'points': 40,
+                    'max_points': 50,
+                    'feedback': 'Good',
+                },
+                {
+                    'token': token(self.submission_with_two_submitters),
+                    'points': 60,
+                    'max_points': 50,
+                },
+                {
+                    'token': token(self.late_submission)[:-1],
+                    'points': 10,
+                },
+                {
+                    'points': 10,
+                },
+            ],
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['success'] for r in results], [True, False, False, False])
+        self.assertEqual(results[0]['token'], token(self.submission))
+
+        submission = Submission.objects.get(id=self.submission.id)
+        self.assertEqual(submission.status, Submission.STATUS.READY)
+        self.assertEqual(submission.grade, 80)
+        self.assertEqual(submission.feedback, 'Good')
+        submission = Submission.objects.get(id=self.submission_with_two_submitters.id)
+        self.assertEqual(submission.status, Submission.STATUS.ERROR)
+        submission = Submission.objects.get(id=self.late_submission.id)
+        self.assertEqual(submission.status, Submission.STATUS.INITIALIZED)
+
+        response = self.client.post('/api/v2/grader/batch', json.dumps({'results': 1}),
+            content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_regrade_job(self):
+        from exercise.models import RegradeJob
+        self.submission.status = Submission.STATUS.READY
+        self.submission.save()
+        self.late_submission.status = Submission.STATUS.READY
+        self.late_submission.save()
+        url = self.base_exercise.get_url('submission-regrade')
+        self.client.login(username="staff", password="staffPassword")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(url, {'submission_status': 'ready'})
+        self.assertEqual(response.status_code, 302)
+        job = RegradeJob.objects.get(exercise=self.base_exercise)
+        self.assertEqual(job.created_by, self.teacher.userprofile)
+        self.assertEqual(job.state, RegradeJob.STATE.PENDING)
+        self.assertEqual(job.total, 2)
+        self.assertEqual(list(job.get_submissions()),
+            [self.submission, self.late_submission])
+
+        # The job resumes after the last regraded submission.
+        job.last_submission_id = self.submission.id
+        self.assertEqual(list(job.get_submissions()), [self.late_submission])
+
+        self.client.post(url, {'cancel': job.id})
+        job.refresh_from_db()
+        self.assertEqual(job.state, RegradeJob.STATE.CANCELLED)
+        self.assertFalse(job.is_active)
+
+    def test_error_reports(self):
+        from exercise.models import ErrorReport
+        from lib.email_messages import email_course_error
+        self.course_instance.technical_error_emails = "tech@example.com"
+        self.course_instance.save()
+        request = RequestFactory().request(SERVER_NAME='localhost', SERVER_PORT='8001')
+        for i in range(3):
+            email_course_error(request, self.base_exercise,
+                "Failed to request http://localhost/{:d}".format(i), False)
+        email_course_error(request, self.static_exercise, "Failed", False)
+        report = ErrorReport.objects.get(exercise=self.base_exercise)
+        self.assertEqual(report.count, 3)
+        self.assertEqual(report.error_class, "Failed to request #")
+        self.assertIn("http://localhost/0", report.message)
+
+        # The reports are not sent before the window has passed.
+        call_command('send_error_reports', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 0)
+        ErrorReport.objects.update(created=timezone.now()
+            - timedelta(seconds=settings.EXERCISE_ERROR_WINDOW + 1))
+        call_command('send_error_reports', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["tech@example.com"])
+        self.assertIn("4 incidents", mail.outbox[0].subject)
+        self.assertFalse(ErrorReport.objects.filter(sent__isnull=True).exists())
+
+        # A new report is started after the previous one is sent.
+        email_course_error(request, self.base_exercise,
+            "Failed to request http://localhost/3", False)
+        self.assertEqual(ErrorReport.objects.filter(sent__isnull=True).count(), 1)
+
+    def test_regrade_runner(self):
+        from exercise.models import RegradeJob
+        from exercise.regrade import RegradeRunner, claim_jobs
+
+        class SynchronousExecutor:
+            def submit(self, fn, *args):
+                future = Future()
+                future.set_result(fn(*args))
+                return future
+            def map(self, fn, items):
+                return [fn(item) for item in items]
+            def shutdown(self):
+                pass
+
+        def grade(request, submission, *args, **kwargs):
+            page = ExercisePage(self.base_exercise)
+            if submission.id == self.late_submission.id:
+                page.errors.append("The service failed.")
+            return page
+
+        def run(job):
+            runner = RegradeRunner(per_host=1)
+            runner.executor = SynchronousExecutor()
+            runner.job_executor = SynchronousExecutor()
+            with patch('exercise.regrade.connection'), \
+                    patch.object(BaseExercise, 'grade', side_effect=grade) as mock:
+                runner.run([job])
+            job.refresh_from_db()
+            return [call[0][1].id for call in mock.call_args_list]
+
+        self.submission.status = Submission.STATUS.READY
+        self.submission.save()
+        self.late_submission.status = Submission.STATUS.READY
+        self.late_submission.save()
+        job = RegradeJob.objects.create(exercise=self.base_exercise,
+            submission_status=Submission.STATUS.READY, total=2)
+        other = RegradeJob.objects.create(exercise=self.base_exercise,
+            submission_status=Submission.STATUS.READY, total=2)
+        # The number of claimed jobs is limited.
+        self.assertEqual(claim_jobs(1), [job])
+        # A claimed job is not claimed again.
+        self.assertEqual(claim_jobs(1), [other])
+        self.assertEqual(claim_jobs(1), [])
+        job = RegradeJob.objects.get(id=job.id)
+        self.assertEqual(run(job), [self.submission.id, self.late_submission.id])
+        self.assertEqual(job.state, RegradeJob.STATE.DONE)
+        self.assertEqual(job.done, 1)
+        self.assertEqual(job.failed, 1)
+        self.assertEqual(job.last_submission_id, self.late_submission.id)
+
+        # A runner stops when another runner has claimed the job.
+        other = RegradeJob.objects.get(id=other.id)
+        RegradeJob.objects.filter(id=other.id).update(
+            claimed_until=other.claimed_until + timedelta(minutes=1))
+        self.assertEqual(run(other), [])
+        self.assertEqual(other.state, RegradeJob.STATE.PENDING)
+        other.delete()
+
+        # An interrupted job is resumed after its claim has expired.
+        job = RegradeJob.objects.create(exercise=self.base_exercise,
+            submission_status=Submission.STATUS.READY, total=2,
+            state=RegradeJob.STATE.RUNNING, done=1,
+            last_submission_id=self.submission.id,
+            claimed_until=timezone.now() + timedelta(minutes=1))
+        self.assertEqual(claim_jobs(1), [])
+        job.claimed_until = timezone.now() - timedelta(minutes=1)
+        job.save()
+        job, = claim_jobs(1)
+        self.assertEqual(run(job), [self.late_submission.id])
+        self.assertEqual(job.state, RegradeJob.STATE.DONE)
+        self.assertEqual(job.done, 1)
+        self.assertEqual(job.failed, 1)
+        self.assertEqual(job.last_submission_id, self.late_submission.id)
+
     def test_static_exercise_load(self):
         request = RequestFactory().request(SERVER_NAME='localhost', SERVER_PORT='8001')
         static_exercise_page = self.static_exercise.load(request, [self.user.userprofile])
@@ -1,9 +1,19 @@
+import time
+from unittest.mock import patch
+
+from django.core.cache import cache
+from django.test import override_settings
+
+from lib.helpers import JobRequest
+from lib.remote_page import RemotePageException
 from lib.testdata import CourseTestCase
 from course.models import CourseModule, LearningObjectCategory
 from .cache.content import CachedContent
+from .cache.exercise import ExerciseCache
 from .cache.hierarchy import PreviousIterator
-from .cache.points import CachedPoints
+from .cache.points import CachedPoints, CourseSubmissions
 from .models import BaseExercise, StaticExercise, Submission
+from .protocol.exercise_page import ExercisePage
 
 
 class CachedContentTest(CourseTestCase):
@@ -118,6 +128,96 @@ class CachedContentTest(CourseTestCase):
         self.assertEqual(nex['id'], self.module2.id)
 
 
+class SynchronousThread:
+    def __init__(self, target, args=(), daemon=None):
+        self.target = target
+        self.args = args
+
+    def start(self):
+        self.target(*self.args)
+
+
+class ExerciseCacheTest(CourseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def page(self, content, expires, loaded=True):
+        page = ExercisePage(self.exercise0)
+        page.is_loaded = loaded
+        page.content = content
+        page.expires = expires
+        return page
+
+    def exercise_cache(self, *pages):
+        with patch.object(self.exercise0, 'load_page', side_effect=pages) as load_page:
+            c = ExerciseCache(self.exercise0, 'en', None, [], 'exercise')
+        return c, load_page.call_count
+
+    @override_settings(EXERCISE_CACHE_REFRESH_IN_BACKGROUND=False)
+    def test_stale_if_error(self):
+        c, loads = self.exercise_cache(self.page("first", time.time() - 10))
+        self.assertEqual(c.content(), "first")
+        c, loads = self.exercise_cache(self.page("", 0, loaded=False))
+        self.assertEqual(loads, 1)
+        self.assertEqual(c.content(), "first")
+        c, loads = self.exercise_cache(self.page("second", time.time() + 60))
+        self.assertEqual(c.content(), "second")
+        c, loads = self.exercise_cache()
+        self.assertEqual(loads, 0)
+        self.assertEqual(c.content(), "second")
+
+    @override_settings(EXERCISE_CACHE_REFRESH_IN_BACKGROUND=False, EXERCISE_CACHE_MAX_STALENESS=5)
+    def test_max_staleness(self):
+        self.exercise_cache(self.page("first", time.time() - 10))
+        c, loads = self.exercise_cache(self.page("", 0, loaded=False))
+        self.assertEqual(loads, 1)
+        self.assertEqual(c.content(), "")
+
+    @patch('exercise.cache.exercise.connections')
+    @patch('exercise.cache.exercise.Thread', SynchronousThread)
+    def test_background_refresh(self, connections):
+        self.exercise_cache(self.page("first", time.time() - 10))
+        c, loads = self.exercise_cache(self.page("", 0, loaded=False))
+        self.assertEqual(loads, 1)
+        self.assertEqual(c.content(), "first")
+        # The failed refresh holds the lock for a while.
+        c, loads = self.exercise_cache()
+        self.assertEqual(loads, 0)
+        self.assertEqual(c.content(), "first")
+
+        cache.delete("exercise:{:d},en:refresh".format(self.exercise0.id))
+        ExerciseCache.invalidate(self.exercise0, modifiers=['en'])
+        self.exercise_cache(self.page("second", time.time() - 10))
+        c, loads = self.exercise_cache(self.page("third", time.time() + 60))
+        self.assertEqual(loads, 1)
+        self.assertEqual(c.content(), "second")
+        c, loads = self.exercise_cache()
+        self.assertEqual(loads, 0)
+        self.assertEqual(c.content(), "third")
+
+
+    @patch('exercise.cache.exercise.connections')
+    def test_refresh_failure(self, connections):
+        self.instance.visible_to_students = True
+        self.instance.save()
+        c, loads = self.exercise_cache(self.page("first", time.time() + 60))
+        data = dict(c.data, expires=time.time() - 10)
+        key = "exercise:{:d},en".format(self.exercise0.id)
+        with patch('exercise.protocol.aplus.RemotePage',
+                    side_effect=RemotePageException("failed")), \
+                patch('exercise.protocol.aplus.messages') as messages, \
+                patch('exercise.protocol.aplus.email_course_error') as email:
+            c._refresh(key, key + ":refresh", data)
+        # The request of the user is not touched by the refresh.
+        messages.error.assert_not_called()
+        self.assertEqual(email.call_count, 1)
+        self.assertIsInstance(email.call_args[0][0], JobRequest)
+        c, loads = self.exercise_cache()
+        self.assertEqual(loads, 0)
+        self.assertEqual(c.content(), "first")
+
 class CachedPointsTest(CourseTestCase):
 
     def test_invalidation(self):
@@ -179,6 +279,26 @@ class CachedPointsTest(CourseTestCase):
         module = p.modules()[1]
         self.assertTrue(module['passed'])
 
+    def test_course_submissions(self):
+        self.submission3.set_points(10,100)
+        self.submission3.set_ready()
+        self.submission3.save()
+        c = CachedContent(self.instance)
+        users = [self.student, self.user]
+        expected = [CachedPoints(self.instance, u, c).total() for u in users]
+        for u in users:
+            CachedPoints.invalidate(self.instance, u)
+
+        course_submissions = CourseSubmissions(self.instance,
+            [u.userprofile for u in users])
+        with self.assertNumQueries(4):
+            totals = [
+                CachedPoints(self.instance, u, c, course_submissions).total()
+                for u in users
+            ]
+        self.assertEqual(totals, expected)
+        self.assertEqual(totals[1]['submission_count'], 1)
+
     def test_unconfirmed(self):
         self.category2 = LearningObjectCategory.objects.create(
             course_instance=self.instance,
@@ -40,6 +40,9 @@ urlpatterns = [
     url(EXERCISE_URL_PREFIX + r'submissions/summary/$',
         staff_views.SubmissionsSummaryView.as_view(),
         name="submission-summary"),
+    url(EXERCISE_URL_PREFIX + r'submissions/regrade/$',
+        staff_views.RegradeSubmissionsView.as_view(),
+        name="submission-regrade"),
     url(EXERCISE_URL_PREFIX + r'submissions/create_and_assess/$',
         staff_views.CreateSubmissionView.as_view(),
         name="submission-create"),
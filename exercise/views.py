@@ -14,6 +14,7 @@ from django.db import DatabaseError
 from authorization.permissions import ACCESS
 from course.models import CourseModule
 from course.viewbase import CourseInstanceBaseView, EnrollableViewMixin
+from lib.file_response import file_response
 from lib.remote_page import RemotePageNotFound, request_for_response
 from lib.viewbase import BaseRedirectMixin, BaseView
 from .models import LearningObject, LearningObjectDisplay
@@ -364,22 +365,15 @@ class SubmittedFileView(SubmissionMixin, BaseView):
             raise Http404()
 
     def get(self, request, *args, **kwargs):
+        as_attachment = bool(request.GET.get("download", False))
+        if as_attachment:
+            content_type = "application/octet-stream"
+        elif self.file.is_passed():
+            content_type = self.file.get_mime()
+        else:
+            content_type = 'text/plain; charset="UTF-8"'
         try:
-            with self.file.file_object.open() as f:
-                bytedata = f.read()
+            return file_response(request, self.file.file_object.path,
+                content_type, self.file.filename, as_attachment)
         except OSError:
             return HttpResponseNotFound()
-
-        # Download the file.
-        if request.GET.get("download", False):
-            response = HttpResponse(bytedata,
-                content_type="application/octet-stream")
-            response["Content-Disposition"] = 'attachment; filename="{}"'\
-                .format(self.file.filename)
-            return response
-
-        if self.file.is_passed():
-            return HttpResponse(bytedata, content_type=self.file.get_mime())
-
-        return HttpResponse(bytedata.decode('utf-8', 'ignore'),
-            content_type='text/plain; charset="UTF-8"')
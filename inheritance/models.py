@@ -1,9 +1,108 @@
+from collections import defaultdict
+
 from django.contrib.contenttypes.models import ContentType
-from django.db import models
-from django.db.models.query import QuerySet
+from django.db import connection, models
+from django.db.models.query import ModelIterable, QuerySet
+
+
+def as_leaf_classes(objects):
+    """
+    Returns the objects as instances of their leaf classes in the original
+    order. The objects of each leaf class are fetched with one query instead
+    of one query per object.
+    """
+    objects = list(objects)
+    indexes_by_class = defaultdict(list)
+    for i, obj in enumerate(objects):
+        model_class = obj._leaf_model_class()
+        if model_class is not obj.__class__:
+            indexes_by_class[model_class].append(i)
+    for model_class, indexes in indexes_by_class.items():
+        leaves = model_class.objects.in_bulk([objects[i].id for i in indexes])
+        for i in indexes:
+            # Objects that were deleted in between are left out.
+            objects[i] = leaves.get(objects[i].id)
+    return [obj for obj in objects if obj is not None]
+
+
+def _insert_rows(cursor, model, objects):
+    """
+    Inserts the rows of the local fields of the model for the objects with
+    one query per batch.
+    """
+    fields = model._meta.local_concrete_fields
+    quote_name = connection.ops.quote_name
+    query = 'INSERT INTO {} ({}) VALUES '.format(
+        quote_name(model._meta.db_table),
+        ', '.join(quote_name(field.column) for field in fields),
+    )
+    row = '({})'.format(', '.join(['%s'] * len(fields)))
+    batch_size = max(1, connection.ops.bulk_batch_size(fields, objects))
+    for i in range(0, len(objects), batch_size):
+        batch = objects[i:i + batch_size]
+        cursor.execute(query + ', '.join([row] * len(batch)), [
+            field.get_db_prep_save(field.pre_save(obj, True), connection)
+            for obj in batch
+            for field in fields
+        ])
+
+
+def bulk_create_with_inheritance(objects):
+    """
+    Inserts new objects of the subclasses of ModelWithInheritance in bulk and
+    returns them. Django's bulk_create does not support multi-table
+    inheritance, thus the base rows are bulk created first for their ids and
+    then the rows of each table in the inheritance chain are inserted with
+    those ids as explicit pointer values. No model signals are sent.
+    """
+    objects = list(objects)
+    bases = []
+    for obj in objects:
+        if not obj.content_type_id:
+            obj.content_type = ContentType.objects.get_for_model(obj.__class__)
+        bases.append(ModelWithInheritance(content_type_id=obj.content_type_id))
+    if connection.features.can_return_ids_from_bulk_insert:
+        ModelWithInheritance.objects.bulk_create(bases)
+    else:
+        # Only the base rows are inserted one by one.
+        for base in bases:
+            base.save()
+
+    objects_by_model = defaultdict(list)
+    depths = {}
+    for obj, base in zip(objects, bases):
+        obj.id = base.id
+        chain = []
+        model = obj.__class__
+        while model is not ModelWithInheritance:
+            parent, pointer = next(iter(model._meta.parents.items()))
+            setattr(obj, pointer.attname, base.id)
+            chain.append(model)
+            model = parent
+        for depth, model in enumerate(reversed(chain)):
+            objects_by_model[model].append(obj)
+            depths[model] = depth
 
+    # The tables are inserted from the base towards the leaves, so that
+    # each pointer refers to an existing row.
+    with connection.cursor() as cursor:
+        for model in sorted(objects_by_model, key=depths.get):
+            _insert_rows(cursor, model, objects_by_model[model])
+    for obj in objects:
+        obj._state.adding = False
+        obj._state.db = connection.alias
+    return objects
 
-class SubclassingQuerySet(QuerySet):
+
+class InheritanceQuerySet(QuerySet):
+    def as_leaf_classes(self):
+        """
+        Returns a list of the objects as instances of their leaf classes.
+        """
+        return as_leaf_classes(self)
+
+
+class SubclassingQuerySet(InheritanceQuerySet):
     def __getitem__(self, k):
         result = super(SubclassingQuerySet, self).__getitem__(k)
         if isinstance(result, models.Model) :
@@ -11,9 +110,14 @@ class SubclassingQuerySet(QuerySet):
         else :
             return result
 
-    def __iter__(self):
-        for item in super(SubclassingQuerySet, self).__iter__():
-            yield item.as_leaf_class()
+    def _fetch_all(self):
+        if self._result_cache is None:
+            super(SubclassingQuerySet, self)._fetch_all()
+            if issubclass(self._iterable_class, ModelIterable):
+                self._result_cache = as_leaf_classes(self._result_cache)
+
+
+InheritanceManager = models.Manager.from_queryset(InheritanceQuerySet)
 
 
 class LeafManager(models.Manager):
@@ -27,7 +131,9 @@ class ModelWithInheritance(models.Model):
     It contains fields that are shared among all types.
     """
 
-    objects                 = models.Manager()
+    # The querysets of this manager may be converted to leaf class instances
+    # with as_leaf_classes().
+    objects                 = InheritanceManager()
 
     # This ModelManager may be used for retrieving the exercises as instances of their leaf classes.
     # Alternatively each exercise may be fetched individually as leaf instance by calling the as_leaf_class method.
@@ -53,6 +159,12 @@ class ModelWithInheritance(models.Model):
 
         super(ModelWithInheritance, self).save(*args, **kwargs)
 
+    def _leaf_model_class(self):
+        if self.content_type_id is None:
+            return self.__class__
+        # The content types are cached by the manager.
+        return ContentType.objects.get_for_id(self.content_type_id).model_class()
+
     def as_leaf_class(self):
         """
         Checks if the object is an instance of a certain class or one of its subclasses.
@@ -60,8 +172,7 @@ class ModelWithInheritance(models.Model):
         that class.
         """
 
-        content_type = self.content_type
-        model_class = content_type.model_class()
+        model_class = self._leaf_model_class()
         if (model_class == self.__class__):
             return self
         return model_class.objects.get(id=self.id)
@@ -1,9 +1,14 @@
 import logging
+from threading import Lock
+from urllib.parse import urlsplit
+
+from cachetools import TTLCache
+from django.utils.crypto import constant_time_compare
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.authentication import BaseAuthentication
 
 from lib.crypto import get_valid_message
-from lib.helpers import get_url_ip_address_list, get_remote_addr
+from lib.helpers import get_hostname_ip_address_list, get_remote_addr
 from exercise.models import BaseExercise, Submission
 from userprofile.models import GraderUser
 from . import GRADER_AUTH_TOKEN
@@ -11,6 +16,45 @@ from . import GRADER_AUTH_TOKEN
 
 logger = logging.getLogger('aplus.authentication')
 
+# Service hostnames by exercise id, so that the exercise and its leaf class
+# are not loaded for every request from a grader.
+_service_hostnames = TTLCache(10000, ttl=5*60)
+_service_hostnames_lock = Lock()
+
+
+def get_exercise_service_hostname(user):
+    exercise_id = (
+        user._submission.exercise_id if user._submission is not None
+        else user._exercise.id
+    )
+    with _service_hostnames_lock:
+        hostname = _service_hostnames.get(exercise_id)
+    if hostname is None:
+        # TODO: we do not know the language, but we expect that all versions of service_url are within the same domain
+        service_url = user._exercise.as_leaf_class().get_service_url('en')
+        hostname = urlsplit(service_url).hostname or ''
+        with _service_hostnames_lock:
+            _service_hostnames[exercise_id] = hostname
+    return hostname
+
+
+def check_service_address(request, user):
+    """
+    Raises AuthenticationFailed, if the request does not come from the
+    exercise service of the grader user.
+    """
+    hostname = get_exercise_service_hostname(user)
+    ips = get_hostname_ip_address_list(hostname) if hostname else ()
+    ip = get_remote_addr(request)
+    if ip not in ips and ip != '127.0.0.1':
+        logger.error(
+            "Request IP does not match exercise service URL: %s not in %s (%s)",
+            ip,
+            ips,
+            hostname,
+        )
+        raise AuthenticationFailed("Client address does not match service address.")
+
 
 class GraderAuthentication(BaseAuthentication):
     def authenticate(self, request):
@@ -26,22 +70,50 @@ class GraderAuthentication(BaseAuthentication):
         user = self.authenticate_credentials(token)
 
         # Make sure that remote address matches service address
-        # TODO: we do not know the language, but we expect that all versions of service_url are within the same domain
-        service_url = user._exercise.as_leaf_class().get_service_url('en')
-        ips = get_url_ip_address_list(service_url)
-        ip = get_remote_addr(request)
-        if ip not in ips and ip != '127.0.0.1':
-            logger.error(
-                "Request IP does not match exercise service URL: %s not in %s (%s)",
-                ip,
-                ips,
-                service_url,
-            )
-            raise AuthenticationFailed("Client address does not match service address.")
+        check_service_address(request, user)
 
         # All good
         return (user, token)
 
+    def authenticate_submission_tokens(self, request, tokens):
+        """
+        Resolve grader users of many submission tokens at once. The
+        submissions are loaded with a single query.
+
+        Returns:
+            a dictionary from each token to a grader user or to
+            an AuthenticationFailed error
+        """
+        results = {}
+        hashes = {}
+        for token in tokens:
+            if not isinstance(token, str) or not token.startswith('s'):
+                results[token] = AuthenticationFailed("Authentication token is invalid.")
+                continue
+            token_parts = token[1:].split('.', 1)
+            try:
+                hashes[token] = (int(token_parts[0], 16), token_parts[1])
+            except (IndexError, ValueError):
+                results[token] = AuthenticationFailed("Authentication token isn't in correct format.")
+
+        submissions = Submission.objects\
+            .filter(id__in=[submission_id for submission_id, _ in hashes.values()])\
+            .select_related('exercise__course_module__course_instance')\
+            .in_bulk()
+        for token, (submission_id, submission_hash) in hashes.items():
+            submission = submissions.get(submission_id)
+            if submission is None or not constant_time_compare(submission.hash, submission_hash):
+                results[token] = AuthenticationFailed("No valid submission for authentication token.")
+                continue
+            user = GraderUser.from_submission(submission)
+            try:
+                check_service_address(request, user)
+            except AuthenticationFailed as error:
+                results[token] = error
+            else:
+                results[token] = user
+        return results
+
     def authenticate_credentials(self, token):
         """
         Resolve user from authentication token
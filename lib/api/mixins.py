@@ -1,3 +1,9 @@
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
 class ListSerializerMixin(object):
     # FIXME: use rest_framework_extensions.mixins.DetailSerializerMixin
     def get_serializer_class(self):
@@ -23,3 +29,48 @@ class MeUserMixin(object):
         value = self.kwargs.get(kw, None)
         if value and self.me_user_value == value:
             self.kwargs[kw] = request.user.id if request.user.is_authenticated else None
+
+
+class ConditionalGetMixin(object):
+    """
+    Answers conditional GET requests of the list and retrieve actions with
+    304 Not Modified. The view implements get_conditional_stamps(), which
+    returns a tuple of the last modification time and a list of the values
+    that the response depends on, e.g. the creation times of cached data.
+    Returning None disables the conditional handling for the request.
+    """
+
+    def get_conditional_stamps(self):
+        return None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        stamps = self.get_conditional_stamps()
+        if stamps is None:
+            return handler(request, *args, **kwargs)
+
+        last_modified, values = stamps
+        # The response depends also on the user and on the requested
+        # representation, e.g. the hyperlinks include the host.
+        values = [
+            request.user.id,
+            request.get_host(),
+            request.get_full_path(),
+            request.accepted_media_type,
+        ] + list(values)
+        etag = quote_etag(hashlib.md5(repr(values).encode('utf-8')).hexdigest())
+        last_modified = int(last_modified.timestamp()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
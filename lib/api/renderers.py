@@ -1,10 +1,11 @@
 from django.conf import settings
-from rest_framework_csv.renderers import CSVRenderer
+from django.http import StreamingHttpResponse
+from rest_framework_csv.renderers import CSVRenderer, CSVStreamingRenderer
 
 def remove_newlines(x):
     return x.replace('\n', ' ').replace('\r', '') if isinstance(x, str) else x
 
-class CSVExcelRenderer(CSVRenderer):
+class ExcelCSVMixin:
     format = 'excel.csv'
     writer_opts = { 'delimiter': settings.EXCEL_CSV_DEFAULT_DELIMITER }
 
@@ -13,7 +14,7 @@ class CSVExcelRenderer(CSVRenderer):
         flat_item = super().flatten_item(item)
         return {k: remove_newlines(v) for k, v in flat_item.items()}
 
-    def render(self, data, media_type=None, renderer_context={}, writer_opts=None):
+    def update_writer_opts(self, renderer_context):
         "Extract sep from GET parameters if specified"
         if 'request' in renderer_context and 'writer_opts' not in renderer_context:
             get = renderer_context['request'].GET
@@ -22,5 +23,42 @@ class CSVExcelRenderer(CSVRenderer):
                     'writer_opts': { 'delimiter': get['sep'] }
                 }
                 renderer_context.update(new_writer_opts)
+
+class CSVExcelRenderer(ExcelCSVMixin, CSVRenderer):
+
+    def render(self, data, media_type=None, renderer_context={}, writer_opts=None):
+        self.update_writer_opts(renderer_context)
         response = super().render(data, media_type, renderer_context, writer_opts)
         return '\uFEFF'.encode('UTF-8') + response
+
+class CSVExcelStreamingRenderer(ExcelCSVMixin, CSVStreamingRenderer):
+
+    def render(self, data, media_type=None, renderer_context={}):
+        self.update_writer_opts(renderer_context)
+        yield '\uFEFF'.encode('UTF-8')
+        yield from super().render(data, media_type, renderer_context)
+
+def streaming_csv_response(request, rows, header, filename=None):
+    """
+    Renders the rows as CSV while the response is sent, so that the rows
+    may be generated one by one. The format (csv or excel.csv) is picked
+    by the accepted renderer of the DRF request.
+    """
+    if isinstance(request.accepted_renderer, CSVExcelRenderer):
+        renderer = CSVExcelStreamingRenderer()
+    else:
+        renderer = CSVStreamingRenderer()
+    renderer_context = {
+        'request': request,
+        'header': header,
+    }
+    content_type = request.accepted_media_type
+    if renderer.charset:
+        content_type = '{}; charset={}'.format(content_type, renderer.charset)
+    response = StreamingHttpResponse(
+        renderer.render(rows, renderer_context=renderer_context),
+        content_type=content_type,
+    )
+    if filename:
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+    return response
@@ -1,2 +1,2 @@
 from .backends import LocMemCache
-from .cached import CachedAbstract
+from .cached import CachedAbstract, deferred_invalidation
@@ -1,11 +1,38 @@
+from contextlib import contextmanager
 from datetime import datetime
 from django.core.cache import cache
+from threading import local
 from time import time
 import logging
 
 
 logger = logging.getLogger('aplus.cached')
 
+_deferred = local()
+
+
+@contextmanager
+def deferred_invalidation():
+    """
+    Collects the invalidations of cached data in the block and sets them
+    with a single cache call in the end. Useful when many objects are saved
+    at once. The block should not read the cached data that it invalidates.
+    """
+    if getattr(_deferred, 'keys', None) is not None:
+        # Already collected by an enclosing block.
+        yield
+        return
+    _deferred.keys = set()
+    try:
+        yield
+    finally:
+        keys = _deferred.keys
+        _deferred.keys = None
+        if keys:
+            logger.debug("Invalidating cached data for %d keys", len(keys))
+            invalidated = time()
+            cache.set_many({key: (None, invalidated) for key in keys}, 60*60)
+
 
 class CachedAbstract(object):
     KEY_PREFIX = 'abstract'
@@ -20,6 +47,10 @@ class CachedAbstract(object):
     @classmethod
     def invalidate(cls, *models, modifiers=[]):
         cache_key = cls._key(*models, modifiers=modifiers)
+        deferred_keys = getattr(_deferred, 'keys', None)
+        if deferred_keys is not None:
+            deferred_keys.add(cache_key)
+            return
         logger.debug("Invalidating cached data for %s", cache_key)
         # The cache is invalid, if the time field is None
         # The invalidation time is stored in the data field for debug messages
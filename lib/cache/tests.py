@@ -2,7 +2,7 @@ from django.test import SimpleTestCase
 from threading import Thread, Event, Barrier
 from unittest.mock import patch, Mock
 
-from lib.cache.cached import CachedAbstract
+from lib.cache.cached import CachedAbstract, deferred_invalidation
 
 
 class TestCached(CachedAbstract):
@@ -32,10 +32,14 @@ def mock_add(key, value, timeout=None):
     return False
 
 
+def mock_set_many(data, timeout=None):
+    mock_cache.update(data)
+
+
 def cache_patcher():
     return patch.multiple('lib.cache.cached.cache',
         add=mock_add, delete=mock_delete,
-        get=mock_get, set=mock_set)
+        get=mock_get, set=mock_set, set_many=mock_set_many)
 
 
 @cache_patcher()
@@ -94,6 +98,20 @@ class CachedTest(SimpleTestCase):
         cached3 = TestCached(lambda x: data3)
         self.assertEqual(cached3.data, data3)
 
+    def test_deferred_invalidation(self):
+        """
+        Invalidations in a deferred block should take effect in the end of the block.
+        """
+        TestCached(lambda x: "Old data")
+        with deferred_invalidation():
+            TestCached.invalidate()
+            with deferred_invalidation():
+                TestCached.invalidate()
+            cached = TestCached(lambda x: "New data")
+            self.assertEqual(cached.data, "Old data")
+        cached = TestCached(lambda x: "New data")
+        self.assertEqual(cached.data, "New data")
+
     def test_out_of_order_update(self):
         """
         Cached should store the data, which generation was started at the latest point in time.
@@ -1,4 +1,6 @@
 import logging
+import re
+import sys
 import traceback
 from django.conf import settings
 from django.core.mail import send_mail
@@ -7,23 +9,39 @@ from django.urls import reverse
 logger = logging.getLogger('aplus.lib.email_messages')
 
 
-def email_course_error(request, exercise, message, exception=True):
+def course_error_recipients(instance):
     """
-    Sends error message to course teachers or technical support emails if set.
+    Returns the course teachers or technical support emails if set.
     """
-    instance = exercise.course_instance
     if instance.technical_error_emails:
-        recipients = instance.technical_error_emails.split(",")
-    else:
-        recipients = (p.user.email for p in instance.course.teachers.all() if p.user.email)
+        return instance.technical_error_emails.split(",")
+    return [p.user.email for p in instance.course.teachers.all() if p.user.email]
+
+
+def error_class(message, exception=True):
+    """
+    Returns the key that is equal for the incidents of the same error. The
+    URLs and numbers in the message vary between the incidents.
+    """
+    key = re.sub(r'\S+://\S*|\d+', '#', str(message))
+    if exception and sys.exc_info()[0]:
+        key = "{}: {}".format(sys.exc_info()[0].__name__, key)
+    return key[:255]
+
+
+def email_course_error(request, exercise, message, exception=True):
+    """
+    Reports the error to course teachers or technical support emails if set.
+    The report is emailed later by the send_error_reports command, and the
+    incidents of the same error are counted in a single report.
+    """
+    from exercise.models import ErrorReport
 
     error_trace = "-"
     if exception:
         error_trace = traceback.format_exc()
 
-    subject = settings.EXERCISE_ERROR_SUBJECT.format(
-        course=instance.course.code,
-        exercise=str(exercise))
+    instance = exercise.course_instance
     body = settings.EXERCISE_ERROR_DESCRIPTION.format(
         message=message,
         exercise_url=request.build_absolute_uri(
@@ -32,8 +50,43 @@ def email_course_error(request, exercise, message, exception=True):
             instance.get_url('course-details')),
         error_trace=error_trace,
         request_fields=repr(request))
-    if recipients:
-        try:
-            send_mail(subject, body, settings.SERVER_EMAIL, recipients, True)
-        except Exception as e:
-            logger.exception('Failed to send error emails.')
+    try:
+        ErrorReport.objects.report(exercise, error_class(message, exception), body)
+    except Exception as e:
+        logger.exception('Failed to store the error report.')
+
+
+def email_error_reports(instance, reports):
+    """
+    Sends the error reports of the course instance in a single email.
+    Returns False if the email could not be sent.
+    """
+    recipients = course_error_recipients(instance)
+    if not recipients:
+        return True
+
+    if len(reports) == 1 and reports[0].count == 1:
+        report = reports[0]
+        subject = settings.EXERCISE_ERROR_SUBJECT.format(
+            course=instance.course.code,
+            exercise=str(report.exercise))
+        body = report.message
+    else:
+        subject = settings.EXERCISE_ERROR_DIGEST_SUBJECT.format(
+            course=instance.course.code,
+            count=sum(r.count for r in reports))
+        body = "\n\n".join(
+            "{exercise}: {count:d} incidents between {first} and {last}.\n"
+            "The first incident:\n{message}".format(
+                exercise=str(r.exercise),
+                count=r.count,
+                first=r.created.isoformat(timespec='seconds'),
+                last=r.last_seen.isoformat(timespec='seconds'),
+                message=r.message)
+            for r in reports)
+    try:
+        send_mail(subject, body, settings.SERVER_EMAIL, recipients)
+    except Exception as e:
+        logger.exception('Failed to send error emails.')
+        return False
+    return True
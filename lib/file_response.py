@@ -0,0 +1,160 @@
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http.response import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class ChunkedFileResponse(FileResponse):
+    block_size = CHUNK_SIZE
+
+
+class RangeFile:
+    """
+    A read-only view to a byte range of a file.
+    """
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Parses a single byte range from the Range header value. Returns a tuple
+    (start, end) of inclusive byte positions, None if the header should be
+    ignored or False if the range can not be satisfied.
+    Multiple ranges are not supported, so those are ignored.
+    """
+    m = RANGE_RE.match(header.strip())
+    if not m:
+        return None
+    start, end = m.groups()
+    if start:
+        start = int(start)
+        if not end:
+            end = size - 1
+        elif int(end) < start:
+            return None
+        else:
+            end = min(int(end), size - 1)
+    elif end:
+        # A suffix range is the last bytes of the file.
+        if int(end) == 0:
+            return False
+        start = max(size - int(end), 0)
+        end = size - 1
+    else:
+        return None
+    if start >= size:
+        return False
+    return (start, end)
+
+
+def _attachment(filename):
+    try:
+        filename.encode('ascii')
+        return 'attachment; filename="{}"'.format(filename.replace('"', '\\"'))
+    except UnicodeEncodeError:
+        return "attachment; filename*=utf-8''{}".format(quote(filename))
+
+
+def _sendfile_response(path, content_type):
+    if settings.SENDFILE == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+        return response
+    if settings.SENDFILE == 'x-accel-redirect':
+        relative_path = os.path.relpath(path, settings.MEDIA_ROOT)
+        if relative_path.startswith('..'):
+            return None
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.SENDFILE_ACCEL_URL + quote(relative_path)
+        return response
+    return None
+
+
+def file_response(request, path, content_type, filename, as_attachment=False):
+    """
+    Responds with the file in the path without reading it into memory.
+
+    The file is either streamed in chunks or, if settings.SENDFILE is set,
+    sent by the web server. Conditional requests are answered using an ETag
+    and the Last-Modified time of the file, and a single byte range may be
+    requested with the Range header.
+
+    Raises OSError if the file does not exist.
+    """
+    stat = os.stat(path)
+    etag = quote_etag("{:x}-{:x}".format(int(stat.st_mtime), stat.st_size))
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _sendfile_response(path, content_type)
+        if response is not None:
+            if as_attachment:
+                response['Content-Disposition'] = _attachment(filename)
+        else:
+            response = _streaming_response(
+                request, path, stat.st_size, content_type, filename,
+                as_attachment, etag, last_modified)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+def _streaming_response(request, path, size, content_type, filename,
+        as_attachment, etag, last_modified):
+    byte_range = None
+    if request.method in ('GET', 'HEAD') and 'HTTP_RANGE' in request.META:
+        if_range = request.META.get('HTTP_IF_RANGE')
+        if (not if_range or if_range == etag
+                or parse_http_date_safe(if_range) == last_modified):
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = "bytes */{:d}".format(size)
+        return response
+
+    file = open(path, 'rb')
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        response = ChunkedFileResponse(
+            RangeFile(file, start, length),
+            status=206,
+            content_type=content_type,
+            as_attachment=as_attachment,
+            filename=filename,
+        )
+        response['Content-Length'] = length
+        response['Content-Range'] = "bytes {:d}-{:d}/{:d}".format(start, end, size)
+    else:
+        response = ChunkedFileResponse(
+            file,
+            content_type=content_type,
+            as_attachment=as_attachment,
+            filename=filename,
+        )
+    response['Accept-Ranges'] = 'bytes'
+    return response
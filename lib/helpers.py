@@ -1,17 +1,23 @@
+import logging
 import socket
 import string
 import functools
 import warnings
-from cachetools import cached, TTLCache
+from cachetools import TTLCache
 from collections import OrderedDict
-from urllib.parse import parse_qs, parse_qsl, urlencode, urlsplit, urlunsplit
+from threading import Lock
+from urllib.parse import parse_qs, parse_qsl, urlencode, urlparse, urlsplit, urlunsplit
 from PIL import Image
 from django.conf import settings
+from django.http import HttpRequest
 from django.utils.crypto import get_random_string as django_get_random_string
 from django.utils.deprecation import RemovedInNextVersionWarning
 from django.utils.translation import get_language
 
 
+logger = logging.getLogger('aplus.lib.helpers')
+
+
 def deprecated(message):
     '''
     This is a decorator which can be used to mark functions
@@ -70,6 +76,15 @@ def query_dict_to_list_of_tuples(query_dict):
     return list_of_tuples
 
 
+def int_or_none(value):
+    if not value is None:
+        try:
+            return int(value)
+        except ValueError:
+            pass
+    return None
+
+
 def url_with_query_in_data(url: str, data: dict = {}):
     """
     Take an url with (or without) query parameters and a dictionary of data.
@@ -130,18 +145,53 @@ def settings_text(key):
     return get('{}_{}'.format(key, get_language().upper())) or get(key)
 
 
-@cached(TTLCache(100, ttl=30))
+# Resolved addresses of hostnames are cached in the process for
+# IP_ADDRESS_CACHE_TTL seconds and failed lookups for
+# IP_ADDRESS_FAILURE_CACHE_TTL seconds.
+IP_ADDRESS_CACHE_TTL = 30
+IP_ADDRESS_FAILURE_CACHE_TTL = 10
+_ip_address_cache = TTLCache(1000, ttl=IP_ADDRESS_CACHE_TTL)
+_ip_address_failure_cache = TTLCache(1000, ttl=IP_ADDRESS_FAILURE_CACHE_TTL)
+_ip_address_lock = Lock()
+
+
+def get_hostname_ip_address_list(hostname):
+    """
+    This function takes a hostname as a parameter and returns the IP addresses
+    of the host as a tuple of strings. The tuple is empty, if the hostname
+    can not be resolved.
+
+    The results are cached, so repeated calls return fast.
+    """
+    with _ip_address_lock:
+        ips = _ip_address_cache.get(hostname)
+        if ips is None and hostname in _ip_address_failure_cache:
+            ips = ()
+    if ips is not None:
+        return ips
+    try:
+        ips = tuple(set(a[4][0] for a in socket.getaddrinfo(
+            hostname, None, 0, socket.SOCK_STREAM, socket.IPPROTO_TCP)))
+    except OSError as e:
+        logger.warning("Failed to resolve the address of %s: %s", hostname, e)
+        with _ip_address_lock:
+            _ip_address_failure_cache[hostname] = True
+        return ()
+    with _ip_address_lock:
+        _ip_address_cache[hostname] = ips
+    return ips
+
+
 def get_url_ip_address_list(url):
     """
     This function takes a full URL as a parameter and returns the IP addresses
-    of the host as a string.
+    of the host as a tuple of strings.
 
-    It will cache results for 30 seconds, so repeated calls return fast
+    The results are cached by the hostname, so repeated calls return fast.
     """
     hostname = urlsplit(url).hostname
     assert hostname, "Invalid url: no hostname found"
-    ips = (a[4][0] for a in socket.getaddrinfo(hostname, None, 0, socket.SOCK_STREAM, socket.IPPROTO_TCP))
-    return tuple(set(ips))
+    return get_hostname_ip_address_list(hostname)
 
 
 def get_remote_addr(request):
@@ -154,6 +204,27 @@ def get_remote_addr(request):
     return request.META.get('REMOTE_ADDR')
 
 
+class JobRequest(HttpRequest):
+    """
+    Stands for a request of the user outside the request-response cycle,
+    for example in a background job. The absolute URLs are built from the
+    BASE_URL setting.
+    """
+    def __init__(self, user=None, method='GET'):
+        from django.contrib.auth.models import AnonymousUser
+        super().__init__()
+        base = urlparse(settings.BASE_URL)
+        self.method = method
+        self.user = user or AnonymousUser()
+        self.META['HTTP_HOST'] = base.netloc
+        self.META['SERVER_NAME'] = base.hostname
+        self.META['SERVER_PORT'] = str(base.port or (443 if base.scheme == 'https' else 80))
+        self._scheme = base.scheme or 'http'
+
+    def _get_scheme(self):
+        return self._scheme
+
+
 class Enum(object):
     """
     Represents constant enumeration.
@@ -0,0 +1,98 @@
+import io
+import os
+import uuid
+from mimetypes import guess_type
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def _quote(value):
+    return str(value).replace('"', '%22').replace('\r', '%0D').replace('\n', '%0A')
+
+
+def _file_size(file):
+    try:
+        return os.fstat(file.fileno()).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        size = file.seek(0, os.SEEK_END)
+        file.seek(0)
+        return size
+
+
+class MultipartEncoder:
+    """
+    A multipart/form-data request body that is produced while it is read.
+    The files are read in chunks when the body is sent, so that the whole
+    body is never held in memory.
+
+    The fields are given as a dict of values or lists of values. The files
+    are given as a dict of (filename, file) tuples or lists of them, thus
+    there may be multiple files with the same name. The files are read from
+    the beginning, so the same files may be encoded again when a request is
+    retried.
+    """
+    def __init__(self, fields, files, boundary=None, chunk_size=CHUNK_SIZE):
+        self.boundary = boundary or uuid.uuid4().hex
+        self.content_type = 'multipart/form-data; boundary=' + self.boundary
+        self.chunk_size = chunk_size
+        self._parts = list(self._build_parts(fields or {}, files or {}))
+        self._length = sum(
+            len(header) + (_file_size(file) if file is not None else 0) + 2
+            for header, file in self._parts
+        ) + len(self.boundary) + 6
+        self._chunks = self._iter_chunks()
+        self._buffer = bytearray()
+
+    @staticmethod
+    def _values(value):
+        return value if isinstance(value, list) else [value]
+
+    def _build_parts(self, fields, files):
+        for name, values in fields.items():
+            for value in self._values(values):
+                if not isinstance(value, bytes):
+                    value = str(value).encode('utf-8')
+                header = (
+                    '--{}\r\n'
+                    'Content-Disposition: form-data; name="{}"\r\n\r\n'
+                ).format(self.boundary, _quote(name)).encode('utf-8')
+                yield (header + value, None)
+        for name, values in files.items():
+            for filename, file in self._values(values):
+                content_type = guess_type(filename)[0] or 'application/octet-stream'
+                header = (
+                    '--{}\r\n'
+                    'Content-Disposition: form-data; name="{}"; filename="{}"\r\n'
+                    'Content-Type: {}\r\n\r\n'
+                ).format(self.boundary, _quote(name), _quote(filename), content_type)
+                yield (header.encode('utf-8'), file)
+
+    def _iter_chunks(self):
+        for header, file in self._parts:
+            yield header
+            if file is not None:
+                file.seek(0)
+                chunk = file.read(self.chunk_size)
+                while chunk:
+                    yield chunk
+                    chunk = file.read(self.chunk_size)
+            yield b'\r\n'
+        yield '--{}--\r\n'.format(self.boundary).encode('utf-8')
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            data = bytes(self._buffer) + b''.join(self._chunks)
+            self._buffer.clear()
+            return data
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
@@ -10,9 +10,34 @@ from django.utils.text import format_lazy
 from django.utils.translation import ugettext_lazy as _
 from urllib.parse import urlparse, urljoin
 
+from .multipart import MultipartEncoder
+
 
 logger = logging.getLogger('aplus.remote_page')
 
+# The attribute holding a URL for each tag that is fixed by fix_relative_urls.
+URL_ATTRIBUTES = {
+    'img': 'src',
+    'script': 'src',
+    'iframe': 'src',
+    'link': 'href',
+    'a': 'href',
+    'video': 'poster',
+    'source': 'src',
+}
+# Starts with "#", "//" or "https:".
+ABSOLUTE_URL_RE = re.compile(r'^(#|\/\/|\w+:)', re.IGNORECASE)
+# Ends with filename extension ".html" and possibly "#anchor".
+CHAPTER_RE = re.compile(r'.*\.html(#.+)?$', re.IGNORECASE)
+# Starts with at least one "../".
+START_DOTDOT_PATH_RE = re.compile(r"^(../)+")
+# May end with the language suffix _en or _en/#anchor or _en#anchor.
+LANG_SUFFIX_RE = re.compile(r'(?P<lang>_[a-z]{2})?(?P<slash>/)?(?P<anchor>#.+)?$')
+# Detect certain A+ exercise info URLs so that they are not broken by
+# the transformations: "../../module1/chapter/module1_chapter_exercise/info/model/".
+# URLs /plain, /info, /info/model, /info/template.
+EXERCISE_INFO_RE = re.compile(r'/((plain)|(info(/model|/template)?))/?(#.+)?$')
+
 
 class RemotePageException(Exception):
     def __init__(self, message, code=500):
@@ -44,11 +69,18 @@ def request_for_response(url, post=False, data=None, files=None, stamp=None):
                 request_time = time.time()
                 if post:
                     logger.info("POST %s", url)
+                    body = data
+                    headers = {}
+                    if files:
+                        # Stream the files instead of building the whole
+                        # multipart body in memory.
+                        body = MultipartEncoder(data, files)
+                        headers['Content-Type'] = body.content_type
                     response = requests.post(
                         url,
-                        data=data,
-                        files=files,
-                        timeout=settings.EXERCISE_HTTP_TIMEOUT
+                        data=body,
+                        timeout=settings.EXERCISE_HTTP_TIMEOUT,
+                        headers=headers
                     )
                 else:
                     logger.info("GET %s", url)
@@ -160,39 +192,15 @@ class RemotePage:
 
     def fix_relative_urls(self):
         url = self.base_address()
-        for tag,attr in [
-            ("img","src"),
-            ("script","src"),
-            ("iframe","src"),
-            ("link","href"),
-            ("a","href"),
-            ("video","poster"),
-            ("source","src"),
-        ]:
-            self._fix_relative_urls(url, tag, attr)
-
-    def _fix_relative_urls(self, url, tag_name, attr_name):
-        # Starts with "#", "//" or "https:".
-        test = re.compile('^(#|\/\/|\w+:)', re.IGNORECASE)
-        # Ends with filename extension ".html" and possibly "#anchor".
-        chapter = re.compile('.*\.html(#.+)?$', re.IGNORECASE)
-        # Starts with at least one "../".
-        start_dotdot_path = re.compile(r"^(../)+")
-        # May end with the language suffix _en or _en/#anchor or _en#anchor.
-        lang_suffix = re.compile(r'(?P<lang>_[a-z]{2})?(?P<slash>/)?(?P<anchor>#.+)?$')
-        # Detect certain A+ exercise info URLs so that they are not broken by
-        # the transformations: "../../module1/chapter/module1_chapter_exercise/info/model/".
-        # URLs /plain, /info, /info/model, /info/template.
-        exercise_info = re.compile(r'/((plain)|(info(/model|/template)?))/?(#.+)?$')
-
-        for element in self.soup.find_all(tag_name, {attr_name:True}):
-            value = element[attr_name]
+        for element in self.soup.find_all(list(URL_ATTRIBUTES)):
+            attr_name = URL_ATTRIBUTES[element.name]
+            value = element.get(attr_name)
             if not value:
                 continue
 
             # Custom transform for RST chapter to chapter links.
             if element.has_attr('data-aplus-chapter'):
-                m = chapter.match(value)
+                m = CHAPTER_RE.match(value)
                 if m:
                     i = m.start(1)
                     if i > 0:
@@ -216,10 +224,10 @@ class RemotePage:
                 # page URL: /course/course_instance/module/chapter/
                 # (A+ URLs do not have the same "subdirectories" as
                 # the real subdirectories in the course git repo.)
-                new_val = '../../' + start_dotdot_path.sub("", without_html_suffix)
+                new_val = '../../' + START_DOTDOT_PATH_RE.sub("", without_html_suffix)
 
                 split_path = new_val.split('/')
-                if len(split_path) > 4 and not exercise_info.search(new_val):
+                if len(split_path) > 4 and not EXERCISE_INFO_RE.search(new_val):
                     # If the module directory has subdirectories in the course
                     # git repo, the subdirectory must be modified in the A+ URL.
                     # The subdirectory slash / is converted to underscore _.
@@ -231,7 +239,7 @@ class RemotePage:
 
                 # Remove lang suffix in chapter2_en#anchor without modifying the #anchor.
                 # Add slash / to the end before the #anchor.
-                m = lang_suffix.search(new_val)
+                m = LANG_SUFFIX_RE.search(new_val)
                 if m:
                     anchor = m.group('anchor')
                     if anchor is None:
@@ -240,7 +248,7 @@ class RemotePage:
 
                 element[attr_name] = new_val
 
-            elif value and not test.match(value):
+            elif value and not ABSOLUTE_URL_RE.match(value):
 
                 # Custom transform for RST generated exercises.
                 if element.has_attr('data-aplus-path'):
@@ -255,7 +263,7 @@ class RemotePage:
                         '{course}',
                         url.path.split('/', 2)[1]
                     )
-                    fix_value = start_dotdot_path.sub("/", value)
+                    fix_value = START_DOTDOT_PATH_RE.sub("/", value)
                     value = fix_path + fix_value
 
                 # url points to the exercise service, e.g., MOOC-Grader.
@@ -0,0 +1,331 @@
+import os
+import socket
+import tempfile
+from datetime import datetime, timezone
+from io import BytesIO
+from unittest.mock import patch, Mock
+
+from bs4 import BeautifulSoup
+from django.core.files.uploadhandler import MemoryFileUploadHandler
+from django.http.multipartparser import MultiPartParser
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils.http import http_date
+from rest_framework import viewsets
+from rest_framework.response import Response
+
+from . import helpers
+from .api.mixins import ConditionalGetMixin
+from .api.renderers import CSVExcelStreamingRenderer
+from .file_response import file_response, parse_range
+from .multipart import MultipartEncoder
+from .remote_page import RemotePage
+
+
+CHAPTER_URL = "http://grader.local/static/default/module1/chapter.html"
+
+
+def remote_page_from_html(html, url=CHAPTER_URL):
+    response = Mock(text=html, headers={})
+    with patch('lib.remote_page.request_for_response', return_value=response):
+        return RemotePage(url)
+
+
+def rst_chapter_html(sections=200):
+    """
+    Builds a chapter page resembling the output of a-plus-rst-tools.
+    """
+    parts = [
+        '<html><head>',
+        '<link rel="stylesheet" href="../_static/aplus.css" data-aplus>',
+        '<script src="../_static/aplus.js" data-aplus></script>',
+        '<script src="https://cdn.example.com/mathjax.js"></script>',
+        '</head><body><div class="section">',
+    ]
+    for i in range(sections):
+        parts.append(
+            '<div class="section" id="section-{i}">'
+            '<h2>Section {i}<a class="headerlink" href="#section-{i}">¶</a></h2>'
+            '<p>Text with <a href="../module2/chapter{i}.html#part" data-aplus-chapter>a chapter link</a>, '
+            '<a href="https://www.example.com/{i}">an external link</a> and '
+            '<a href="../_downloads/file{i}.py">a download</a>.</p>'
+            '<p><img src="../_images/image{i}.png" alt="figure"></p>'
+            '<video poster="../_images/poster{i}.png">'
+            '<source src="../_static/video{i}.mp4" type="video/mp4"></video>'
+            '<div class="exercise" data-aplus-exercise="exercise{i}">'
+            '<iframe src="../_static/embed{i}.html"></iframe></div>'
+            '<p><span>Plain</span> <em>emphasised</em> <code>code</code> text.</p>'
+            '</div>'.format(i=i)
+        )
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+
+@override_settings(REMOTE_PAGE_HOSTS_MAP=None)
+class RemotePageTest(SimpleTestCase):
+
+    def test_fix_relative_urls(self):
+        page = remote_page_from_html(
+            '<html><head>'
+            '<link rel="stylesheet" href="../_static/style.css">'
+            '<script src="//cdn.example.com/lib.js"></script>'
+            '</head><body>'
+            '<a href="#anchor">anchor</a>'
+            '<a href="mailto:teacher@example.com">mail</a>'
+            '<a href="../module2/chapter2.html#part" data-aplus-chapter>chapter</a>'
+            '<a href="../../module2/sub/chapter3_en.html" data-aplus-chapter>sub chapter</a>'
+            '<a href="../module2/ex/info/model/" data-aplus-chapter>model</a>'
+            '<img src="../_images/image.png">'
+            '<iframe src="embed.html"></iframe>'
+            '<video poster="poster.png"><source src="video.mp4"></video>'
+            '<img src="">'
+            '</body></html>'
+        )
+        page.fix_relative_urls()
+        soup = page.soup
+        self.assertEqual(soup.link['href'], "http://grader.local/static/default/_static/style.css")
+        self.assertEqual(soup.script['src'], "//cdn.example.com/lib.js")
+        links = [a['href'] for a in soup.find_all('a')]
+        self.assertEqual(links, [
+            "#anchor",
+            "mailto:teacher@example.com",
+            "../../module2/chapter2/#part",
+            "../../module2/sub_chapter3/",
+            "../../module2/ex/info/model/",
+        ])
+        images = [img['src'] for img in soup.find_all('img')]
+        self.assertEqual(images, [
+            "http://grader.local/static/default/_images/image.png",
+            "",
+        ])
+        self.assertEqual(soup.iframe['src'], "http://grader.local/static/default/module1/embed.html")
+        self.assertEqual(soup.video['poster'], "http://grader.local/static/default/module1/poster.png")
+        self.assertEqual(soup.source['src'], "http://grader.local/static/default/module1/video.mp4")
+
+    def test_fix_relative_urls_aplus_path(self):
+        page = remote_page_from_html(
+            '<html><body>'
+            '<img src="../_images/image.png" data-aplus-path="/static/{course}">'
+            '</body></html>',
+            url="http://grader.local/coursekey/exercisekey",
+        )
+        page.fix_relative_urls()
+        self.assertEqual(page.soup.img['src'], "http://grader.local/static/coursekey/_images/image.png")
+
+    def test_fix_relative_urls_single_pass(self):
+        html = rst_chapter_html()
+        page = remote_page_from_html(html)
+
+        # The whole document must be traversed only once.
+        with patch.object(BeautifulSoup, 'find_all',
+                autospec=True, side_effect=BeautifulSoup.find_all) as find_all:
+            page.fix_relative_urls()
+        self.assertEqual(find_all.call_count, 1)
+        self.assertEqual(
+            page.soup.find(id='section-7').img['src'],
+            "http://grader.local/static/default/_images/image7.png",
+        )
+
+
+class MultipartEncoderTest(SimpleTestCase):
+
+    def parse(self, encoder, read_size):
+        chunks = []
+        chunk = encoder.read(read_size)
+        while chunk:
+            chunks.append(chunk)
+            chunk = encoder.read(read_size)
+        body = b''.join(chunks)
+        self.assertEqual(len(body), len(encoder))
+        meta = {
+            'CONTENT_TYPE': encoder.content_type,
+            'CONTENT_LENGTH': len(body),
+        }
+        return MultiPartParser(meta, BytesIO(body), [MemoryFileUploadHandler()]).parse()
+
+    def test_encode(self):
+        large = bytes(range(256)) * 1000
+        files = {
+            'file1': [('a.txt', BytesIO(b'first')), ('b.txt', BytesIO(b'second'))],
+            'file2': ('data.bin', BytesIO(large)),
+        }
+        fields = {'key': ['1', 'two "quoted"'], 'lti': 'value'}
+        for read_size in (100, 8192, -1):
+            data, parsed_files = self.parse(MultipartEncoder(fields, files, chunk_size=1000), read_size)
+            self.assertEqual(data.getlist('key'), ['1', 'two "quoted"'])
+            self.assertEqual(data['lti'], 'value')
+            self.assertEqual(
+                [(f.name, f.read()) for f in parsed_files.getlist('file1')],
+                [('a.txt', b'first'), ('b.txt', b'second')],
+            )
+            self.assertEqual(parsed_files['file2'].read(), large)
+            self.assertEqual(parsed_files['file2'].content_type, 'application/octet-stream')
+
+
+@override_settings(SENDFILE=None)
+class FileResponseTest(SimpleTestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        self.data = bytes(range(256)) * 1000
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.data)
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def get(self, **headers):
+        request = self.factory.get('/', **headers)
+        return file_response(request, self.path, 'application/octet-stream', 'data.bin')
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range("bytes=0-99", 1000), (0, 99))
+        self.assertEqual(parse_range("bytes=900-", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=900-2000", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=-100", 1000), (900, 999))
+        self.assertEqual(parse_range("bytes=-2000", 1000), (0, 999))
+        self.assertIsNone(parse_range("bytes=99-0", 1000))
+        self.assertIsNone(parse_range("bytes=0-1,5-6", 1000))
+        self.assertIsNone(parse_range("lines=0-1", 1000))
+        self.assertFalse(parse_range("bytes=1000-", 1000))
+        self.assertFalse(parse_range("bytes=-0", 1000))
+
+    def test_full(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'], str(len(self.data)))
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(b''.join(response.streaming_content), self.data)
+        response.close()
+
+    def test_attachment(self):
+        request = self.factory.get('/')
+        response = file_response(request, self.path, 'application/octet-stream', 'data.bin', True)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="data.bin"')
+        response.close()
+
+    def test_range(self):
+        response = self.get(HTTP_RANGE="bytes=1000-1999")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Length'], '1000')
+        self.assertEqual(response['Content-Range'], "bytes 1000-1999/{:d}".format(len(self.data)))
+        self.assertEqual(b''.join(response.streaming_content), self.data[1000:2000])
+        response.close()
+
+        response = self.get(HTTP_RANGE="bytes={:d}-".format(len(self.data)))
+        self.assertEqual(response.status_code, 416)
+
+        response = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_conditional(self):
+        response = self.get()
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+        response.close()
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        response = self.get(HTTP_IF_MODIFIED_SINCE=http_date(0))
+        self.assertEqual(response.status_code, 200)
+        response.close()
+        response = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+        response.close()
+
+    def test_sendfile(self):
+        media_root = os.path.dirname(self.path)
+        with self.settings(SENDFILE='x-accel-redirect', MEDIA_ROOT=media_root, SENDFILE_ACCEL_URL='/protected/'):
+            response = self.get()
+            self.assertEqual(response['X-Accel-Redirect'], '/protected/' + os.path.basename(self.path))
+        with self.settings(SENDFILE='x-sendfile'):
+            response = self.get()
+            self.assertEqual(response['X-Sendfile'], self.path)
+
+
+class IPAddressCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        helpers._ip_address_cache.clear()
+        helpers._ip_address_failure_cache.clear()
+
+    def addresses(self, *ips):
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, '', (ip, 0)) for ip in ips]
+
+    def test_cached(self):
+        with patch('lib.helpers.socket.getaddrinfo',
+                return_value=self.addresses('192.0.2.1', '192.0.2.1')) as getaddrinfo:
+            self.assertEqual(helpers.get_url_ip_address_list("http://grader.local/ex1"), ('192.0.2.1',))
+            self.assertEqual(helpers.get_url_ip_address_list("http://grader.local/ex2?a=1"), ('192.0.2.1',))
+            self.assertEqual(helpers.get_hostname_ip_address_list("grader.local"), ('192.0.2.1',))
+        self.assertEqual(getaddrinfo.call_count, 1)
+
+    def test_failure_cached(self):
+        with patch('lib.helpers.socket.getaddrinfo', side_effect=socket.gaierror("fail")) as getaddrinfo:
+            self.assertEqual(helpers.get_hostname_ip_address_list("missing.local"), ())
+            self.assertEqual(helpers.get_hostname_ip_address_list("missing.local"), ())
+        self.assertEqual(getaddrinfo.call_count, 1)
+
+
+class CSVExcelStreamingRendererTest(SimpleTestCase):
+
+    def test_render_generator(self):
+        consumed = []
+        def rows():
+            for i in range(3):
+                consumed.append(i)
+                yield {'a': i, 'b': 'line\nbreak'}
+        request = RequestFactory().get('/', {'sep': ','})
+        content = CSVExcelStreamingRenderer().render(rows(), renderer_context={
+            'request': request,
+            'header': ['a', 'b'],
+        })
+        self.assertEqual(next(content), '\uFEFF'.encode('UTF-8'))
+        self.assertEqual(consumed, [])
+        self.assertEqual(b''.join(content).decode('UTF-8').splitlines(),
+            ['a,b', '0,line break', '1,line break', '2,line break'])
+
+
+class ConditionalGetMixinTest(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.calls = []
+        calls = self.calls
+        class Base:
+            def list(self, request, *args, **kwargs):
+                calls.append(request)
+                return Response({'data': 1})
+        self.view_class = type('View', (ConditionalGetMixin, Base, viewsets.ViewSet), {
+            'authentication_classes': [],
+            'permission_classes': [],
+            'get_conditional_stamps': lambda view: view.stamps,
+        })
+
+    def get(self, stamps, **headers):
+        self.view_class.stamps = stamps
+        view = self.view_class.as_view({'get': 'list'})
+        return view(self.factory.get('/', **headers))
+
+    def test_not_conditional(self):
+        response = self.get(None)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_conditional(self):
+        modified = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        response = self.get((modified, [1]))
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        self.assertEqual(response['Last-Modified'], http_date(modified.timestamp()))
+        self.assertEqual(len(self.calls), 1)
+
+        response = self.get((modified, [1]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(self.calls), 1)
+
+        response = self.get((modified, [2]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(self.calls), 2)
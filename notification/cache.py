@@ -1,7 +1,7 @@
 from django.db.models.signals import post_save, post_delete
 
-from lib.cache import CachedAbstract
-from .models import Notification
+from lib.cache import CachedAbstract, deferred_invalidation
+from .models import Notification, notifications_changed
 
 
 class CachedNotifications(CachedAbstract):
@@ -59,7 +59,13 @@ class CachedNotifications(CachedAbstract):
 def invalidate_notifications(sender, instance, **kwargs):
     CachedNotifications.invalidate(instance.recipient.user)
 
+def invalidate_notified_users(sender, course_instance_id, user_ids, **kwargs):
+    with deferred_invalidation():
+        for user_id in set(user_ids):
+            CachedNotifications.invalidate(user_id)
+
 
 # Automatically invalidate cache when notifications change.
 post_save.connect(invalidate_notifications, sender=Notification)
 post_delete.connect(invalidate_notifications, sender=Notification)
+notifications_changed.connect(invalidate_notified_users, sender=Notification)
@@ -1,11 +1,18 @@
 from django.db import models
+from django.db.models import F
+from django.dispatch import Signal
 
 from course.models import CourseInstance
 from exercise.models import Submission
+from lib.cache import deferred_invalidation
 from lib.models import UrlMixin
 from userprofile.models import UserProfile
 
 
+# Sent when the notifications of users are created in bulk.
+notifications_changed = Signal(providing_args=['course_instance_id', 'user_ids'])
+
+
 class Notification(UrlMixin, models.Model):
     """
     A user notification of some event, for example manual assessment.
@@ -33,27 +40,68 @@ class Notification(UrlMixin, models.Model):
 
     @classmethod
     def send(cls, sender, submission):
-        for recipient in submission.submitters.all():
-            if Notification.objects.filter(
-                submission=submission,
-                recipient=recipient,
-                seen=False,
-            ).count() == 0:
-                notification = Notification(
-                    sender=sender,
-                    recipient=recipient,
-                    course_instance=submission.exercise.course_instance,
-                    submission=submission,
-                )
-                notification.save()
+        cls.send_many(sender, [submission])
 
     @classmethod
     def remove(cls, submission):
-        Notification.objects.filter(
-            submission=submission,
-            recipient__in=submission.submitters.all(),
+        cls.remove_many([submission])
+
+    @classmethod
+    def send_many(cls, sender, submissions):
+        """
+        Notifies the submitters of the submissions in bulk. A submitter that
+        has an unseen notification of the submission is not notified again.
+        The model signals are not sent, which is why notifications_changed
+        is sent for each course instance.
+        """
+        Submitters = Submission.submitters.through
+        rows = Submitters.objects.filter(
+            submission__in=submissions,
+        ).values_list(
+            'submission_id',
+            'userprofile_id',
+            'userprofile__user_id',
+            'submission__exercise__course_module__course_instance_id',
+        )
+        existing = set(Notification.objects.filter(
+            submission__in=submissions,
+            seen=False,
+        ).values_list('submission_id', 'recipient_id'))
+
+        notifications = []
+        user_ids = {}
+        for submission_id, profile_id, user_id, course_instance_id in rows:
+            if (submission_id, profile_id) in existing:
+                continue
+            existing.add((submission_id, profile_id))
+            notifications.append(Notification(
+                sender=sender,
+                recipient_id=profile_id,
+                course_instance_id=course_instance_id,
+                submission_id=submission_id,
+            ))
+            user_ids.setdefault(course_instance_id, []).append(user_id)
+        Notification.objects.bulk_create(notifications)
+        for course_instance_id, ids in user_ids.items():
+            notifications_changed.send(sender=cls,
+                course_instance_id=course_instance_id, user_ids=ids)
+        return notifications
+
+    @classmethod
+    def remove_many(cls, submissions):
+        """
+        Deletes the unseen notifications of the submissions from their
+        submitters in bulk. The caches are invalidated on post_delete and
+        written once for all notifications.
+        """
+        ids = Notification.objects.filter(
+            submission__in=submissions,
+            recipient__submissions=F('submission'),
             seen=False,
-        ).delete()
+        ).values('id')
+        with deferred_invalidation():
+            Notification.objects.filter(id__in=ids).prefetch_related(
+                'recipient__user', 'course_instance').delete()
 
     ABSOLUTE_URL_NAME = "notify"
 
@@ -44,3 +44,24 @@ class NotificationTest(CourseTestCase):
         Notification.remove(self.submission3)
         cn = CachedNotifications(self.student)
         self.assertEqual(cn.count(), 0)
+
+    def test_notifications_bulk(self):
+        Notification.send(None, self.submission)
+        cn = CachedNotifications(self.student)
+        self.assertEqual(cn.count(), 1)
+
+        submissions = [self.submission, self.submission2, self.submission3]
+        notifications = Notification.send_many(self.teacher.userprofile, submissions)
+        self.assertEqual(len(notifications), 3)
+        self.assertEqual(Notification.send_many(None, submissions), [])
+        cn = CachedNotifications(self.student)
+        self.assertEqual(cn.count(), 3)
+        cn = CachedNotifications(self.user)
+        self.assertEqual(cn.count(), 1)
+
+        Notification.remove_many([self.submission, self.submission3])
+        cn = CachedNotifications(self.student)
+        self.assertEqual(cn.count(), 1)
+        cn = CachedNotifications(self.user)
+        self.assertEqual(cn.count(), 0)
+        self.assertEqual(Notification.objects.count(), 1)